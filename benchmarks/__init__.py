@@ -0,0 +1,4 @@
+"""
+Offline benchmarks for the moderation bot
+Run from the repository root, e.g. python -m benchmarks.replay_updates
+"""
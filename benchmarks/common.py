@@ -0,0 +1,99 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Repository root, so benchmarks can import the bot modules
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+def prepare_environment(token: str = "123456:BENCHMARK") -> str:
+    """Point imports at the repo and run from a scratch directory
+    
+    Database uses a relative bot.db path, so benchmarks must chdir away from
+    the repo before the database module is imported.
+    """
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    os.environ.setdefault("BOT_TOKEN", token)
+    
+    workdir = tempfile.mkdtemp(prefix="bot_bench_")
+    os.chdir(workdir)
+    return workdir
+
+class LatencyProbe:
+    """Records when each update is injected and when its handlers finished
+    
+    Register ``on_done`` in a handler group after all others so it runs
+    last for every update.
+    """
+    
+    def __init__(self, total: int):
+        self.total = total
+        self.sent: Dict[int, tuple] = {}
+        self.latencies: List[float] = []
+        self.by_label: Dict[str, List[float]] = {}
+        self.finished = asyncio.Event()
+    
+    def mark_sent(self, update_id: int, label: Optional[str] = None):
+        self.sent[update_id] = (time.perf_counter(), label)
+    
+    async def on_done(self, update, context):
+        sent = self.sent.pop(update.update_id, None)
+        if sent is not None:
+            started, label = sent
+            latency = time.perf_counter() - started
+            self.latencies.append(latency)
+            if label is not None:
+                self.by_label.setdefault(label, []).append(latency)
+        if len(self.latencies) >= self.total:
+            self.finished.set()
+
+async def pace(i: int, started: float, rate: float):
+    """Sleep until the i-th event is due at the given rate (0 = no pacing)"""
+    if rate > 0:
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def free_port() -> int:
+    """Find an unused local TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: List[float], elapsed: float = 0.0) -> Dict[str, float]:
+    """Latency summary in milliseconds plus throughput"""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'throughput': len(values) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': (values[-1] * 1000) if values else 0.0
+    }
+
+def format_summary(name: str, summary: Dict[str, float]) -> str:
+    """One table row for a summary"""
+    return (
+        f"{name:<28} {summary['count']:>7} {summary['throughput']:>10.1f} "
+        f"{summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} {summary['p99_ms']:>9.2f} {summary['max_ms']:>9.2f}"
+    )
+
+def format_header() -> str:
+    return f"{'name':<28} {'count':>7} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
@@ -0,0 +1,278 @@
+"""
+Database Microbenchmarks
+Builds synthetic databases at several scales, times every Database method
+cold and warm, and checks the query plan of every statement they run so
+schema regressions (full table scans, sorts on hot paths) fail before deploy.
+
+Usage:
+    python -m benchmarks.db_bench --scales 10000,100000 --iterations 200
+    python -m benchmarks.db_bench --scales 1000000 --db-dir /var/tmp/bench   # reuse built databases
+    python -m benchmarks.db_bench --check-only                               # query plans only, exits 1 on a scan
+"""
+
+import argparse
+import inspect
+import itertools
+import random
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.common import format_header, format_summary, prepare_environment, summarize
+
+prepare_environment()
+
+from database import Database
+
+# Rows per scale unit: a scale of N users gets 10N moderation rows, N warnings, ...
+CHATS = 1000
+SUDO_USERS = 20
+ACTIONS = ['deleted', 'warned', 'banned', 'muted', 'ignored']
+WARNING_TYPES = ['spam', 'nsfw', 'violence', 'flood']
+
+# Methods not worth timing in a loop
+SKIPPED = {'backup_database'}
+
+# Plan lines allowed per benchmark case: whole-table aggregates and tiny tables
+ALLOWED_PLAN = {
+    'get_stats(global)': ('SCAN moderated_content', 'SCAN warnings', 'SCAN users', 'SCAN sudo_users',
+                          'USE TEMP B-TREE FOR GROUP BY'),
+    'get_stats(chat)': ('SCAN warnings', 'SCAN users', 'SCAN sudo_users'),
+    'get_sudo_users': ('SCAN s', 'SCAN sudo_users', 'USE TEMP B-TREE FOR ORDER BY'),
+    'load_whitelist': ('SCAN whitelist',),
+}
+
+# Plan lines that are never fine on a hot path
+_BAD_PLAN = re.compile(r'^(SCAN (?!CONSTANT ROW)|USE TEMP B-TREE)')
+
+class TracingDatabase(Database):
+    """Database that records every SQL statement it executes"""
+    
+    def __init__(self, db_path: str):
+        self.statements: List[str] = []
+        super().__init__(db_path)
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = super()._get_connection()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+def _timestamp(rng: random.Random, now: datetime, days: int = 90) -> str:
+    return (now - timedelta(seconds=rng.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+def build_database(path: Path, users: int, seed: int = 0) -> None:
+    """Fill a fresh database with synthetic rows using bulk inserts"""
+    Database(str(path))  # creates the schema
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    chat_ids = [-1001000000000 - i for i in range(CHATS)]
+    started = time.perf_counter()
+    
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA synchronous = OFF')
+    with conn:
+        conn.executemany(
+            'INSERT INTO users (user_id, username, first_name, is_banned, created_at, last_seen) VALUES (?, ?, ?, ?, ?, ?)',
+            ((uid, f'user{uid}', f'User{uid}', uid % 97 == 0, _timestamp(rng, now), _timestamp(rng, now))
+             for uid in range(1, users + 1))
+        )
+        conn.executemany(
+            'INSERT INTO gban_list (user_id, reason, banned_by, banned_at, is_active) VALUES (?, ?, ?, ?, ?)',
+            ((uid, 'synthetic', 1, _timestamp(rng, now), uid % 7 != 0) for uid in range(1, users + 1, 20))
+        )
+        conn.executemany(
+            'INSERT INTO warnings (user_id, chat_id, warning_type, reason, moderator_id, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            ((rng.randint(1, users), rng.choice(chat_ids), rng.choice(WARNING_TYPES), 'synthetic', 0, _timestamp(rng, now))
+             for _ in range(users))
+        )
+        conn.execute('''
+            INSERT OR IGNORE INTO warning_counters (user_id, chat_id, count, last_warned_at)
+            SELECT user_id, chat_id, COUNT(*), MAX(CAST(strftime('%s', created_at) AS REAL))
+            FROM warnings GROUP BY user_id, chat_id
+        ''')
+        conn.executemany(
+            'INSERT INTO moderated_content (message_id, chat_id, user_id, content_type, action_taken, reason, confidence, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            ((i, rng.choice(chat_ids), rng.randint(1, users), 'photo', rng.choice(ACTIONS), 'synthetic', rng.random(),
+              _timestamp(rng, now))
+             for i in range(users * 10))
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO whitelist (user_id, chat_id, added_by) VALUES (?, ?, ?)',
+            ((rng.randint(1, users), rng.choice(chat_ids), 1) for _ in range(max(users // 100, 1)))
+        )
+        conn.executemany(
+            'INSERT INTO settings (chat_id, max_warnings) VALUES (?, ?)',
+            ((chat_id, 3) for chat_id in chat_ids)
+        )
+        conn.executemany(
+            'INSERT INTO sudo_users (user_id, username, added_by) VALUES (?, ?, ?)',
+            ((uid, f'user{uid}', 1) for uid in range(1, SUDO_USERS + 1))
+        )
+    conn.execute('ANALYZE')
+    conn.close()
+    print(f"🏗️ Built {path.name}: {users} users, {users * 10} moderation rows in {time.perf_counter() - started:.1f}s")
+
+def benchmark_cases(users: int, rng: random.Random) -> Dict[str, Tuple[str, Callable[[], tuple]]]:
+    """Case name -> (Database method, argument factory); a trailing dict is passed as keywords"""
+    chat_ids = [-1001000000000 - i for i in range(CHATS)]
+    user = lambda: rng.randint(1, users)
+    chat = lambda: rng.choice(chat_ids)
+    fresh = itertools.count(users + 1)
+    
+    return {
+        'add_user': ('add_user', lambda: (user(), 'bench', 'Bench', '')),
+        'save_profiles(100)': ('save_profiles', lambda: ([(user(), 'bench', 'Bench', '', datetime.now()) for _ in range(100)],)),
+        'get_profiles(50)': ('get_profiles', lambda: ([user() for _ in range(50)],)),
+        'add_to_gban': ('add_to_gban', lambda: (next(fresh), 'bench', 1)),
+        'remove_from_gban': ('remove_from_gban', lambda: (user(),)),
+        'add_many_to_gban(200)': ('add_many_to_gban', lambda: ([next(fresh) for _ in range(200)], 'bench', 1)),
+        'remove_many_gban(200)': ('remove_many_from_gban', lambda: ([user() for _ in range(200)],)),
+        'is_user_gbanned': ('is_user_gbanned', lambda: (user(),)),
+        'get_gbanned_among(50)': ('get_gbanned_among', lambda: ([user() for _ in range(50)],)),
+        'get_gban_list': ('get_gban_list', lambda: (100, 0)),
+        'get_gban_stats': ('get_gban_stats', lambda: ()),
+        'is_sudo_user': ('is_sudo_user', lambda: (user(),)),
+        'add_sudo_user': ('add_sudo_user', lambda: (SUDO_USERS + 1, 'bench', 1)),
+        'remove_sudo_user': ('remove_sudo_user', lambda: (SUDO_USERS + 1,)),
+        'get_sudo_users': ('get_sudo_users', lambda: ()),
+        'add_warning': ('add_warning', lambda: (user(), chat(), 'spam', 'bench', 0)),
+        'record_warning': ('record_warning', lambda: (user(), chat(), 'spam', 'bench', 0)),
+        'get_warning_count': ('get_warning_count', lambda: (user(), chat())),
+        'reset_warnings': ('reset_warnings', lambda: (user(), chat())),
+        'is_user_whitelisted': ('is_user_whitelisted', lambda: (user(), chat())),
+        'load_whitelist': ('load_whitelist', lambda: ()),
+        'add_to_whitelist': ('add_to_whitelist', lambda: (user(), chat(), 1)),
+        'remove_from_whitelist': ('remove_from_whitelist', lambda: (user(), chat())),
+        'get_chat_settings': ('get_chat_settings', lambda: (chat(),)),
+        'get_settings_version': ('get_settings_version', lambda: (chat(),)),
+        'update_chat_settings': ('update_chat_settings', lambda: (chat(), {'enable_spam_filter': rng.random() < 0.5})),
+        'get_stats(chat)': ('get_stats', lambda: (chat(),)),
+        'get_stats(global)': ('get_stats', lambda: ()),
+    }
+
+def check_coverage(cases: Dict) -> List[str]:
+    """Public Database methods with no benchmark case"""
+    covered = {method for method, _ in cases.values()} | SKIPPED
+    return [
+        name for name, _ in inspect.getmembers(Database, inspect.isfunction)
+        if not name.startswith('_') and name not in covered
+    ]
+
+def explain(path: Path, statements: List[str]) -> List[str]:
+    """Query plan lines for the statements a case executed"""
+    conn = sqlite3.connect(path)
+    lines = []
+    try:
+        for statement in dict.fromkeys(statements):
+            keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+            if keyword not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+                continue
+            for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}'):
+                lines.append(row[3])
+    finally:
+        conn.close()
+    return lines
+
+def plan_violations(case: str, plan: List[str]) -> List[str]:
+    allowed = ALLOWED_PLAN.get(case, ())
+    return [
+        line for line in dict.fromkeys(plan)
+        if _BAD_PLAN.match(line) and not line.startswith(allowed)
+    ]
+
+def run_case(database: TracingDatabase, method: str, make_args: Callable, iterations: int,
+             budget: float) -> Tuple[float, List[float]]:
+    """Cold latency of the first call, then warm latencies until iterations or budget run out"""
+    method_call = getattr(database, method)
+    
+    def call(*args):
+        if args and isinstance(args[-1], dict):
+            return method_call(*args[:-1], **args[-1])
+        return method_call(*args)
+    
+    started = time.perf_counter()
+    call(*make_args())
+    cold = time.perf_counter() - started
+    
+    warm = []
+    deadline = time.perf_counter() + budget
+    for _ in range(iterations):
+        args = make_args()
+        started = time.perf_counter()
+        call(*args)
+        warm.append(time.perf_counter() - started)
+        if started > deadline:
+            break
+    return cold, warm
+
+def run_scale(users: int, args) -> List[str]:
+    """Benchmark one scale; returns query plan violations"""
+    db_dir = Path(args.db_dir) if args.db_dir else Path.cwd()
+    db_dir.mkdir(parents=True, exist_ok=True)
+    path = db_dir / f"bench_{users}.db"
+    if not path.exists():
+        build_database(path, users, args.seed)
+    
+    database = TracingDatabase(str(path))
+    cases = benchmark_cases(users, random.Random(args.seed))
+    selected = [name for name in cases if not args.only or any(part in name for part in args.only.split(','))]
+    
+    print(f"\n=== {users} users ===")
+    print(f"{'case':<22} {'cold ms':>9}" + format_header()[28:])
+    violations = []
+    
+    for name in selected:
+        method, make_args = cases[name]
+        database.statements.clear()
+        iterations = 1 if args.check_only else args.iterations
+        cold, warm = run_case(database, method, make_args, iterations, args.budget)
+        
+        plan = explain(path, database.statements)
+        for line in plan_violations(name, plan):
+            violations.append(f"{users} users, {name}: {line}")
+        
+        if not args.check_only:
+            print(f"{name:<22} {cold * 1000:>9.3f}" + format_summary('', summarize(warm, sum(warm)))[28:])
+        if args.plans:
+            for line in dict.fromkeys(plan):
+                print(f"    {line}")
+    
+    return violations
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Database methods on synthetic data")
+    parser.add_argument("--scales", default="10000,100000", help="Comma-separated user counts")
+    parser.add_argument("--iterations", type=int, default=200, help="Warm calls per method")
+    parser.add_argument("--budget", type=float, default=2.0, help="Max seconds of warm calls per method")
+    parser.add_argument("--only", default="", help="Comma-separated substrings of case names to run")
+    parser.add_argument("--db-dir", default="", help="Keep and reuse built databases in this directory")
+    parser.add_argument("--plans", action="store_true", help="Print the query plan of every case")
+    parser.add_argument("--check-only", action="store_true", help="Only check query plans (one call per method)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    if args.check_only and args.scales == parser.get_default('scales'):
+        args.scales = "10000"
+    
+    missing = check_coverage(benchmark_cases(1, random.Random()))
+    if missing:
+        print(f"⚠️ Database methods without a benchmark case: {', '.join(missing)}")
+    
+    violations = []
+    for scale in args.scales.split(','):
+        violations.extend(run_scale(int(scale), args))
+    
+    if violations:
+        print("\n❌ Query plan regressions:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+    print("\n✅ No full table scans or temp sorts on hot queries")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Fake Telegram Bot API
+Minimal local HTTP server that answers Bot API calls for offline benchmarks
+"""
+
+import asyncio
+import io
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {
+    'id': 1000000001,
+    'is_bot': True,
+    'first_name': 'Bench Bot',
+    'username': 'bench_bot',
+    'can_join_groups': True,
+    'can_read_all_group_messages': True,
+    'supports_inline_queries': False
+}
+
+_sample_image: Optional[bytes] = None
+
+def sample_image() -> bytes:
+    """Small JPEG served for every file download"""
+    global _sample_image
+    if _sample_image is None:
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), (200, 120, 80)).save(buffer, format='JPEG')
+        _sample_image = buffer.getvalue()
+    return _sample_image
+
+# Permissions reported for configured admins
+ADMIN_RIGHTS = {
+    'can_be_edited': False, 'is_anonymous': False, 'can_manage_chat': True, 'can_delete_messages': True,
+    'can_manage_video_chats': True, 'can_restrict_members': True, 'can_promote_members': False,
+    'can_change_info': True, 'can_invite_users': True, 'can_post_stories': False,
+    'can_edit_stories': False, 'can_delete_stories': False
+}
+
+class FakeBotAPI:
+    """Serves /bot<token>/<method> with canned results and an update queue for getUpdates
+    
+    ``latency`` (plus up to ``jitter``) seconds is added to every call except
+    getUpdates; ``method_latency`` overrides it per method.
+    """
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 method_latency: Optional[Dict[str, float]] = None, admin_ids: Iterable[int] = ()):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.method_latency = method_latency or {}
+        self.admin_ids = set(admin_ids)
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.calls: Dict[str, int] = {}
+        self.webhook_url = ""
+        self._message_id = 0
+        self._connections: Set[asyncio.Task] = set()
+    
+    @property
+    def base_url(self) -> str:
+        """Value for ApplicationBuilder.base_url()"""
+        return f"http://{self.host}:{self.port}/bot"
+    
+    @property
+    def base_file_url(self) -> str:
+        """Value for ApplicationBuilder.base_file_url()"""
+        return f"http://{self.host}:{self.port}/file/bot"
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Fake Bot API listening on {self.host}:{self.port}")
+    
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            # Long-polling getUpdates calls would otherwise be cancelled at loop teardown
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self.server.wait_closed()
+    
+    def push_update(self, update: Dict):
+        """Queue an update for the next getUpdates call"""
+        self.updates.put_nowait(update)
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 keep-alive requests on one connection"""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                
+                _, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                
+                body = b''
+                length = int(headers.get('content-length', 0))
+                if length:
+                    body = await reader.readexactly(length)
+                
+                if path.startswith('/file/'):
+                    self.calls['download'] = self.calls.get('download', 0) + 1
+                    await self._delay('download')
+                    payload, content_type = sample_image(), b'image/jpeg'
+                else:
+                    method = path.rstrip('/').rsplit('/', 1)[-1].split('?')[0]
+                    params = self._parse_params(headers.get('content-type', ''), body)
+                    result = await self.handle(method, params)
+                    payload, content_type = json.dumps({'ok': True, 'result': result}).encode(), b'application/json'
+                
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: ' + content_type + b'\r\n'
+                    b'Content-Length: ' + str(len(payload)).encode() + b'\r\n'
+                    b'Connection: keep-alive\r\n\r\n' + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        except asyncio.CancelledError:
+            # stop() closing the connection, possibly mid long-poll
+            pass
+        except Exception as e:
+            logger.error(f"Fake Bot API error: {e}")
+        finally:
+            self._connections.discard(task)
+            writer.close()
+    
+    @staticmethod
+    def _parse_params(content_type: str, body: bytes) -> Dict[str, Any]:
+        """Decode form or JSON parameters (multipart uploads are ignored)"""
+        if not body:
+            return {}
+        if 'application/json' in content_type:
+            return json.loads(body)
+        if 'application/x-www-form-urlencoded' in content_type:
+            params = {}
+            for key, values in parse_qs(body.decode()).items():
+                value = values[0]
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    params[key] = value
+            return params
+        return {}
+    
+    async def _delay(self, method: str):
+        """Simulated network and server time"""
+        latency = self.method_latency.get(method, self.latency)
+        if self.jitter:
+            latency += random.uniform(0, self.jitter)
+        if latency > 0:
+            await asyncio.sleep(latency)
+    
+    async def handle(self, method: str, params: Dict[str, Any]) -> Any:
+        """Produce a result for a Bot API method"""
+        self.calls[method] = self.calls.get(method, 0) + 1
+        
+        if method == 'getUpdates':
+            return await self._get_updates(params)
+        
+        await self._delay(method)
+        
+        if method == 'getMe':
+            return BOT_USER
+        
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url', '')
+            return True
+        
+        if method == 'deleteWebhook':
+            self.webhook_url = ""
+            return True
+        
+        if method == 'getWebhookInfo':
+            return {'url': self.webhook_url, 'has_custom_certificate': False, 'pending_update_count': 0}
+        
+        if method == 'getChatAdministrators':
+            admins = [{'status': 'creator', 'user': BOT_USER, 'is_anonymous': False}]
+            for user_id in self.admin_ids:
+                admins.append({
+                    'status': 'administrator', 'user': {'id': user_id, 'is_bot': False, 'first_name': f'Admin{user_id}'},
+                    **ADMIN_RIGHTS
+                })
+            return admins
+        
+        if method == 'getChatMember':
+            user_id = int(params.get('user_id', 0))
+            user = {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+            if user_id in self.admin_ids:
+                return {'status': 'administrator', 'user': user, **ADMIN_RIGHTS}
+            return {'status': 'member', 'user': user}
+        
+        if method == 'getFile':
+            file_id = params.get('file_id', 'file')
+            image = sample_image()
+            return {'file_id': file_id, 'file_unique_id': f'u{file_id}', 'file_size': len(image),
+                    'file_path': f'photos/{file_id}.jpg'}
+        
+        if method == 'getChat':
+            chat_id = params.get('chat_id', 0)
+            return {'id': chat_id, 'type': 'private' if int(chat_id) > 0 else 'supergroup',
+                    'first_name': f'User {chat_id}', 'title': f'Chat {chat_id}'}
+        
+        if method.startswith(('send', 'edit', 'copy', 'forward')):
+            return self._message(params)
+        
+        return True
+    
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict]:
+        """Long-poll the update queue"""
+        timeout = float(params.get('timeout', 0) or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self.updates.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            return []
+        
+        limit = int(params.get('limit', 100) or 100)
+        while len(updates) < limit and not self.updates.empty():
+            updates.append(self.updates.get_nowait())
+        return updates
+    
+    def _message(self, params: Dict[str, Any]) -> Dict:
+        """Build a Message result for send/edit methods"""
+        self._message_id += 1
+        chat_id = params.get('chat_id', 0)
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            chat_id = 0
+        
+        return {
+            'message_id': params.get('message_id', self._message_id),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+            'from': BOT_USER,
+            'text': params.get('text', '')
+        }
@@ -0,0 +1,150 @@
+"""
+Load Test
+Drives the real handler wiring from main.py with synthetic scenarios against
+the fake Bot API and reports throughput plus per-handler latency.
+
+Usage:
+    python -m benchmarks.load_test --scenario all --count 2000 --rate 500
+    python -m benchmarks.load_test --scenario photo_burst --latency 0.05 --jitter 0.02
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.common import LatencyProbe, format_header, format_summary, pace, prepare_environment, summarize
+
+prepare_environment()
+
+from benchmarks.scenarios import ADMIN_ID, SCENARIOS, UpdateFactory
+
+# Button storms and commands come from a configured admin
+os.environ.setdefault("ADMIN_IDS", str(ADMIN_ID))
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from main import ALLOWED_UPDATES, build_application
+from update_processor import ChatOrderedUpdateProcessor
+
+class HandlerTimer:
+    """Raw per-handler latencies (the metrics histograms only keep buckets)"""
+    
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+    
+    def wrap(self, callback: Callable) -> Callable:
+        name = getattr(callback, '__name__', 'handler')
+        samples = self.latencies.setdefault(name, [])
+        
+        @functools.wraps(callback)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except Exception:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                raise
+            finally:
+                samples.append(time.perf_counter() - started)
+        
+        return timed
+    
+    def attach(self, app: Application):
+        for handlers in app.handlers.values():
+            for handler in handlers:
+                handler.callback = self.wrap(handler.callback)
+
+def make_application(api: FakeBotAPI, probe: LatencyProbe, timer: HandlerTimer, concurrency: int) -> Application:
+    """Real handler wiring pointed at the fake Bot API"""
+    builder = (
+        Application.builder()
+        .token("123456:BENCHMARK")
+        .base_url(api.base_url)
+        .base_file_url(api.base_file_url)
+    )
+    if concurrency > 1:
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(concurrency))
+    
+    app = build_application(builder)
+    timer.attach(app)
+    # Runs after every handler group has processed the update
+    app.add_handler(TypeHandler(Update, probe.on_done), group=1000)
+    return app
+
+async def run_scenario(name: str, args) -> None:
+    factory = UpdateFactory(chats=args.chats, users=args.users, seed=args.seed)
+    updates = SCENARIOS[name](factory, args.count)
+    
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, admin_ids=[ADMIN_ID])
+    await api.start()
+    probe = LatencyProbe(len(updates))
+    timer = HandlerTimer()
+    app = make_application(api, probe, timer, args.concurrency)
+    
+    async with app:
+        await app.start()
+        await app.updater.start_polling(poll_interval=0.0, timeout=5, allowed_updates=ALLOWED_UPDATES)
+        
+        started = time.perf_counter()
+        for i, (label, update) in enumerate(updates):
+            await pace(i, started, args.rate)
+            probe.mark_sent(update['update_id'], label)
+            api.push_update(update)
+        
+        try:
+            await asyncio.wait_for(probe.finished.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ {name}: only {len(probe.latencies)}/{len(updates)} updates finished before the timeout")
+        elapsed = time.perf_counter() - started
+        
+        await app.updater.stop()
+        await app.stop()
+    
+    await api.stop()
+    
+    print(f"\n=== {name} ({len(updates)} updates, {args.rate or 'max'}/s, "
+          f"API latency {args.latency * 1000:.0f}ms +{args.jitter * 1000:.0f}ms) ===")
+    print(format_header())
+    print(format_summary("end-to-end", summarize(probe.latencies, elapsed)))
+    if len(probe.by_label) > 1:
+        for label, latencies in sorted(probe.by_label.items()):
+            print(format_summary(f"  {label}", summarize(latencies, elapsed)))
+    
+    print("\nPer handler:")
+    print(format_header())
+    for handler_name, latencies in sorted(timer.latencies.items(), key=lambda item: len(item[1]), reverse=True):
+        if latencies:
+            errors = timer.errors.get(handler_name, 0)
+            label = f"{handler_name} ({errors} err)" if errors else handler_name
+            print(format_summary(label, summarize(latencies, elapsed)))
+    
+    calls = ", ".join(f"{method}={count}" for method, count in sorted(api.calls.items(), key=lambda c: -c[1]))
+    print(f"\nBot API calls: {calls}")
+
+async def run(args):
+    names = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    for name in names:
+        await run_scenario(name, args)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the bot against a fake Bot API")
+    parser.add_argument("--scenario", choices=[*SCENARIOS, 'all'], default='mixed')
+    parser.add_argument("--count", type=int, default=1000, help="Events per scenario")
+    parser.add_argument("--rate", type=float, default=0.0, help="Updates per second (0 = as fast as possible)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake Bot API latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency up to this many seconds")
+    parser.add_argument("--concurrency", type=int, default=256, help="Concurrent updates (1 = sequential)")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
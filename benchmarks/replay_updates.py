@@ -0,0 +1,171 @@
+"""
+Replay Benchmark
+Replays recorded updates through polling and webhook modes against a fake
+Bot API and compares end-to-end latency (update delivered -> handlers done).
+
+Usage:
+    python -m benchmarks.replay_updates --updates recorded.jsonl --mode both
+    python -m benchmarks.replay_updates --count 1000 --rate 200
+
+Recorded updates are JSONL, one Bot API Update object per line.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from benchmarks.common import (
+    LatencyProbe, free_port, format_header, format_summary, pace, prepare_environment, summarize
+)
+
+prepare_environment()
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from main import ALLOWED_UPDATES, build_application
+from ratelimiter import OutboundRateLimiter
+
+WEBHOOK_SECRET = "benchmark-secret-token"
+
+def load_updates(path: str) -> List[Dict]:
+    """Load recorded updates from a JSONL file"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def sample_updates(count: int) -> List[Dict]:
+    """Plain group text messages and /start commands when no recording is given"""
+    updates = []
+    for i in range(count):
+        chat_id = -1001000000000 - (i % 50)
+        user_id = 2000000 + (i % 500)
+        text = "/start" if i % 10 == 0 else f"benchmark message {i}"
+        message = {
+            'message_id': i + 1,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': f'Bench {chat_id}'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+            'text': text
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        updates.append({'update_id': i + 1, 'message': message})
+    return updates
+
+def make_application(api: FakeBotAPI, probe: LatencyProbe, rate_limit: bool) -> Application:
+    """Real handler wiring from main.py pointed at the fake Bot API"""
+    builder = Application.builder().token("123456:BENCHMARK").base_url(api.base_url)
+    if rate_limit:
+        builder = builder.rate_limiter(OutboundRateLimiter())
+    
+    app = build_application(builder)
+    # Runs after every handler group has processed the update
+    app.add_handler(TypeHandler(Update, probe.on_done), group=1000)
+    return app
+
+async def run_polling_mode(updates: List[Dict], rate: float, rate_limit: bool, timeout: float) -> Dict:
+    api = FakeBotAPI()
+    await api.start()
+    probe = LatencyProbe(len(updates))
+    app = make_application(api, probe, rate_limit)
+    
+    async with app:
+        await app.start()
+        await app.updater.start_polling(poll_interval=0.0, timeout=5, allowed_updates=ALLOWED_UPDATES)
+        
+        started = time.perf_counter()
+        for i, update in enumerate(updates):
+            await pace(i, started, rate)
+            probe.mark_sent(update['update_id'])
+            api.push_update(update)
+        
+        try:
+            await asyncio.wait_for(probe.finished.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+        
+        await app.updater.stop()
+        await app.stop()
+    
+    await api.stop()
+    return summarize(probe.latencies, elapsed)
+
+async def run_webhook_mode(updates: List[Dict], rate: float, rate_limit: bool, timeout: float,
+                           max_connections: int) -> Dict:
+    api = FakeBotAPI()
+    await api.start()
+    probe = LatencyProbe(len(updates))
+    app = make_application(api, probe, rate_limit)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/webhook"
+    
+    async with app:
+        await app.start()
+        await app.updater.start_webhook(
+            listen="127.0.0.1",
+            port=port,
+            url_path="webhook",
+            webhook_url=url,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=max_connections,
+            allowed_updates=ALLOWED_UPDATES
+        )
+        
+        headers = {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}
+        limits = httpx.Limits(max_connections=max_connections)
+        async with httpx.AsyncClient(limits=limits) as client:
+            started = time.perf_counter()
+            
+            async def deliver(update: Dict):
+                probe.mark_sent(update['update_id'])
+                await client.post(url, json=update, headers=headers)
+            
+            pending = []
+            for i, update in enumerate(updates):
+                await pace(i, started, rate)
+                pending.append(asyncio.create_task(deliver(update)))
+            await asyncio.gather(*pending)
+            
+            try:
+                await asyncio.wait_for(probe.finished.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            elapsed = time.perf_counter() - started
+        
+        await app.updater.stop()
+        await app.stop()
+    
+    await api.stop()
+    return summarize(probe.latencies, elapsed)
+
+async def run(args):
+    updates = load_updates(args.updates) if args.updates else sample_updates(args.count)
+    print(f"Replaying {len(updates)} updates at {args.rate or 'max'} updates/s\n")
+    print(format_header())
+    
+    if args.mode in ("polling", "both"):
+        summary = await run_polling_mode(updates, args.rate, args.rate_limit, args.timeout)
+        print(format_summary("polling", summary))
+    
+    if args.mode in ("webhook", "both"):
+        summary = await run_webhook_mode(updates, args.rate, args.rate_limit, args.timeout, args.max_connections)
+        print(format_summary(f"webhook ({args.max_connections} conns)", summary))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare polling and webhook end-to-end latency")
+    parser.add_argument("--updates", help="JSONL file with recorded updates")
+    parser.add_argument("--count", type=int, default=500, help="Synthetic updates when no recording is given")
+    parser.add_argument("--mode", choices=("polling", "webhook", "both"), default="both")
+    parser.add_argument("--rate", type=float, default=100.0, help="Updates per second (0 = as fast as possible)")
+    parser.add_argument("--max-connections", type=int, default=40)
+    parser.add_argument("--rate-limit", action="store_true", help="Enable the outbound rate limiter")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
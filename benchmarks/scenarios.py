@@ -0,0 +1,149 @@
+"""
+Synthetic Update Scenarios
+Generates Bot API Update payloads for load tests: text floods, photo bursts,
+join raids and button storms
+"""
+
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.fake_bot_api import BOT_USER
+
+# Admin user used for button presses and commands
+ADMIN_ID = 7000001
+
+LabeledUpdate = Tuple[str, Dict]
+
+class UpdateFactory:
+    """Builds Update dicts with increasing update and message IDs"""
+    
+    def __init__(self, chats: int = 20, users: int = 1000, seed: int = 0):
+        self.chat_ids = [-1001000000000 - i for i in range(chats)]
+        self.user_ids = [2000000 + i for i in range(users)]
+        self.random = random.Random(seed)
+        self._update_id = 0
+        self._message_id = 0
+    
+    def _ids(self) -> Tuple[int, int]:
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+    
+    def chat(self) -> int:
+        return self.random.choice(self.chat_ids)
+    
+    def user(self) -> int:
+        return self.random.choice(self.user_ids)
+    
+    @staticmethod
+    def _user(user_id: int) -> Dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'}
+    
+    def _message(self, chat_id: int, user_id: int, **fields) -> Dict:
+        update_id, message_id = self._ids()
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': f'Load {chat_id}'},
+            'from': self._user(user_id),
+            **fields
+        }
+        return {'update_id': update_id, 'message': message}
+    
+    def text(self, chat_id: int, user_id: int, text: str) -> Dict:
+        fields = {'text': text}
+        if text.startswith('/'):
+            command = text.split()[0]
+            fields['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return self._message(chat_id, user_id, **fields)
+    
+    def photo(self, chat_id: int, user_id: int) -> Dict:
+        file_id = f"photo{self._message_id + 1}"
+        sizes = [
+            {'file_id': f'{file_id}_s', 'file_unique_id': f'{file_id}_su', 'width': 90, 'height': 90, 'file_size': 1500},
+            {'file_id': file_id, 'file_unique_id': f'{file_id}_u', 'width': 800, 'height': 800, 'file_size': 60000}
+        ]
+        return self._message(chat_id, user_id, photo=sizes, caption=self.random.choice(['', 'look at this']))
+    
+    def join(self, chat_id: int, user_ids: List[int]) -> Dict:
+        members = [self._user(user_id) for user_id in user_ids]
+        return self._message(chat_id, user_ids[0], new_chat_members=members)
+    
+    def button(self, chat_id: int, user_id: int, data: str) -> Dict:
+        update_id, message_id = self._ids()
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self._user(user_id),
+                'chat_instance': str(chat_id),
+                'data': data,
+                'message': {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'supergroup', 'title': f'Load {chat_id}'},
+                    'from': BOT_USER,
+                    'text': 'Settings'
+                }
+            }
+        }
+
+SPAM_TEXTS = [
+    "hello everyone", "check out http://spam.example/promo", "FREE CRYPTO click now",
+    "good morning", "lol", "join my channel @spamchannel", "anyone here?"
+]
+
+def text_flood(factory: UpdateFactory, count: int) -> List[LabeledUpdate]:
+    """Many users posting short messages, a few of them hammering one chat"""
+    updates = []
+    hot_chat = factory.chat_ids[0]
+    for i in range(count):
+        chat_id = hot_chat if i % 3 == 0 else factory.chat()
+        updates.append(('text', factory.text(chat_id, factory.user(), factory.random.choice(SPAM_TEXTS))))
+    return updates
+
+def photo_burst(factory: UpdateFactory, count: int) -> List[LabeledUpdate]:
+    """Photos that go through download and media classification"""
+    return [('photo', factory.photo(factory.chat(), factory.user())) for _ in range(count)]
+
+def join_raid(factory: UpdateFactory, count: int) -> List[LabeledUpdate]:
+    """Join events in one chat, mostly single joins with occasional batches"""
+    chat_id = factory.chat_ids[0]
+    updates = []
+    for i in range(count):
+        size = 5 if i % 10 == 0 else 1
+        updates.append(('join', factory.join(chat_id, [factory.user() for _ in range(size)])))
+    return updates
+
+BUTTONS = ['refresh_stats', 'view_stats', 'toggle_spam', 'toggle_nsfw', 'open_settings', 'gban_stats']
+
+def button_storm(factory: UpdateFactory, count: int) -> List[LabeledUpdate]:
+    """An admin repeatedly pressing settings and stats buttons"""
+    return [('button', factory.button(factory.chat(), ADMIN_ID, factory.random.choice(BUTTONS))) for _ in range(count)]
+
+def mixed(factory: UpdateFactory, count: int) -> List[LabeledUpdate]:
+    """Realistic blend: mostly text with some photos, joins, buttons and commands"""
+    updates = []
+    for _ in range(count):
+        roll = factory.random.random()
+        if roll < 0.70:
+            updates.extend(text_flood(factory, 1))
+        elif roll < 0.85:
+            updates.extend(photo_burst(factory, 1))
+        elif roll < 0.92:
+            updates.append(('join', factory.join(factory.chat(), [factory.user()])))
+        elif roll < 0.97:
+            updates.extend(button_storm(factory, 1))
+        else:
+            command = factory.random.choice(['/start', '/help', '/stats'])
+            updates.append(('command', factory.text(factory.chat(), ADMIN_ID, command)))
+    return updates
+
+SCENARIOS: Dict[str, Callable[[UpdateFactory, int], List[LabeledUpdate]]] = {
+    'text_flood': text_flood,
+    'photo_burst': photo_burst,
+    'join_raid': join_raid,
+    'button_storm': button_storm,
+    'mixed': mixed
+}
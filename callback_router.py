@@ -0,0 +1,113 @@
+"""
+Callback Router
+Table-driven dispatch of inline button callbacks by exact data or prefix,
+with per-route permission levels and latency metrics
+"""
+
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from metrics import registry
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+callback_requests = registry.counter(
+    "bot_callback_requests_total", "Inline button callbacks by route and outcome", ("route", "result"))
+callback_latency = registry.histogram(
+    "bot_callback_latency_seconds", "Inline button callback latency including permission checks", ("route",))
+
+# A route handler gets the part of callback_data after its prefix ("" for exact routes)
+RouteHandler = Callable[[Update, ContextTypes.DEFAULT_TYPE, str], Awaitable[None]]
+PermissionCheck = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[bool]]
+
+class Route:
+    __slots__ = ('pattern', 'handler', 'permission', 'denied', 'ok', 'denied_count', 'errors', 'latency')
+    
+    def __init__(self, pattern: str, handler: RouteHandler, permission: str, denied: Optional[str]):
+        self.pattern = pattern
+        self.handler = handler
+        self.permission = permission
+        self.denied = denied
+        # Metric children resolved once per route
+        self.ok = callback_requests.labels(pattern, 'ok')
+        self.denied_count = callback_requests.labels(pattern, 'denied')
+        self.errors = callback_requests.labels(pattern, 'error')
+        self.latency = callback_latency.labels(pattern)
+
+class CallbackRouter:
+    """Exact routes are one dict lookup; prefix routes end with '_' and are
+    found by looking up each '_'-terminated prefix of the data"""
+    
+    def __init__(self):
+        self.exact: Dict[str, Route] = {}
+        self.prefixes: Dict[str, Route] = {}
+        self.permissions: Dict[str, Tuple[PermissionCheck, str]] = {}
+    
+    def permission(self, level: str, check: PermissionCheck, denied: str):
+        """Register a permission level and the reply shown when it is missing"""
+        self.permissions[level] = (check, denied)
+    
+    def route(self, *patterns: str, permission: str = 'any', denied: Optional[str] = None):
+        """Decorator registering a handler for exact data or '_'-terminated prefixes"""
+        def register(handler: RouteHandler) -> RouteHandler:
+            for pattern in patterns:
+                table = self.prefixes if pattern.endswith('_') else self.exact
+                if pattern in table:
+                    raise ValueError(f"Callback route {pattern!r} is already registered")
+                table[pattern] = Route(pattern, handler, permission, denied)
+            return handler
+        return register
+    
+    def resolve(self, data: str) -> Optional[Tuple[Route, str]]:
+        route = self.exact.get(data)
+        if route is not None:
+            return route, ""
+        
+        # Longest prefix wins, e.g. "confirm_gban_" before "confirm_"
+        index = data.rfind('_')
+        while index != -1:
+            route = self.prefixes.get(data[:index + 1])
+            if route is not None:
+                return route, data[index + 1:]
+            index = data.rfind('_', 0, index)
+        return None
+    
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        
+        resolved = self.resolve(query.data or "")
+        if resolved is None:
+            logger.debug(f"No callback route for {query.data!r}")
+            return
+        
+        route, argument = resolved
+        started = time.perf_counter()
+        try:
+            # Only the permission this route needs is checked
+            if route.permission != 'any':
+                check, denied = self.permissions[route.permission]
+                if not await check(update, context):
+                    route.denied_count.inc()
+                    await query.edit_message_text(route.denied or denied)
+                    return
+            
+            await route.handler(update, context, argument)
+            route.ok.inc()
+        
+        except Exception as e:
+            route.errors.inc()
+            logger.error(f"Error in button callback {route.pattern}: {e}")
+            await query.edit_message_text(f"❌ Error: {str(e)}")
+        finally:
+            elapsed = time.perf_counter() - started
+            route.latency.observe(elapsed)
+            tracer.record('callback', route.pattern, started, elapsed)
+
+# Global callback router
+callback_router = CallbackRouter()
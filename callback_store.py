@@ -0,0 +1,75 @@
+"""
+Callback State Store
+Maps short tokens carried in inline button callback_data to server-side
+action payloads, with a TTL and a bounded LRU size
+"""
+
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from config import config
+from metrics import cache_requests
+
+_callback_hit = cache_requests.labels('callback', 'hit')
+_callback_miss = cache_requests.labels('callback', 'miss')
+
+class CallbackStore:
+    """Token -> (chat_id, payload) with expiry; least recently used tokens are evicted first"""
+    
+    def __init__(self, ttl: float = 86400, max_entries: int = 10000, token_bytes: int = 4):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.token_bytes = token_bytes
+        self.evicted = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict]]" = OrderedDict()
+    
+    def put(self, chat_id: int, payload: Dict) -> str:
+        """Store a payload for buttons in a chat and return its token"""
+        token = secrets.token_hex(self.token_bytes)
+        while token in self._entries:
+            token = secrets.token_hex(self.token_bytes)
+        
+        self._entries[token] = (time.monotonic() + self.ttl, chat_id, payload)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        return token
+    
+    def get(self, token: str, chat_id: int) -> Optional[Dict]:
+        """Payload for a token pressed in a chat, or None if unknown, expired or from another chat"""
+        entry = self._entries.get(token)
+        if entry is None:
+            _callback_miss.inc()
+            return None
+        
+        expires, owner_chat_id, payload = entry
+        if expires < time.monotonic():
+            del self._entries[token]
+            _callback_miss.inc()
+            return None
+        if owner_chat_id != chat_id:
+            _callback_miss.inc()
+            return None
+        
+        self._entries.move_to_end(token)
+        _callback_hit.inc()
+        return payload
+    
+    def pop(self, token: str, chat_id: int) -> Optional[Dict]:
+        """Like get, but the token can only be used once (confirmations)"""
+        payload = self.get(token, chat_id)
+        if payload is not None:
+            del self._entries[token]
+        return payload
+    
+    def get_stats(self) -> Dict:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'evicted': self.evicted
+        }
+
+# Global callback store
+callback_store = CallbackStore(ttl=config.CALLBACK_TTL_HOURS * 3600, max_entries=config.CALLBACK_STORE_SIZE)
@@ -1,5 +1,6 @@
 import os
 import sys
+import secrets
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -33,10 +34,28 @@ class Config:
     # Cooldown settings (seconds)
     USER_WARN_COOLDOWN = int(os.getenv("USER_WARN_COOLDOWN", "300"))
     AUTO_DELETE_DELAY = int(os.getenv("AUTO_DELETE_DELAY", "60"))
+    COOLDOWN_MAX_ENTRIES = int(os.getenv("COOLDOWN_MAX_ENTRIES", "100000"))
     
     # GBAN Settings
     ENABLE_GBAN = os.getenv("ENABLE_GBAN", "true").lower() == "true"
     GBAN_SYNC_INTERVAL = int(os.getenv("GBAN_SYNC_INTERVAL", "300"))  # 5 minutes
+    GBAN_BAN_CONCURRENCY = int(os.getenv("GBAN_BAN_CONCURRENCY", "10"))  # concurrent bans per join batch
+    GBAN_BULK_MAX = int(os.getenv("GBAN_BULK_MAX", "10000"))  # IDs per bulk /gban or /ungban, typed or from a file
+    
+    # Join request screening (GBAN check before users get in)
+    JOIN_REQUEST_APPROVE = os.getenv("JOIN_REQUEST_APPROVE", "false").lower() == "true"  # approve non-GBANNED requests
+    JOIN_REQUEST_BATCH_MS = int(os.getenv("JOIN_REQUEST_BATCH_MS", "500"))  # wait to batch a burst of requests
+    JOIN_REQUEST_BATCH_SIZE = int(os.getenv("JOIN_REQUEST_BATCH_SIZE", "200"))
+    JOIN_REQUEST_CONCURRENCY = int(os.getenv("JOIN_REQUEST_CONCURRENCY", "10"))
+    
+    # Join raid detection
+    RAID_DETECTION = os.getenv("RAID_DETECTION", "true").lower() == "true"
+    RAID_WINDOW_SECONDS = int(os.getenv("RAID_WINDOW_SECONDS", "10"))
+    RAID_MIN_JOINS = int(os.getenv("RAID_MIN_JOINS", "15"))  # joins per window that always count as a raid
+    RAID_SPIKE_FACTOR = float(os.getenv("RAID_SPIKE_FACTOR", "5"))  # or this many times the chat's usual rate
+    RAID_LOCKDOWN_SECONDS = int(os.getenv("RAID_LOCKDOWN_SECONDS", "600"))
+    RAID_ACTION = os.getenv("RAID_ACTION", "mute").lower()  # mute or ban
+    RAID_ACTION_CONCURRENCY = int(os.getenv("RAID_ACTION_CONCURRENCY", "10"))
     
     # Paths
     BASE_DIR = Path(__file__).parent.absolute()
@@ -45,6 +64,35 @@ class Config:
     LOGS_DIR = BASE_DIR / "logs"
     BACKUP_DIR = BASE_DIR / "backup"
     
+    # Logging
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text or json
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_ROTATE_HOURS = float(os.getenv("LOG_ROTATE_HOURS", "24"))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records buffered before dropping
+    
+    # Error notifications
+    ERROR_DIGEST_INTERVAL = int(os.getenv("ERROR_DIGEST_INTERVAL", "60"))  # seconds per admin digest
+    ERROR_BUFFER_SIZE = int(os.getenv("ERROR_BUFFER_SIZE", "200"))  # recent errors kept for /errors
+    
+    # Metrics endpoint (0 disables; worker N of a multi-process deployment uses port + N)
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+    
+    # Tracing: updates slower than TRACE_SLOW_MS are kept for /trace
+    TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "500"))
+    TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "100"))
+    TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))  # child spans kept per update
+    
+    # Sampling profiler for /profile
+    PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+    PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "120"))
+    
+    # Event loop watchdog: stalls longer than the threshold have their stack captured
+    WATCHDOG_INTERVAL_MS = float(os.getenv("WATCHDOG_INTERVAL_MS", "100"))
+    WATCHDOG_BLOCK_THRESHOLD_MS = float(os.getenv("WATCHDOG_BLOCK_THRESHOLD_MS", "250"))
+    
     # Enable/Disable features
     ENABLE_NSFW_DETECTION = os.getenv("ENABLE_NSFW_DETECTION", "true").lower() == "true"
     ENABLE_VIOLENCE_DETECTION = os.getenv("ENABLE_VIOLENCE_DETECTION", "true").lower() == "true"
@@ -53,9 +101,50 @@ class Config:
     # Maximum warnings before ban
     MAX_WARNINGS = int(os.getenv("MAX_WARNINGS", "3"))
     
+    # Each full period without a new warning removes one warning (0 = never)
+    WARNING_DECAY_HOURS = int(os.getenv("WARNING_DECAY_HOURS", "0"))
+    
     # Bot settings
     DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "true").lower() == "true"
     
+    # Update delivery: "polling" or "webhook"
+    BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+    
+    # Webhook settings (BOT_MODE=webhook)
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Public base URL, e.g. https://bot.example.com
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "webhook").strip("/")
+    WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "") or secrets.token_urlsafe(32)
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    WEBHOOK_CERT = os.getenv("WEBHOOK_CERT", "")
+    WEBHOOK_KEY = os.getenv("WEBHOOK_KEY", "")
+    
+    # Outbound Bot API rate limits
+    OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # requests per second
+    OUTBOUND_GROUP_RATE_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20"))
+    OUTBOUND_PRIVATE_RATE = float(os.getenv("OUTBOUND_PRIVATE_RATE", "1"))  # messages per second
+    OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+    
+    # Inline button state (payloads stay server-side, buttons carry a short token)
+    CALLBACK_TTL_HOURS = float(os.getenv("CALLBACK_TTL_HOURS", "24"))
+    CALLBACK_STORE_SIZE = int(os.getenv("CALLBACK_STORE_SIZE", "10000"))
+    
+    # Settings toggles are written once the admin stops clicking for this long (or on Save)
+    SETTINGS_SAVE_DELAY_MS = int(os.getenv("SETTINGS_SAVE_DELAY_MS", "3000"))
+    
+    # User names seen in updates, used instead of get_chat lookups
+    PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "100000"))
+    PROFILE_FLUSH_SECONDS = float(os.getenv("PROFILE_FLUSH_SECONDS", "10"))  # batch database writes
+    PROFILE_STALE_HOURS = float(os.getenv("PROFILE_STALE_HOURS", "168"))  # refresh older names in the background
+    PROFILE_REFRESH_CONCURRENCY = int(os.getenv("PROFILE_REFRESH_CONCURRENCY", "5"))
+    
+    # Update processing
+    MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "256"))  # across all chats
+    
+    # Multi-process mode: 1 runs everything in one process, 0 uses one worker per CPU core
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1")) or (os.cpu_count() or 1)
+    
     # Security
     ALLOW_SUDO_COMMANDS = os.getenv("ALLOW_SUDO_COMMANDS", "true").lower() == "true"
     
@@ -65,6 +154,30 @@ class Config:
         if not cls.TOKEN or cls.TOKEN == "YOUR_BOT_TOKEN_HERE":
             raise ValueError("❌ BOT_TOKEN is required in .env file. Get it from @BotFather")
         
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(f"❌ BOT_MODE must be 'polling' or 'webhook', got '{cls.BOT_MODE}'")
+        
+        if cls.BOT_MODE == "webhook":
+            if not cls.WEBHOOK_URL:
+                raise ValueError("❌ WEBHOOK_URL is required when BOT_MODE=webhook")
+            if not 1 <= cls.WEBHOOK_MAX_CONNECTIONS <= 100:
+                raise ValueError("❌ WEBHOOK_MAX_CONNECTIONS must be between 1 and 100")
+        
+        if cls.LOG_FORMAT not in ("text", "json"):
+            raise ValueError(f"❌ LOG_FORMAT must be 'text' or 'json', got '{cls.LOG_FORMAT}'")
+        
+        if cls.RAID_ACTION not in ("mute", "ban"):
+            raise ValueError(f"❌ RAID_ACTION must be 'mute' or 'ban', got '{cls.RAID_ACTION}'")
+        
+        if cls.MAX_CONCURRENT_UPDATES < 1:
+            raise ValueError("❌ MAX_CONCURRENT_UPDATES must be at least 1")
+        
+        if min(cls.OUTBOUND_GLOBAL_RATE, cls.OUTBOUND_GROUP_RATE_PER_MINUTE, cls.OUTBOUND_PRIVATE_RATE) <= 0:
+            raise ValueError("❌ OUTBOUND_GLOBAL_RATE, OUTBOUND_GROUP_RATE_PER_MINUTE and OUTBOUND_PRIVATE_RATE must be positive")
+        
+        if cls.WORKER_PROCESSES < 1:
+            raise ValueError("❌ WORKER_PROCESSES must be 0 (one per core) or a positive number")
+        
         if not cls.ADMIN_IDS:
             print("⚠️ Warning: No ADMIN_IDS configured")
         
@@ -91,6 +204,8 @@ class Config:
         print(f"Admin IDs: {len(cls.ADMIN_IDS)}")
         print(f"Sudo IDs: {len(cls.SUDO_IDS)}")
         print(f"Database: {cls.DATABASE_URL}")
+        print(f"Mode: {cls.BOT_MODE}" + (f" ({cls.WEBHOOK_URL})" if cls.BOT_MODE == "webhook" else ""))
+        print(f"Worker Processes: {cls.WORKER_PROCESSES}")
         print(f"GBAN Enabled: {cls.ENABLE_GBAN}")
         print(f"NSFW Detection: {cls.ENABLE_NSFW_DETECTION}")
         print(f"Violence Detection: {cls.ENABLE_VIOLENCE_DETECTION}")
@@ -0,0 +1,143 @@
+"""
+Cooldown Tracker
+Per-action cooldowns with continuous expiry and a memory bound
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Tuple
+
+from config import config
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+cooldown_evictions = registry.counter(
+    "bot_cooldown_evicted_total", "Cooldowns dropped early to stay within COOLDOWN_MAX_ENTRIES")
+
+class CooldownTracker:
+    """Cooldown classes keyed by (action, duration)
+    
+    Every class has a fixed duration, so entries expire in the order they
+    were armed. Each class keeps a FIFO of (expiry, key) and evicts from
+    its head, which makes eviction O(1) amortized with no periodic rebuild.
+    """
+    
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._expiries: Dict[Tuple[str, float], Dict[Hashable, float]] = {}
+        self._queues: Dict[Tuple[str, float], Deque[Tuple[float, Hashable]]] = {}
+        self._size = 0
+        self.checks = 0
+        self.blocked = 0
+        self.expired = 0
+        self.evicted = 0
+    
+    def check(self, action: str, key: Hashable, seconds: float) -> bool:
+        """Return True and arm the cooldown if key is not cooling down"""
+        now = time.monotonic()
+        cooldown_class = (action, seconds)
+        self.checks += 1
+        
+        expiries = self._expiries.get(cooldown_class)
+        if expiries is None:
+            expiries = self._expiries[cooldown_class] = {}
+            self._queues[cooldown_class] = deque()
+        queue = self._queues[cooldown_class]
+        
+        self._expire(expiries, queue, now)
+        
+        if key in expiries:
+            self.blocked += 1
+            return False
+        
+        if self._size >= self.max_entries:
+            self._evict_oldest()
+        
+        expiry = now + seconds
+        expiries[key] = expiry
+        queue.append((expiry, key))
+        self._size += 1
+        return True
+    
+    def remaining(self, action: str, key: Hashable, seconds: float) -> float:
+        """Seconds left on a cooldown, 0 if not cooling down"""
+        expiries = self._expiries.get((action, seconds))
+        if not expiries or key not in expiries:
+            return 0.0
+        return max(expiries[key] - time.monotonic(), 0.0)
+    
+    def reset(self, action: str, key: Hashable, seconds: float):
+        """Clear a cooldown early"""
+        expiries = self._expiries.get((action, seconds))
+        if expiries and expiries.pop(key, None) is not None:
+            self._size -= 1
+    
+    def _expire(self, expiries: Dict[Hashable, float], queue: Deque[Tuple[float, Hashable]], now: float):
+        """Pop expired entries from the head of a class queue"""
+        while queue and queue[0][0] <= now:
+            expiry, key = queue.popleft()
+            # Skip queue entries superseded by reset() or a later re-arm
+            if expiries.get(key) == expiry:
+                del expiries[key]
+                self._size -= 1
+                self.expired += 1
+    
+    def _evict_oldest(self):
+        """Drop the entry closest to expiry to stay within max_entries"""
+        oldest_class = None
+        for cooldown_class, queue in self._queues.items():
+            if queue and (oldest_class is None or queue[0][0] < self._queues[oldest_class][0][0]):
+                oldest_class = cooldown_class
+        
+        if oldest_class is None:
+            return
+        
+        expiries = self._expiries[oldest_class]
+        queue = self._queues[oldest_class]
+        while queue:
+            expiry, key = queue.popleft()
+            if expiries.get(key) == expiry:
+                del expiries[key]
+                self._size -= 1
+                self.evicted += 1
+                cooldown_evictions.inc()
+                return
+    
+    def sweep(self):
+        """Expire entries in every class and drop empty classes"""
+        now = time.monotonic()
+        for cooldown_class in list(self._queues):
+            expiries = self._expiries[cooldown_class]
+            queue = self._queues[cooldown_class]
+            self._expire(expiries, queue, now)
+            if not queue:
+                del self._queues[cooldown_class]
+                del self._expiries[cooldown_class]
+    
+    def get_stats(self) -> Dict:
+        """Get occupancy and eviction metrics"""
+        return {
+            'entries': self._size,
+            'max_entries': self.max_entries,
+            'occupancy': self._size / self.max_entries if self.max_entries else 0.0,
+            'classes': {
+                f"{action}:{seconds:g}s": len(expiries)
+                for (action, seconds), expiries in self._expiries.items()
+            },
+            'checks': self.checks,
+            'blocked': self.blocked,
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
+
+# Global cooldown tracker
+cooldowns = CooldownTracker(max_entries=config.COOLDOWN_MAX_ENTRIES)
+
+registry.callback_gauge(
+    "bot_cooldown_entries", "Active cooldowns by action and duration",
+    lambda: cooldowns.get_stats()['classes'], ("class",))
+registry.callback_gauge(
+    "bot_cooldown_occupancy_ratio", "Active cooldowns as a fraction of COOLDOWN_MAX_ENTRIES",
+    lambda: cooldowns.get_stats()['occupancy'])
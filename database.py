@@ -1,29 +1,53 @@
 import sqlite3
 import json
 import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Set
 import logging
 
+from config import config
+from metrics import cache_requests, instrument_methods
+
 logger = logging.getLogger(__name__)
 
+_whitelist_hit = cache_requests.labels('whitelist', 'hit')
+_whitelist_miss = cache_requests.labels('whitelist', 'miss')
+
+# Writable columns of the settings table
+SETTINGS_COLUMNS = (
+    'enable_nsfw_filter', 'enable_violence_filter', 'enable_spam_filter', 'enable_gban_sync',
+    'auto_delete_messages', 'warn_before_ban', 'max_warnings', 'language'
+)
+
+# PRAGMA user_version once warning_counters has been backfilled from the warnings log
+WARNING_COUNTERS_VERSION = 1
+
 class Database:
     _instance = None
     _lock = threading.Lock()
     
-    def __new__(cls):
+    def __new__(cls, db_path: Optional[str] = None):
+        # An explicit path gets its own instance (benchmarks, tools)
+        if db_path is not None:
+            instance = super(Database, cls).__new__(cls)
+            instance._initialized = False
+            return instance
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
             cls._instance._initialized = False
         return cls._instance
     
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None):
         if self._initialized:
             return
             
-        self.db_path = Path("bot.db")
+        self.db_path = Path(db_path or "bot.db")
         self.lock = threading.RLock()
+        self._settings_versions: Dict[int, int] = {}
+        self._whitelist: Dict[int, Set[int]] = {}
+        self._whitelist_loaded = False
         self._init_db()
         self._initialized = True
         logger.info("Database initialized")
@@ -43,6 +67,9 @@ class Database:
             # Enable foreign keys
             cursor.execute("PRAGMA foreign_keys = ON")
             
+            # WAL lets worker processes read while another one writes
+            cursor.execute("PRAGMA journal_mode = WAL")
+            
             # Users table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -86,6 +113,32 @@ class Database:
                 )
             ''')
             
+            # Per-chat warning counters
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS warning_counters (
+                    user_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    last_warned_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, chat_id)
+                ) WITHOUT ROWID
+            ''')
+            
+            # Backfill counters from the warnings log exactly once, so counters
+            # cleared by reset_warnings stay cleared across restarts
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] < WARNING_COUNTERS_VERSION:
+                # Databases that already have counters were backfilled before the marker existed
+                cursor.execute('SELECT 1 FROM warning_counters LIMIT 1')
+                if cursor.fetchone() is None:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO warning_counters (user_id, chat_id, count, last_warned_at)
+                        SELECT user_id, chat_id, COUNT(*), COALESCE(MAX(CAST(strftime('%s', created_at) AS REAL)), 0)
+                        FROM warnings
+                        GROUP BY user_id, chat_id
+                    ''')
+                cursor.execute(f'PRAGMA user_version = {WARNING_COUNTERS_VERSION}')
+            
             # Moderated content table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS moderated_content (
@@ -152,6 +205,16 @@ class Database:
                 )
             ''')
             
+            # Chats locked during a join raid, with the permissions to restore
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS raid_lockdowns (
+                    chat_id INTEGER PRIMARY KEY,
+                    permissions TEXT NOT NULL,
+                    locked_until REAL NOT NULL,
+                    cohort_size INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            
             # Cache table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS cache (
@@ -165,9 +228,15 @@ class Database:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_warnings_user_id ON warnings(user_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_warnings_chat_id ON warnings(chat_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_moderated_content_user_id ON moderated_content(user_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_moderated_content_chat_id ON moderated_content(chat_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_whitelist_user_chat ON whitelist(user_id, chat_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_gban_list_active ON gban_list(is_active)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_moderated_content_chat_action ON moderated_content(chat_id, action_taken)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_moderated_content_created_at ON moderated_content(created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_whitelist_chat_user ON whitelist(chat_id, user_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_gban_list_active_banned_at ON gban_list(is_active, banned_at)')
+            
+            # Superseded by the composite indexes above (whitelist(user_id, chat_id) is the UNIQUE index)
+            cursor.execute('DROP INDEX IF EXISTS idx_moderated_content_chat_id')
+            cursor.execute('DROP INDEX IF EXISTS idx_whitelist_user_chat')
+            cursor.execute('DROP INDEX IF EXISTS idx_gban_list_active')
             
             conn.commit()
             conn.close()
@@ -193,6 +262,62 @@ class Database:
             finally:
                 conn.close()
     
+    def save_profiles(self, profiles: List[Tuple[int, str, str, str, datetime]]):
+        """Upsert (user_id, username, first_name, last_name, last_seen) rows in one transaction"""
+        if not profiles:
+            return
+        
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                # Unlike add_user this keeps the warning and GBAN columns
+                cursor.executemany('''
+                    INSERT INTO users (user_id, username, first_name, last_name, last_seen)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        username = excluded.username,
+                        first_name = excluded.first_name,
+                        last_name = excluded.last_name,
+                        last_seen = excluded.last_seen
+                ''', profiles)
+                
+                conn.commit()
+                logger.debug(f"Saved {len(profiles)} user profiles")
+            except Exception as e:
+                logger.error(f"Error saving {len(profiles)} user profiles: {e}")
+                conn.rollback()
+            finally:
+                conn.close()
+    
+    def get_profiles(self, user_ids: List[int]) -> Dict[int, Dict]:
+        """Bulk lookup of stored user names, returns {user_id: row} for known users"""
+        if not user_ids:
+            return {}
+        
+        unique_ids = list(dict.fromkeys(user_ids))
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                profiles = {}
+                for start in range(0, len(unique_ids), 500):
+                    chunk = unique_ids[start:start + 500]
+                    cursor.execute(f'''
+                        SELECT user_id, username, first_name, last_name, last_seen FROM users 
+                        WHERE user_id IN ({",".join("?" * len(chunk))})
+                    ''', chunk)
+                    profiles.update((row['user_id'], dict(row)) for row in cursor.fetchall())
+                return profiles
+            
+            except Exception as e:
+                logger.error(f"Error getting profiles for {len(unique_ids)} users: {e}")
+                return {}
+            finally:
+                conn.close()
+    
     # GBAN METHODS
     def add_to_gban(self, user_id: int, reason: str, banned_by: int) -> bool:
         """Add user to global ban list"""
@@ -283,6 +408,103 @@ class Database:
             finally:
                 conn.close()
     
+    def add_many_to_gban(self, user_ids: List[int], reason: str, banned_by: int) -> bool:
+        """Add a batch of users to the global ban list in one transaction"""
+        if not user_ids:
+            return True
+        
+        now = datetime.now()
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO gban_list 
+                    (user_id, reason, banned_by, is_active)
+                    VALUES (?, ?, ?, TRUE)
+                ''', ((user_id, reason, banned_by) for user_id in user_ids))
+                
+                # Update user records
+                cursor.executemany('''
+                    UPDATE users 
+                    SET is_gbanned = TRUE, gban_reason = ?, gbanned_by = ?, gbanned_at = ?
+                    WHERE user_id = ?
+                ''', ((reason, banned_by, now, user_id) for user_id in user_ids))
+                
+                conn.commit()
+                logger.info(f"{len(user_ids)} users added to GBAN list by {banned_by}")
+                return True
+            
+            except Exception as e:
+                logger.error(f"Error adding {len(user_ids)} users to GBAN: {e}")
+                conn.rollback()
+                return False
+            finally:
+                conn.close()
+    
+    def remove_many_from_gban(self, user_ids: List[int]) -> bool:
+        """Remove a batch of users from the global ban list in one transaction"""
+        if not user_ids:
+            return True
+        
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.executemany('''
+                    UPDATE gban_list 
+                    SET is_active = FALSE 
+                    WHERE user_id = ? AND is_active = TRUE
+                ''', ((user_id,) for user_id in user_ids))
+                
+                # Update user records
+                cursor.executemany('''
+                    UPDATE users 
+                    SET is_gbanned = FALSE, gban_reason = NULL, gbanned_by = NULL, gbanned_at = NULL
+                    WHERE user_id = ?
+                ''', ((user_id,) for user_id in user_ids))
+                
+                conn.commit()
+                logger.info(f"{len(user_ids)} users removed from GBAN list")
+                return True
+            
+            except Exception as e:
+                logger.error(f"Error removing {len(user_ids)} users from GBAN: {e}")
+                conn.rollback()
+                return False
+            finally:
+                conn.close()
+    
+    def get_gbanned_among(self, user_ids: List[int]) -> Dict[int, str]:
+        """Screen a batch of users, returns {user_id: reason} for the GBANNED ones"""
+        if not user_ids:
+            return {}
+        
+        unique_ids = list(dict.fromkeys(user_ids))
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                gbanned = {}
+                # Stay well under SQLite's bound parameter limit
+                for start in range(0, len(unique_ids), 500):
+                    chunk = unique_ids[start:start + 500]
+                    cursor.execute(f'''
+                        SELECT user_id, reason FROM gban_list 
+                        WHERE user_id IN ({",".join("?" * len(chunk))}) AND is_active = TRUE
+                    ''', chunk)
+                    gbanned.update((row['user_id'], row['reason']) for row in cursor.fetchall())
+                return gbanned
+            
+            except Exception as e:
+                logger.error(f"Error checking GBAN status for {len(unique_ids)} users: {e}")
+                return {}
+            finally:
+                conn.close()
+    
     def get_gban_list(self, limit: int = 100, offset: int = 0) -> List[Dict]:
         """Get global ban list"""
         with self.lock:
@@ -323,7 +545,7 @@ class Database:
                 # GBANs today
                 cursor.execute('''
                     SELECT COUNT(*) FROM gban_list 
-                    WHERE is_active = TRUE AND DATE(banned_at) = DATE('now')
+                    WHERE is_active = TRUE AND banned_at >= DATE('now') AND banned_at < DATE('now', '+1 day')
                 ''')
                 stats['gbans_today'] = cursor.fetchone()[0]
                 
@@ -430,65 +652,235 @@ class Database:
     # Existing methods (updated for GBAN integration)
     def add_warning(self, user_id: int, chat_id: int, warning_type: str, 
                    reason: str, moderator_id: int) -> int:
-        """Add warning for user"""
+        """Add warning for user, returns the user's warning count in this chat"""
+        warnings, _ = self.record_warning(user_id, chat_id, warning_type, reason, moderator_id)
+        return warnings
+    
+    def record_warning(self, user_id: int, chat_id: int, warning_type: str,
+                       reason: str, moderator_id: int) -> Tuple[int, bool]:
+        """Add warning and check the chat's max_warnings in one transaction
+        
+        Returns (warning_count, threshold_reached). GBANNED users are skipped
+        and reported as (999, False).
+        """
+        decay_seconds = config.WARNING_DECAY_HOURS * 3600
+        
         with self.lock:
             conn = self._get_connection()
             cursor = conn.cursor()
             
             try:
-                # Check if user is GBANNED
-                cursor.execute('SELECT 1 FROM gban_list WHERE user_id = ? AND is_active = TRUE', (user_id,))
-                if cursor.fetchone():
-                    logger.info(f"User {user_id} is GBANNED, skipping warning")
-                    return 999  # Special code for GBANNED users
+                cursor.execute('BEGIN IMMEDIATE')
                 
-                # Add warning
+                # Log the warning unless the user is GBANNED
                 cursor.execute('''
                     INSERT INTO warnings 
                     (user_id, chat_id, warning_type, reason, moderator_id)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (user_id, chat_id, warning_type, reason, moderator_id))
+                    SELECT ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM gban_list WHERE user_id = ? AND is_active = TRUE
+                    )
+                ''', (user_id, chat_id, warning_type, reason, moderator_id, user_id))
                 
-                # Update user warning count
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    logger.debug(f"User {user_id} is GBANNED, skipping warning")
+                    return 999, False  # Special code for GBANNED users
+                
+                # Bump the per-chat counter, forgiving one warning per full decay period
                 cursor.execute('''
-                    UPDATE users 
-                    SET warnings = warnings + 1 
-                    WHERE user_id = ?
-                ''', (user_id,))
+                    INSERT INTO warning_counters (user_id, chat_id, count, last_warned_at)
+                    VALUES (?, ?, 1, ?)
+                    ON CONFLICT(user_id, chat_id) DO UPDATE SET
+                        count = CASE
+                            WHEN ? > 0 THEN MAX(count - CAST((excluded.last_warned_at - last_warned_at) / ? AS INTEGER), 0)
+                            ELSE count
+                        END + 1,
+                        last_warned_at = excluded.last_warned_at
+                    RETURNING count, COALESCE(
+                        (SELECT max_warnings FROM settings WHERE chat_id = warning_counters.chat_id), ?
+                    ) AS max_warnings
+                ''', (user_id, chat_id, time.time(), decay_seconds, decay_seconds, config.MAX_WARNINGS))
                 
+                result = cursor.fetchone()
                 conn.commit()
                 
-                # Get current warning count
-                cursor.execute('SELECT warnings FROM users WHERE user_id = ?', (user_id,))
-                result = cursor.fetchone()
-                warnings = result['warnings'] if result else 0
+                warnings = result['count']
+                threshold_reached = warnings >= result['max_warnings']
                 
-                logger.info(f"Warning added for user {user_id}. Total warnings: {warnings}")
-                return warnings
+                logger.debug(f"Warning added for user {user_id} in chat {chat_id}. Total warnings: {warnings}")
+                return warnings, threshold_reached
                 
             except Exception as e:
                 logger.error(f"Error adding warning for user {user_id}: {e}")
                 conn.rollback()
+                return 0, False
+            finally:
+                conn.close()
+    
+    def get_warning_count(self, user_id: int, chat_id: int) -> int:
+        """Get the user's current (decayed) warning count in a chat"""
+        decay_seconds = config.WARNING_DECAY_HOURS * 3600
+        
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('''
+                    SELECT count, last_warned_at FROM warning_counters 
+                    WHERE user_id = ? AND chat_id = ?
+                ''', (user_id, chat_id))
+                
+                result = cursor.fetchone()
+                if not result:
+                    return 0
+                
+                if decay_seconds > 0:
+                    forgiven = int((time.time() - result['last_warned_at']) // decay_seconds)
+                    return max(result['count'] - forgiven, 0)
+                return result['count']
+            
+            except Exception as e:
+                logger.error(f"Error getting warnings for user {user_id} in chat {chat_id}: {e}")
                 return 0
             finally:
                 conn.close()
     
+    def reset_warnings(self, user_id: int, chat_id: int) -> bool:
+        """Clear the user's warning counter in a chat"""
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('''
+                    DELETE FROM warning_counters 
+                    WHERE user_id = ? AND chat_id = ?
+                ''', (user_id, chat_id))
+                
+                conn.commit()
+                return cursor.rowcount > 0
+            
+            except Exception as e:
+                logger.error(f"Error resetting warnings for user {user_id} in chat {chat_id}: {e}")
+                conn.rollback()
+                return False
+            finally:
+                conn.close()
+    
     def is_user_whitelisted(self, user_id: int, chat_id: int) -> bool:
-        """Check if user is whitelisted"""
+        """Check if user is whitelisted (served from the in-memory index)"""
+        members = self._whitelist.get(chat_id)
+        if members is None:
+            if self._whitelist_loaded:
+                _whitelist_hit.inc()
+                return False
+            _whitelist_miss.inc()
+            members = self._load_chat_whitelist(chat_id)
+        else:
+            _whitelist_hit.inc()
+        return user_id in members
+    
+    def _load_chat_whitelist(self, chat_id: int) -> Set[int]:
+        """Load the whitelist index for a single chat"""
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('SELECT user_id FROM whitelist WHERE chat_id = ?', (chat_id,))
+                members = {row['user_id'] for row in cursor.fetchall()}
+                self._whitelist[chat_id] = members
+                return members
+            
+            except Exception as e:
+                logger.error(f"Error loading whitelist for chat {chat_id}: {e}")
+                return set()
+            finally:
+                conn.close()
+    
+    def load_whitelist(self) -> int:
+        """Bulk-load the whitelist index for all chats"""
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('SELECT chat_id, user_id FROM whitelist')
+                index: Dict[int, Set[int]] = {}
+                total = 0
+                for row in cursor.fetchall():
+                    index.setdefault(row['chat_id'], set()).add(row['user_id'])
+                    total += 1
+                
+                self._whitelist = index
+                self._whitelist_loaded = True
+                logger.info(f"Whitelist index loaded: {total} entries in {len(index)} chats")
+                return total
+            
+            except Exception as e:
+                logger.error(f"Error loading whitelist index: {e}")
+                return 0
+            finally:
+                conn.close()
+    
+    def add_to_whitelist(self, user_id: int, chat_id: int, added_by: int = 0) -> bool:
+        """Add user to chat whitelist"""
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO whitelist (user_id, chat_id, added_by)
+                    VALUES (?, ?, ?)
+                ''', (user_id, chat_id, added_by))
+                
+                conn.commit()
+                members = self._whitelist.get(chat_id)
+                if members is None and self._whitelist_loaded:
+                    members = self._whitelist[chat_id] = set()
+                if members is not None:
+                    members.add(user_id)
+                
+                logger.info(f"User {user_id} whitelisted in chat {chat_id} by {added_by}")
+                return True
+            
+            except Exception as e:
+                logger.error(f"Error whitelisting user {user_id} in chat {chat_id}: {e}")
+                conn.rollback()
+                return False
+            finally:
+                conn.close()
+    
+    def remove_from_whitelist(self, user_id: int, chat_id: int) -> bool:
+        """Remove user from chat whitelist"""
         with self.lock:
             conn = self._get_connection()
             cursor = conn.cursor()
             
             try:
                 cursor.execute('''
-                    SELECT 1 FROM whitelist 
+                    DELETE FROM whitelist 
                     WHERE user_id = ? AND chat_id = ?
                 ''', (user_id, chat_id))
                 
-                return cursor.fetchone() is not None
+                conn.commit()
+                success = cursor.rowcount > 0
+                
+                members = self._whitelist.get(chat_id)
+                if members is not None:
+                    members.discard(user_id)
+                
+                if success:
+                    logger.info(f"User {user_id} removed from whitelist in chat {chat_id}")
+                
+                return success
                 
             except Exception as e:
-                logger.error(f"Error checking whitelist for user {user_id}: {e}")
+                logger.error(f"Error removing user {user_id} from whitelist in chat {chat_id}: {e}")
+                conn.rollback()
                 return False
             finally:
                 conn.close()
@@ -546,45 +938,99 @@ class Database:
             finally:
                 conn.close()
     
+    def get_settings_version(self, chat_id: int) -> int:
+        """Get in-memory settings version, bumped on every settings update"""
+        return self._settings_versions.get(chat_id, 0)
+    
     def update_chat_settings(self, chat_id: int, **kwargs):
-        """Update chat settings"""
+        """Update chat settings (only the given columns are written)"""
+        updates = {key: value for key, value in kwargs.items() if key in SETTINGS_COLUMNS}
+        if not updates:
+            return
+        
+        columns = ', '.join(updates)
+        placeholders = ', '.join('?' for _ in updates)
+        assignments = ', '.join(f"{key} = excluded.{key}" for key in updates)
+        
         with self.lock:
             conn = self._get_connection()
             cursor = conn.cursor()
             
             try:
-                # Get current settings
-                current = self.get_chat_settings(chat_id)
+                # Missing rows get the column defaults for everything else
+                cursor.execute(f'''
+                    INSERT INTO settings (chat_id, {columns})
+                    VALUES (?, {placeholders})
+                    ON CONFLICT(chat_id) DO UPDATE SET {assignments}
+                ''', (chat_id, *updates.values()))
                 
-                # Update with new values
-                for key, value in kwargs.items():
-                    if key in current and key != 'chat_id':
-                        current[key] = value
+                conn.commit()
+                self._settings_versions[chat_id] = self._settings_versions.get(chat_id, 0) + 1
+                logger.debug(f"Settings updated for chat {chat_id}: {updates}")
                 
-                # Update database
+            except Exception as e:
+                logger.error(f"Error updating settings for chat {chat_id}: {e}")
+                conn.rollback()
+            finally:
+                conn.close()
+    
+    def save_raid_lockdown(self, chat_id: int, permissions: Dict, locked_until: float, cohort_size: int) -> bool:
+        """Remember a raid lockdown and the chat permissions it replaced (locked_until is a unix time)"""
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
                 cursor.execute('''
-                    INSERT OR REPLACE INTO settings 
-                    (chat_id, enable_nsfw_filter, enable_violence_filter, enable_spam_filter,
-                     enable_gban_sync, auto_delete_messages, warn_before_ban, max_warnings, language)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    chat_id,
-                    current['enable_nsfw_filter'],
-                    current['enable_violence_filter'],
-                    current['enable_spam_filter'],
-                    current['enable_gban_sync'],
-                    current['auto_delete_messages'],
-                    current['warn_before_ban'],
-                    current['max_warnings'],
-                    current['language']
-                ))
+                    INSERT OR REPLACE INTO raid_lockdowns (chat_id, permissions, locked_until, cohort_size)
+                    VALUES (?, ?, ?, ?)
+                ''', (chat_id, json.dumps(permissions), locked_until, cohort_size))
                 
                 conn.commit()
-                logger.info(f"Settings updated for chat {chat_id}")
+                return True
+            
+            except Exception as e:
+                logger.error(f"Error saving raid lockdown for chat {chat_id}: {e}")
+                conn.rollback()
+                return False
+            finally:
+                conn.close()
+    
+    def get_raid_lockdowns(self) -> List[Dict]:
+        """All raid lockdowns not yet lifted"""
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('SELECT chat_id, permissions, locked_until, cohort_size FROM raid_lockdowns')
+                return [
+                    {**dict(row), 'permissions': json.loads(row['permissions'])}
+                    for row in cursor.fetchall()
+                ]
+            
+            except Exception as e:
+                logger.error(f"Error getting raid lockdowns: {e}")
+                return []
+            finally:
+                conn.close()
+    
+    def remove_raid_lockdown(self, chat_id: int) -> bool:
+        """Forget a lifted raid lockdown"""
+        with self.lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('DELETE FROM raid_lockdowns WHERE chat_id = ?', (chat_id,))
                 
+                conn.commit()
+                return cursor.rowcount > 0
+            
             except Exception as e:
-                logger.error(f"Error updating settings for chat {chat_id}: {e}")
+                logger.error(f"Error removing raid lockdown for chat {chat_id}: {e}")
                 conn.rollback()
+                return False
             finally:
                 conn.close()
     
@@ -639,7 +1085,7 @@ class Database:
                 # Get today's actions
                 cursor.execute('''
                     SELECT COUNT(*) FROM moderated_content 
-                    WHERE DATE(created_at) = DATE('now')
+                    WHERE created_at >= DATE('now') AND created_at < DATE('now', '+1 day')
                 ''')
                 stats['today_actions'] = cursor.fetchone()[0]
                 
@@ -675,3 +1121,6 @@ class Database:
 
 # Create global database instance
 db = Database()
+
+# Per-method call, error and latency metrics
+instrument_methods(db)
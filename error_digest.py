@@ -0,0 +1,183 @@
+"""
+Error Digest
+Groups handler exceptions by type and location and sends admins one
+summary per window instead of one message per exception
+"""
+
+import asyncio
+import html
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from telegram.constants import MessageLimit
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+def error_location(error: BaseException) -> str:
+    """Innermost traceback frame inside the bot's own code, else the innermost frame"""
+    tb = error.__traceback__
+    if tb is None:
+        return "unknown"
+    
+    base_dir = str(config.BASE_DIR)
+    innermost = own = None
+    while tb is not None:
+        innermost = tb
+        filename = tb.tb_frame.f_code.co_filename
+        # A virtualenv inside the repo is still library code
+        if filename.startswith(base_dir) and 'site-packages' not in filename:
+            own = tb
+        tb = tb.tb_next
+    
+    frame = own or innermost
+    code = frame.tb_frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{frame.tb_lineno} in {code.co_name}"
+
+class ErrorAggregator:
+    """Windowed error grouping with a ring buffer of recent errors"""
+    
+    def __init__(self, window: float = 60, buffer_size: int = 200):
+        self.window = window
+        self.recent: Deque[Dict] = deque(maxlen=buffer_size)
+        self.pending: Dict[Tuple[str, str], Dict] = {}
+        self.total = 0
+        self.digests_sent = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    def record(self, error: BaseException, update: object = None):
+        """Add an error to the current window"""
+        error_type = type(error).__name__
+        location = error_location(error)
+        message = str(error)[:200]
+        now = datetime.now()
+        
+        chat_id = None
+        effective_chat = getattr(update, 'effective_chat', None)
+        if effective_chat:
+            chat_id = effective_chat.id
+        
+        self.total += 1
+        self.recent.append({
+            'time': now,
+            'type': error_type,
+            'location': location,
+            'message': message,
+            'chat_id': chat_id
+        })
+        
+        group = self.pending.get((error_type, location))
+        if group is None:
+            self.pending[(error_type, location)] = {
+                'type': error_type,
+                'location': location,
+                'message': message,
+                'count': 1,
+                'chats': {chat_id} if chat_id else set(),
+                'first_seen': now,
+                'last_seen': now
+            }
+        else:
+            group['count'] += 1
+            group['last_seen'] = now
+            if chat_id and len(group['chats']) < 100:
+                group['chats'].add(chat_id)
+    
+    def format_digest(self, groups: List[Dict], limit: int = MessageLimit.MAX_TEXT_LENGTH) -> List[str]:
+        """Digest text split into messages of at most limit characters"""
+        total = sum(g['count'] for g in groups)
+        header = f"⚠️ <b>Bot Errors</b> — {total} in the last {int(self.window)}s\n\n"
+        
+        entries = []
+        for group in sorted(groups, key=lambda g: g['count'], reverse=True)[:15]:
+            entry = (
+                f"• <b>{html.escape(group['type'])}</b> ×{group['count']} "
+                f"at <code>{html.escape(group['location'][:200])}</code>\n"
+                f"  <code>{html.escape(group['message'])}</code>\n"
+            )
+            if group['chats']:
+                entry += f"  Chats affected: {len(group['chats'])}\n"
+            entries.append(entry)
+        if len(groups) > 15:
+            entries.append(f"\n…and {len(groups) - 15} more error groups")
+        
+        # Entries are never cut, so every message stays valid HTML
+        messages = [header]
+        for entry in entries:
+            if len(messages[-1]) + len(entry) > limit:
+                messages.append("")
+            messages[-1] += entry
+        return messages
+    
+    async def flush(self, bot):
+        """Send the pending window as one digest to every admin"""
+        if not self.pending:
+            return
+        
+        if not config.ADMIN_IDS:
+            self.pending = {}
+            return
+        
+        # Errors recorded while sending start the next window
+        groups, self.pending = self.pending, {}
+        messages = self.format_digest(list(groups.values()))
+        
+        async def send(admin_id: int):
+            for text in messages:
+                await bot.send_message(chat_id=admin_id, text=text, parse_mode='HTML')
+        
+        results = await asyncio.gather(*(send(admin_id) for admin_id in config.ADMIN_IDS), return_exceptions=True)
+        
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        if failed == len(results):
+            self._requeue(groups)
+            logger.warning(f"Error digest could not be sent, keeping {len(groups)} error groups for the next window")
+            return
+        
+        self.digests_sent += 1
+        if failed:
+            logger.warning(f"Error digest failed for {failed}/{len(results)} admins")
+    
+    def _requeue(self, groups: Dict[Tuple[str, str], Dict]):
+        """Merge an unsent window back into the pending one"""
+        for key, group in groups.items():
+            newer = self.pending.get(key)
+            if newer is not None:
+                group['count'] += newer['count']
+                group['last_seen'] = newer['last_seen']
+                group['chats'] |= newer['chats']
+            self.pending[key] = group
+    
+    async def _run(self, bot):
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush(bot)
+            except Exception as e:
+                # Never report digest failures through the aggregator itself
+                logger.error(f"Failed to send error digest: {e}")
+    
+    def start(self, bot):
+        """Start the periodic digest task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(bot))
+    
+    def get_recent(self, limit: int = 10) -> List[Dict]:
+        """Most recent errors, newest first"""
+        return list(self.recent)[-limit:][::-1]
+    
+    def get_stats(self) -> Dict:
+        return {
+            'total': self.total,
+            'buffered': len(self.recent),
+            'pending_groups': len(self.pending),
+            'pending_errors': sum(g['count'] for g in self.pending.values()),
+            'digests_sent': self.digests_sent
+        }
+
+# Global error aggregator
+error_aggregator = ErrorAggregator(window=config.ERROR_DIGEST_INTERVAL, buffer_size=config.ERROR_BUFFER_SIZE)
@@ -5,7 +5,8 @@ Allows banning users across all chats where bot is admin
 
 import logging
 import asyncio
-from typing import Dict, List, Optional, Tuple
+import html
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 
 from telegram import Update, ChatPermissions
@@ -13,10 +14,14 @@ from telegram.ext import ContextTypes
 
 from config import config
 from database import db
+from profiles import profile_store
 from utils import is_admin
 
 logger = logging.getLogger(__name__)
 
+# Bounds in-flight bans per process; the outbound rate limiter paces them
+_ban_slots = asyncio.Semaphore(config.GBAN_BAN_CONCURRENCY)
+
 class GBanSystem:
     """Global Ban System Manager"""
     
@@ -35,12 +40,7 @@ class GBanSystem:
                 return {'success': False, 'error': f'User is already GBANNED. Reason: {existing_reason}'}
             
             # Get user info
-            user_info = ""
-            try:
-                user = await context.bot.get_chat(user_id)
-                user_info = f"{user.first_name} (@{user.username})" if user.username else user.first_name
-            except:
-                user_info = f"User {user_id}"
+            user_info = profile_store.display_name(user_id, context.bot)
             
             # Add to GBAN list
             success = db.add_to_gban(
@@ -92,12 +92,7 @@ class GBanSystem:
             unbanned_chats = await GBanSystem._unban_from_all_chats(user_id, context)
             
             # Get user info
-            user_info = ""
-            try:
-                user = await context.bot.get_chat(user_id)
-                user_info = f"{user.first_name} (@{user.username})" if user.username else user.first_name
-            except:
-                user_info = f"User {user_id}"
+            user_info = profile_store.display_name(user_id, context.bot)
             
             result = {
                 'success': True,
@@ -115,6 +110,73 @@ class GBanSystem:
             logger.error(f"❌ Error in UNGBAN: {e}")
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    async def gban_users(update: Update, context: ContextTypes.DEFAULT_TYPE, user_ids: List[int],
+                         reason: str, progress: Optional[Callable[[str], Awaitable[None]]] = None) -> Dict:
+        """Globally ban a batch of users with one transaction and one fan-out"""
+        try:
+            caller_id = update.effective_user.id
+            user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id != caller_id]
+            
+            already = db.get_gbanned_among(user_ids)
+            new_ids = [user_id for user_id in user_ids if user_id not in already]
+            if progress:
+                await progress(f"🔍 {len(new_ids)} to GBAN, {len(already)} already GBANNED")
+            
+            if not db.add_many_to_gban(new_ids, reason, caller_id):
+                return {'success': False, 'error': 'Failed to add to GBAN database'}
+            if progress:
+                await progress(f"💾 Saved {len(new_ids)} GBANs, applying...")
+            
+            banned_chats = await GBanSystem._ban_many_from_all_chats(new_ids, context, reason)
+            
+            logger.info(f"✅ {len(new_ids)} users GBANNED by {caller_id}. Reason: {reason}")
+            return {
+                'success': True,
+                'gbanned': new_ids,
+                'already_gbanned': list(already),
+                'reason': reason,
+                'banned_by': caller_id,
+                'banned_chats': banned_chats,
+                'timestamp': datetime.now().isoformat()
+            }
+        
+        except Exception as e:
+            logger.error(f"❌ Error in bulk GBAN: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    async def ungban_users(update: Update, context: ContextTypes.DEFAULT_TYPE, user_ids: List[int],
+                           progress: Optional[Callable[[str], Awaitable[None]]] = None) -> Dict:
+        """Remove a batch of users from the global ban with one transaction and one fan-out"""
+        try:
+            user_ids = list(dict.fromkeys(user_ids))
+            gbanned = db.get_gbanned_among(user_ids)
+            removed_ids = [user_id for user_id in user_ids if user_id in gbanned]
+            if progress:
+                await progress(f"🔍 {len(removed_ids)} to UNGBAN, {len(user_ids) - len(removed_ids)} not GBANNED")
+            
+            if not db.remove_many_from_gban(removed_ids):
+                return {'success': False, 'error': 'Failed to remove from GBAN database'}
+            if progress:
+                await progress(f"💾 Removed {len(removed_ids)} GBANs, applying...")
+            
+            unbanned_chats = await GBanSystem._unban_many_from_all_chats(removed_ids, context)
+            
+            logger.info(f"✅ {len(removed_ids)} users UNGBANNED by {update.effective_user.id}")
+            return {
+                'success': True,
+                'ungbanned': removed_ids,
+                'not_gbanned': [user_id for user_id in user_ids if user_id not in gbanned],
+                'removed_by': update.effective_user.id,
+                'unbanned_chats': unbanned_chats,
+                'timestamp': datetime.now().isoformat()
+            }
+        
+        except Exception as e:
+            logger.error(f"❌ Error in bulk UNGBAN: {e}")
+            return {'success': False, 'error': str(e)}
+    
     @staticmethod
     async def _ban_from_all_chats(user_id: int, context: ContextTypes.DEFAULT_TYPE, 
                                 reason: str) -> List[int]:
@@ -142,9 +204,26 @@ class GBanSystem:
         logger.info(f"User {user_id} removed from GBAN list.")
         return unbanned_chats
     
+    @staticmethod
+    async def _ban_many_from_all_chats(user_ids: List[int], context: ContextTypes.DEFAULT_TYPE,
+                                       reason: str) -> List[int]:
+        """Batch counterpart of _ban_from_all_chats"""
+        # Same enforcement as single GBANs: members are banned when they join
+        # or post in a protected chat, so one pass covers the whole batch
+        if user_ids:
+            logger.info(f"{len(user_ids)} users added to GBAN list. Will be banned from chats on join.")
+        return []
+    
+    @staticmethod
+    async def _unban_many_from_all_chats(user_ids: List[int], context: ContextTypes.DEFAULT_TYPE) -> List[int]:
+        """Batch counterpart of _unban_from_all_chats"""
+        if user_ids:
+            logger.info(f"{len(user_ids)} users removed from GBAN list.")
+        return []
+    
     @staticmethod
     async def check_gban_on_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Check if joining user is GBANNED"""
+        """Screen all joining members at once and ban the GBANNED ones"""
         try:
             # Check if it's a new chat member
             if not update.message or not update.message.new_chat_members:
@@ -157,40 +236,55 @@ class GBanSystem:
             if not settings.get('enable_gban_sync', True):
                 return
             
-            for new_member in update.message.new_chat_members:
-                user_id = new_member.id
-                
-                # Check if user is GBANNED
-                is_gbanned, reason = db.is_user_gbanned(user_id)
-                
-                if is_gbanned:
-                    # Ban the user
-                    try:
-                        await context.bot.ban_chat_member(
-                            chat_id=chat_id,
-                            user_id=user_id,
-                            until_date=None
-                        )
-                        
-                        # Send notification
-                        await context.bot.send_message(
-                            chat_id=chat_id,
-                            text=f"🚫 *GBANNED User Detected*\n\n"
-                                 f"User: {new_member.mention_html()}\n"
-                                 f"ID: `{user_id}`\n"
-                                 f"Reason: {reason}\n\n"
-                                 f"This user is globally banned from all protected chats.",
-                            parse_mode='HTML'
-                        )
-                        
-                        logger.info(f"✅ GBANNED user {user_id} banned from chat {chat_id}")
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to ban GBANNED user {user_id}: {e}")
+            members = {member.id: member for member in update.message.new_chat_members}
+            gbanned = db.get_gbanned_among(list(members))
+            if not gbanned:
+                return
+            
+            async def ban(user_id: int):
+                async with _ban_slots:
+                    await context.bot.ban_chat_member(chat_id=chat_id, user_id=user_id, until_date=None)
+            
+            user_ids = [user_id for user_id in members if user_id in gbanned]
+            results = await asyncio.gather(*(ban(user_id) for user_id in user_ids), return_exceptions=True)
+            
+            banned = [user_id for user_id, result in zip(user_ids, results) if not isinstance(result, Exception)]
+            failed = [(user_id, result) for user_id, result in zip(user_ids, results) if isinstance(result, Exception)]
+            
+            if failed:
+                logger.error(
+                    f"Failed to ban {len(failed)} GBANNED users in chat {chat_id}: "
+                    f"{', '.join(f'{user_id} ({error})' for user_id, error in failed[:5])}"
+                )
+            
+            if banned:
+                await context.bot.send_message(
+                    chat_id=chat_id,
+                    text=GBanSystem._format_join_bans(banned, members, gbanned),
+                    parse_mode='HTML'
+                )
+                logger.debug(f"{len(banned)} GBANNED users banned from chat {chat_id}")
         
         except Exception as e:
             logger.error(f"Error checking GBAN on join: {e}")
     
+    @staticmethod
+    def _format_join_bans(banned: List[int], members: Dict, reasons: Dict[int, str], limit: int = 20) -> str:
+        """One summary message for all GBANNED users banned from a join batch"""
+        title = "GBANNED User Detected" if len(banned) == 1 else f"{len(banned)} GBANNED Users Detected"
+        lines = [f"🚫 <b>{title}</b>\n"]
+        
+        for user_id in banned[:limit]:
+            lines.append(
+                f"• {members[user_id].mention_html()} (<code>{user_id}</code>): "
+                f"{html.escape(reasons[user_id] or '')}"
+            )
+        if len(banned) > limit:
+            lines.append(f"…and {len(banned) - limit} more")
+        
+        lines.append("\nGBANNED users are banned from all protected chats.")
+        return "\n".join(lines)
+    
     @staticmethod
     async def gban_list(update: Update, context: ContextTypes.DEFAULT_TYPE,
                        page: int = 1) -> Dict:
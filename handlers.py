@@ -1,9 +1,14 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import MessageLimit
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 import os
+import io
+import csv
+import html
+import time
 import asyncio
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 from config import config
@@ -11,7 +16,20 @@ from database import db
 from moderator import moderator
 from actions import ActionManager
 from gban import gban_system
+from raid import raid_detector
+from join_requests import join_request_screener
 from sudo import sudo_system
+from pipeline import pipeline_cache
+from callback_store import callback_store
+from callback_router import callback_router
+from views import View, view_cache
+from settings_session import settings_sessions
+from profiles import profile_store
+from update_processor import update_processor
+from error_digest import error_aggregator
+from tracing import tracer
+from profiler import profiler
+from loop_watchdog import watchdog
 from utils import (
     download_file, is_admin, is_sudo, format_bytes, 
     backup_database, get_bot_info, execute_shell, eval_python
@@ -19,6 +37,15 @@ from utils import (
 
 logger = logging.getLogger(__name__)
 
+BUTTON_EXPIRED = "⌛ This button has expired, please run the command again."
+
+# Largest ID list file bulk /gban and /ungban will download
+GBAN_BULK_FILE_LIMIT = 1024 * 1024
+ID_SOURCE_CONFLICT = "❌ Reply to an ID list file or type the IDs, not both."
+TOO_MANY_IDS = "❌ Too many IDs ({count}, max {limit})"
+# Ends a list of typed /gban IDs so a reason starting with a number is never read as more IDs
+REASON_SEPARATOR = '--'
+
 # Store user message history for spam detection
 user_message_history: Dict[int, List[Dict]] = {}
 
@@ -74,11 +101,13 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         welcome_text += (
             "*⚡ Admin Commands:*\n"
             f"/warn <user_id> <reason> - Warn a user\n"
+            f"/unwarn <user_id> - Clear a user's warnings\n"
             f"/ban <user_id> <reason> - Ban a user\n"
             f"/mute <user_id> <duration> <reason> - Mute a user\n"
             f"/kick <user_id> <reason> - Kick a user\n"
             f"/whitelist <user_id> - Add to whitelist\n"
             f"/unwhitelist <user_id> - Remove from whitelist\n"
+            f"/unlock - Lift a raid lockdown\n"
             f"/settings - Configure bot\n"
             f"/stats - View statistics\n"
             f"/logs - View recent logs\n"
@@ -107,38 +136,84 @@ async def gban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("👑 Sudo only command")
         return
     
-    if len(context.args) < 2:
-        await update.message.reply_text(
-            "Usage: `/gban <user_id> <reason>`\n\n"
-            "Example: `/gban 123456 Spamming multiple groups`\n"
-            "Example: `/gban 123456 Posting illegal content everywhere`",
-            parse_mode='Markdown'
-        )
-        return
-    
     try:
-        user_id = int(context.args[0])
-        reason = ' '.join(context.args[1:])
+        # IDs come from a replied-to ID list file or lead the arguments, never both
+        args = context.args or []
+        document = get_id_list_document(update)
+        id_args, reason_args = split_gban_args(args, from_file=document is not None)
+        if document is not None and id_args:
+            await update.message.reply_text(ID_SOURCE_CONFLICT)
+            return
+        
+        user_ids, invalid = parse_id_args(id_args)
+        if invalid:
+            await update.message.reply_text(f"❌ Not a user ID: {invalid[0]}")
+            return
+        if len(user_ids) > 1 and REASON_SEPARATOR not in args:
+            await update.message.reply_text(
+                "❌ End a list of IDs with `--` before the reason, e.g. `/gban 123456 234567 -- Spam wave`",
+                parse_mode='Markdown'
+            )
+            return
+        if len(user_ids) > config.GBAN_BULK_MAX:
+            await update.message.reply_text(TOO_MANY_IDS.format(count=len(user_ids), limit=config.GBAN_BULK_MAX))
+            return
+        reason = ' '.join(reason_args)
+        
+        if (document is None and not user_ids) or not reason:
+            await update.message.reply_text(
+                "Usage: `/gban <user_id> <reason>`\n"
+                "Several users: `/gban <user_id> <user_id> ... -- <reason>`\n"
+                "Or reply to a .txt/.csv list of IDs with `/gban <reason>`\n\n"
+                "Example: `/gban 123456 Spamming multiple groups`\n"
+                "Example: `/gban 123456 234567 345678 -- Spam wave`",
+                parse_mode='Markdown'
+            )
+            return
+        
+        if document is None and len(user_ids) == 1:
+            user_id = user_ids[0]
+            result = await gban_system.gban_user(update, context, user_id, reason)
+            
+            if result['success']:
+                response = (
+                    f"✅ *User Globally Banned*\n\n"
+                    f"*User:* {result.get('user_info', f'ID: {user_id}')}\n"
+                    f"*User ID:* `{user_id}`\n"
+                    f"*Reason:* {reason}\n"
+                    f"*Banned by:* {update.effective_user.mention_html()}\n"
+                    f"*Time:* {result['timestamp'][:19]}\n"
+                    f"*Chats banned:* {len(result.get('banned_chats', []))}"
+                )
+            else:
+                response = f"❌ *GBAN Failed*\n\nError: {result.get('error', 'Unknown error')}"
+            
+            await update.message.reply_text(response, parse_mode='HTML')
+            return
+        
+        progress = ProgressMessage(await update.message.reply_text("⏳ Bulk GBAN starting..."))
+        if document is not None:
+            user_ids = await read_user_id_file(document, context, progress)
+            if user_ids is None:
+                return
         
-        result = await gban_system.gban_user(update, context, user_id, reason)
+        result = await gban_system.gban_users(update, context, user_ids, reason, progress)
         
         if result['success']:
             response = (
-                f"✅ *User Globally Banned*\n\n"
-                f"*User:* {result.get('user_info', f'ID: {user_id}')}\n"
-                f"*User ID:* `{user_id}`\n"
-                f"*Reason:* {reason}\n"
-                f"*Banned by:* {update.effective_user.mention_html()}\n"
-                f"*Time:* {result['timestamp'][:19]}\n"
-                f"*Chats banned:* {len(result.get('banned_chats', []))}"
+                f"✅ <b>Bulk GBAN Complete</b>\n\n"
+                f"<b>GBANNED:</b> {len(result['gbanned'])}\n"
+                f"<b>Already GBANNED:</b> {len(result['already_gbanned'])}\n"
+                f"<b>Reason:</b> {html.escape(reason)}\n"
+                f"<b>Banned by:</b> {update.effective_user.mention_html()}\n"
+                f"<b>Time:</b> {result['timestamp'][:19]}"
+                f"{format_id_sample(result['gbanned'])}"
             )
         else:
-            response = f"❌ *GBAN Failed*\n\nError: {result.get('error', 'Unknown error')}"
+            response = f"❌ <b>Bulk GBAN Failed</b>\n\nError: {html.escape(result.get('error', 'Unknown error'))}"
         
-        await update.message.reply_text(response, parse_mode='HTML')
+        await progress.update(response, final=True)
         
-    except ValueError:
-        await update.message.reply_text("❌ Invalid user ID.")
     except Exception as e:
         logger.error(f"Error in gban command: {e}")
         await update.message.reply_text(f"❌ Error: {str(e)}")
@@ -149,35 +224,70 @@ async def ungban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("👑 Sudo only command")
         return
     
-    if len(context.args) < 1:
-        await update.message.reply_text(
-            "Usage: `/ungban <user_id>`\n\n"
-            "Example: `/ungban 123456`",
-            parse_mode='Markdown'
-        )
-        return
-    
     try:
-        user_id = int(context.args[0])
+        document = get_id_list_document(update)
+        if document is not None and context.args:
+            await update.message.reply_text(ID_SOURCE_CONFLICT)
+            return
+        
+        user_ids, invalid = parse_id_args(context.args or [])
+        if invalid:
+            await update.message.reply_text(f"❌ Not a user ID: {invalid[0]}")
+            return
+        if len(user_ids) > config.GBAN_BULK_MAX:
+            await update.message.reply_text(TOO_MANY_IDS.format(count=len(user_ids), limit=config.GBAN_BULK_MAX))
+            return
+        
+        if document is None and not user_ids:
+            await update.message.reply_text(
+                "Usage: `/ungban <user_id> [<user_id> ...]`\n"
+                "Or reply to a .txt/.csv list of IDs with `/ungban`\n\n"
+                "Example: `/ungban 123456`",
+                parse_mode='Markdown'
+            )
+            return
+        
+        if document is None and len(user_ids) == 1:
+            user_id = user_ids[0]
+            result = await gban_system.ungban_user(update, context, user_id)
+            
+            if result['success']:
+                response = (
+                    f"✅ *User Globally Unbanned*\n\n"
+                    f"*User:* {result.get('user_info', f'ID: {user_id}')}\n"
+                    f"*User ID:* `{user_id}`\n"
+                    f"*Removed by:* {update.effective_user.mention_html()}\n"
+                    f"*Time:* {result['timestamp'][:19]}\n"
+                    f"*Chats unbanned:* {len(result.get('unbanned_chats', []))}"
+                )
+            else:
+                response = f"❌ *UNGBAN Failed*\n\nError: {result.get('error', 'Unknown error')}"
+            
+            await update.message.reply_text(response, parse_mode='HTML')
+            return
+        
+        progress = ProgressMessage(await update.message.reply_text("⏳ Bulk UNGBAN starting..."))
+        if document is not None:
+            user_ids = await read_user_id_file(document, context, progress)
+            if user_ids is None:
+                return
         
-        result = await gban_system.ungban_user(update, context, user_id)
+        result = await gban_system.ungban_users(update, context, user_ids, progress)
         
         if result['success']:
             response = (
-                f"✅ *User Globally Unbanned*\n\n"
-                f"*User:* {result.get('user_info', f'ID: {user_id}')}\n"
-                f"*User ID:* `{user_id}`\n"
-                f"*Removed by:* {update.effective_user.mention_html()}\n"
-                f"*Time:* {result['timestamp'][:19]}\n"
-                f"*Chats unbanned:* {len(result.get('unbanned_chats', []))}"
+                f"✅ <b>Bulk UNGBAN Complete</b>\n\n"
+                f"<b>UNGBANNED:</b> {len(result['ungbanned'])}\n"
+                f"<b>Not GBANNED:</b> {len(result['not_gbanned'])}\n"
+                f"<b>Removed by:</b> {update.effective_user.mention_html()}\n"
+                f"<b>Time:</b> {result['timestamp'][:19]}"
+                f"{format_id_sample(result['ungbanned'])}"
             )
         else:
-            response = f"❌ *UNGBAN Failed*\n\nError: {result.get('error', 'Unknown error')}"
+            response = f"❌ <b>Bulk UNGBAN Failed</b>\n\nError: {html.escape(result.get('error', 'Unknown error'))}"
         
-        await update.message.reply_text(response, parse_mode='HTML')
+        await progress.update(response, final=True)
         
-    except ValueError:
-        await update.message.reply_text("❌ Invalid user ID.")
     except Exception as e:
         logger.error(f"Error in ungban command: {e}")
         await update.message.reply_text(f"❌ Error: {str(e)}")
@@ -414,6 +524,209 @@ async def sudostats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error in sudostats command: {e}")
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
+async def errors_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /errors command (sudo only)"""
+    if not await is_sudo(update, context):
+        await update.message.reply_text("👑 Sudo only command")
+        return
+    
+    limit = 10
+    if context.args:
+        try:
+            limit = max(1, min(int(context.args[0]), 50))
+        except ValueError:
+            await update.message.reply_text("Usage: /errors <count>")
+            return
+    
+    stats = error_aggregator.get_stats()
+    recent = error_aggregator.get_recent(limit)
+    
+    response = (
+        f"🧯 <b>Recent Errors</b>\n\n"
+        f"<b>Total since start:</b> {stats['total']}\n"
+        f"<b>Pending digest:</b> {stats['pending_errors']} in {stats['pending_groups']} groups\n"
+        f"<b>Digests sent:</b> {stats['digests_sent']}\n\n"
+    )
+    
+    if not recent:
+        response += "✅ No errors recorded"
+    
+    # Whole entries only, keeping room for the omitted count
+    reserve = len(f"… {len(recent)} more omitted")
+    shown = 0
+    for entry in recent:
+        line = (
+            f"• {entry['time'].strftime('%H:%M:%S')} <b>{html.escape(entry['type'])}</b> "
+            f"at <code>{html.escape(entry['location'])}</code>\n"
+            f"  <code>{html.escape(entry['message'][:120])}</code>\n"
+        )
+        if len(response) + len(line) + reserve > MessageLimit.MAX_TEXT_LENGTH:
+            break
+        response += line
+        shown += 1
+    
+    if shown < len(recent):
+        response += f"… {len(recent) - shown} more omitted"
+    
+    await update.message.reply_text(response, parse_mode='HTML')
+
+async def trace_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /trace command (sudo only)"""
+    if not await is_sudo(update, context):
+        await update.message.reply_text("👑 Sudo only command")
+        return
+    
+    # /trace <id> shows the span breakdown of one slow update
+    if context.args and context.args[0].lstrip('#').isdigit():
+        trace = tracer.get(int(context.args[0].lstrip('#')))
+        if not trace:
+            await update.message.reply_text("❌ Trace not found (it may have been evicted)")
+            return
+        
+        response = (
+            f"🔬 <b>Trace #{trace.id}</b>\n\n"
+            f"<b>Update:</b> <code>{html.escape(trace.name)}</code>\n"
+            f"<b>Chat:</b> <code>{trace.chat_id}</code>\n"
+            f"<b>At:</b> {trace.wall_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"<b>Total:</b> {trace.duration * 1000:.1f}ms\n\n"
+            f"<b>By span:</b>\n"
+        )
+        for span in trace.top_spans(10):
+            response += f"• {span['kind']}.{html.escape(span['name'])} ×{span['count']}: {span['total_ms']:.1f}ms\n"
+        
+        response += "\n<b>Timeline:</b>\n"
+        for kind, name, offset, elapsed in sorted(trace.spans, key=lambda span: span[2])[:25]:
+            response += f"<code>+{offset * 1000:7.1f}ms {elapsed * 1000:7.1f}ms</code> {kind}.{html.escape(name)}\n"
+        if len(trace.spans) > 25 or trace.dropped:
+            response += f"…{len(trace.spans) - 25 + trace.dropped} more spans\n"
+        
+        await update.message.reply_text(response, parse_mode='HTML')
+        return
+    
+    stats = tracer.get_stats()
+    slowest = tracer.get_slowest(10)
+    
+    response = (
+        f"🐢 <b>Slowest Recent Updates</b>\n\n"
+        f"<b>Traced:</b> {stats['traced']} updates, {stats['slow_kept']} over {stats['threshold_ms']:.0f}ms kept\n\n"
+    )
+    
+    if not slowest:
+        response += "✅ No slow updates recorded"
+    
+    for trace in slowest:
+        top = trace.top_spans(1)
+        hotspot = f" — {top[0]['kind']}.{html.escape(top[0]['name'])} {top[0]['total_ms']:.0f}ms" if top else ""
+        response += (
+            f"• <code>#{trace.id}</code> {trace.duration * 1000:.0f}ms "
+            f"<code>{html.escape(trace.name)}</code>{hotspot}\n"
+        )
+    
+    if slowest:
+        response += "\nUse /trace &lt;id&gt; for the span breakdown"
+    
+    await update.message.reply_text(response, parse_mode='HTML')
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /profile command (sudo only)"""
+    if not await is_sudo(update, context):
+        await update.message.reply_text("👑 Sudo only command")
+        return
+    
+    if profiler.running:
+        await update.message.reply_text("⏳ A profile is already running")
+        return
+    
+    seconds = 10
+    if context.args:
+        try:
+            seconds = float(context.args[0])
+        except ValueError:
+            await update.message.reply_text("Usage: /profile <seconds>")
+            return
+    seconds = max(1.0, min(seconds, config.PROFILER_MAX_SECONDS))
+    
+    await update.message.reply_text(f"🔥 Profiling for {seconds:.0f}s...")
+    
+    # Sample in the background so this chat's later updates are not held up
+    context.application.create_task(send_profile(update, seconds))
+
+async def send_profile(update: Update, seconds: float):
+    """Run the sampling profiler and reply with the collapsed stacks and hot functions"""
+    try:
+        await profiler.profile(seconds)
+        
+        summary = (
+            f"🔥 <b>Profile</b> — {profiler.samples} samples over {profiler.duration:.1f}s, "
+            f"{profiler.idle_pct():.0f}% idle\n\n"
+            f"<b>Hot functions (self / total):</b>\n"
+        )
+        for entry in profiler.top_functions(15):
+            line = (
+                f"<code>{entry['self_pct']:5.1f}% {entry['total_pct']:5.1f}%</code> "
+                f"{html.escape(entry['function'])}\n"
+            )
+            # Whole lines only, so the HTML stays valid
+            if len(summary) + len(line) > MessageLimit.MAX_TEXT_LENGTH:
+                break
+            summary += line
+        
+        document = io.BytesIO(profiler.collapsed().encode('utf-8'))
+        await update.message.reply_document(
+            document=document,
+            filename=f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.collapsed.txt",
+            caption="Collapsed stacks (flamegraph.pl / speedscope)"
+        )
+        await update.message.reply_text(summary, parse_mode='HTML')
+    
+    except Exception as e:
+        logger.error(f"Error in profile command: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def lag_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /lag command (sudo only)"""
+    if not await is_sudo(update, context):
+        await update.message.reply_text("👑 Sudo only command")
+        return
+    
+    lag = watchdog.lag_percentiles()
+    response = (
+        f"⏱️ <b>Event Loop Lag</b>\n\n"
+        f"<b>p50:</b> {lag['p50_ms']:.1f}ms\n"
+        f"<b>p99:</b> {lag['p99_ms']:.1f}ms\n"
+        f"<b>Max:</b> {lag['max_ms']:.1f}ms\n"
+        f"<b>Stalls over {watchdog.threshold * 1000:.0f}ms:</b> {watchdog.stall_count}\n"
+    )
+    
+    stalls = watchdog.get_stalls(3)
+    headers = [
+        f"\n<b>{stall['time'].strftime('%H:%M:%S')}</b> {stall['duration_ms']:.0f}ms "
+        f"in <code>{html.escape(stall['location'])}</code>\n"
+        for stall in stalls
+    ]
+    
+    # Stacks share what is left of the message limit once everything else is counted
+    overhead = len(response) + sum(len(header) + len("<pre></pre>\n") for header in headers)
+    budget = (MessageLimit.MAX_TEXT_LENGTH - overhead) // max(len(stalls), 1)
+    
+    for stall, header in zip(stalls, headers):
+        response += f"{header}<pre>{escaped_tail(stall['stack'], budget)}</pre>\n"
+    
+    await update.message.reply_text(response, parse_mode='HTML')
+
+def escaped_tail(text: str, limit: int) -> str:
+    """HTML-escaped last lines of text, at most limit characters after escaping"""
+    lines: List[str] = []
+    size = 0
+    # Innermost frames are the most useful part of a stack
+    for line in reversed(text.splitlines()):
+        escaped = html.escape(line)
+        if size + len(escaped) + 1 > limit:
+            break
+        lines.append(escaped)
+        size += len(escaped) + 1
+    return "\n".join(reversed(lines))
+
 async def shell_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /shell command (sudo only - DANGEROUS)"""
     if not await is_sudo(update, context):
@@ -638,16 +951,12 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
         
-        result = await ActionManager.warn_user(
-            update=update,
-            context=context,
-            user_id=user_id,
-            reason=reason,
-            warning_type="manual"
+        result = await warn_member(
+            context, update.effective_chat.id, user_id, reason, "manual", update.effective_user.id
         )
         
         if result['success']:
-            if result.get('action') == 'banned':
+            if result['action'] == 'banned':
                 await update.message.reply_text(
                     f"✅ User {user_id} has been warned and banned for exceeding warnings."
                 )
@@ -697,11 +1006,12 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
         
-        # Ask for confirmation
+        # Ask for confirmation; the reason stays server-side so buttons fit in 64 bytes
+        token = callback_store.put(chat_id, {'user_id': user_id, 'reason': reason})
         keyboard = [
             [
-                InlineKeyboardButton("✅ Yes, ban user", callback_data=f"confirm_ban_{user_id}_{reason}"),
-                InlineKeyboardButton("🌍 GBAN instead", callback_data=f"suggest_gban_{user_id}_{reason}"),
+                InlineKeyboardButton("✅ Yes, ban user", callback_data=f"confirm_ban_{token}"),
+                InlineKeyboardButton("🌍 GBAN instead", callback_data=f"suggest_gban_{token}"),
                 InlineKeyboardButton("❌ Cancel", callback_data="cancel_ban")
             ]
         ]
@@ -723,6 +1033,123 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error in ban command: {e}")
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
+async def whitelist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /whitelist command"""
+    if not await is_admin(update, context):
+        await update.message.reply_text("⛔ Admin only command")
+        return
+    
+    if len(context.args) < 1:
+        await update.message.reply_text(
+            "Usage: `/whitelist <user_id>`\n\n"
+            "Example: `/whitelist 123456`",
+            parse_mode='Markdown'
+        )
+        return
+    
+    try:
+        user_id = int(context.args[0])
+        chat_id = update.effective_chat.id
+        
+        if db.is_user_whitelisted(user_id, chat_id):
+            await update.message.reply_text(f"ℹ️ User {user_id} is already whitelisted.")
+            return
+        
+        if db.add_to_whitelist(user_id, chat_id, added_by=update.effective_user.id):
+            await update.message.reply_text(
+                f"✅ User {user_id} whitelisted.\n"
+                f"Their messages will no longer be moderated in this chat."
+            )
+        else:
+            await update.message.reply_text(f"❌ Failed to whitelist user {user_id}.")
+    
+    except ValueError:
+        await update.message.reply_text("❌ Invalid user ID.")
+    except Exception as e:
+        logger.error(f"Error in whitelist command: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def unwhitelist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /unwhitelist command"""
+    if not await is_admin(update, context):
+        await update.message.reply_text("⛔ Admin only command")
+        return
+    
+    if len(context.args) < 1:
+        await update.message.reply_text(
+            "Usage: `/unwhitelist <user_id>`\n\n"
+            "Example: `/unwhitelist 123456`",
+            parse_mode='Markdown'
+        )
+        return
+    
+    try:
+        user_id = int(context.args[0])
+        chat_id = update.effective_chat.id
+        
+        if db.remove_from_whitelist(user_id, chat_id):
+            await update.message.reply_text(f"✅ User {user_id} removed from whitelist.")
+        else:
+            await update.message.reply_text(f"❌ User {user_id} is not whitelisted.")
+    
+    except ValueError:
+        await update.message.reply_text("❌ Invalid user ID.")
+    except Exception as e:
+        logger.error(f"Error in unwhitelist command: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def unwarn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /unwarn command: clear a user's warnings in this chat"""
+    if not await is_admin(update, context):
+        await update.message.reply_text("⛔ Admin only command")
+        return
+    
+    if len(context.args) < 1:
+        await update.message.reply_text(
+            "Usage: `/unwarn <user_id>`\n\n"
+            "Example: `/unwarn 123456`",
+            parse_mode='Markdown'
+        )
+        return
+    
+    try:
+        user_id = int(context.args[0])
+        chat_id = update.effective_chat.id
+        
+        warnings = db.get_warning_count(user_id, chat_id)
+        if warnings and db.reset_warnings(user_id, chat_id):
+            await update.message.reply_text(f"✅ Cleared {warnings} warnings for user {user_id}.")
+        else:
+            await update.message.reply_text(f"❌ User {user_id} has no warnings.")
+    
+    except ValueError:
+        await update.message.reply_text("❌ Invalid user ID.")
+    except Exception as e:
+        logger.error(f"Error in unwarn command: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def unlock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /unlock command: lift a raid lockdown early"""
+    if not await is_admin(update, context):
+        await update.message.reply_text("⛔ Admin only command")
+        return
+    
+    try:
+        chat_id = update.effective_chat.id
+        if not raid_detector.is_locked(chat_id):
+            await update.message.reply_text("❌ This chat is not locked.")
+            return
+        
+        # The bot announces the lifted lockdown itself
+        if await raid_detector.unlock(context.bot, chat_id):
+            logger.info(f"Raid lockdown in chat {chat_id} lifted by {update.effective_user.id}")
+        else:
+            await update.message.reply_text("❌ Could not restore the chat permissions, retrying in a minute.")
+    
+    except Exception as e:
+        logger.error(f"Error in unlock command: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command"""
     user = update.effective_user
@@ -773,78 +1200,7 @@ async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     chat_id = update.effective_chat.id
-    current_settings = db.get_chat_settings(chat_id)
-    
-    # Create settings keyboard
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                f"NSFW Filter: {'✅' if current_settings['enable_nsfw_filter'] else '❌'}",
-                callback_data="toggle_nsfw"
-            ),
-            InlineKeyboardButton(
-                f"Violence Filter: {'✅' if current_settings['enable_violence_filter'] else '❌'}",
-                callback_data="toggle_violence"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                f"Spam Filter: {'✅' if current_settings['enable_spam_filter'] else '❌'}",
-                callback_data="toggle_spam"
-            ),
-            InlineKeyboardButton(
-                f"GBAN Sync: {'✅' if current_settings['enable_gban_sync'] else '❌'}",
-                callback_data="toggle_gban_sync"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                f"Auto Delete: {'✅' if current_settings['auto_delete_messages'] else '❌'}",
-                callback_data="toggle_auto_delete"
-            ),
-            InlineKeyboardButton(
-                f"Warn Before Ban: {'✅' if current_settings['warn_before_ban'] else '❌'}",
-                callback_data="toggle_warn_before_ban"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                f"Max Warnings: {current_settings['max_warnings']}",
-                callback_data="change_max_warnings"
-            ),
-            InlineKeyboardButton("📊 View Stats", callback_data="view_stats")
-        ],
-        [
-            InlineKeyboardButton("💾 Backup", callback_data="backup_db"),
-            InlineKeyboardButton("🗑️ Cleanup", callback_data="cleanup_files")
-        ],
-        [
-            InlineKeyboardButton("✅ Save", callback_data="save_settings"),
-            InlineKeyboardButton("❌ Cancel", callback_data="cancel_settings")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    settings_text = (
-        f"⚙️ *Bot Settings - Chat ID: `{chat_id}`*\n\n"
-        f"Configure moderation settings for this group:\n\n"
-        f"• *NSFW Filter:* {'Enabled' if current_settings['enable_nsfw_filter'] else 'Disabled'}\n"
-        f"• *Violence Filter:* {'Enabled' if current_settings['enable_violence_filter'] else 'Disabled'}\n"
-        f"• *Spam Filter:* {'Enabled' if current_settings['enable_spam_filter'] else 'Disabled'}\n"
-        f"• *GBAN Sync:* {'Enabled' if current_settings['enable_gban_sync'] else 'Disabled'}\n"
-        f"• *Auto Delete Messages:* {'Enabled' if current_settings['auto_delete_messages'] else 'Disabled'}\n"
-        f"• *Warn Before Ban:* {'Enabled' if current_settings['warn_before_ban'] else 'Disabled'}\n"
-        f"• *Max Warnings:* {current_settings['max_warnings']}\n"
-        f"• *Language:* {current_settings['language']}\n\n"
-        f"Click buttons below to toggle settings."
-    )
-    
-    await update.message.reply_text(
-        settings_text,
-        parse_mode='Markdown',
-        reply_markup=reply_markup
-    )
+    await view_cache.send(update.message, view_cache.settings_view(chat_id, settings_sessions.pending(chat_id)))
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /stats command"""
@@ -852,364 +1208,290 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ Admin only command")
         return
     
-    chat_id = update.effective_chat.id
-    stats = db.get_stats(chat_id)
-    bot_info = get_bot_info()
+    await view_cache.send(update.message, stats_view(update.effective_chat.id))
+
+# ===== UPDATED BUTTON CALLBACK HANDLER =====
+
+callback_router.permission('admin', is_admin, "⛔ Admin only action")
+callback_router.permission('sudo', is_sudo, "👑 Sudo only action")
+
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle button callbacks"""
+    await callback_router.dispatch(update, context)
+
+@callback_router.route("toggle_", permission='admin')
+async def toggle_setting_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, setting: str):
+    query = update.callback_query
+    chat_id = query.message.chat_id
     
-    stats_text = (
-        f"📊 *Moderation Statistics*\n\n"
-        f"*Chat ID:* `{chat_id}`\n"
-        f"*Total Actions:* {sum(stats.values())}\n"
-        f"*Messages Deleted:* {stats.get('deleted', 0)}\n"
-        f"*Users Warned:* {stats.get('warned', 0)}\n"
-        f"*Users Banned:* {stats.get('banned', 0)}\n"
-        f"*Users Muted:* {stats.get('muted', 0)}\n"
-        f"*Users Kicked:* {stats.get('kicked', 0)}\n"
-        f"*GBANNED Users:* {stats.get('total_gbans', 0)}\n"
-        f"*Total Warnings:* {stats.get('total_warnings', 0)}\n"
-        f"*Total Banned Users:* {stats.get('total_banned', 0)}\n"
-        f"*Sudo Users:* {stats.get('sudo_users', 0)}\n"
-        f"*Today's Actions:* {stats.get('today_actions', 0)}\n\n"
+    # Applied in memory; written after a quiet period or on Save
+    if settings_sessions.toggle(context, chat_id, setting):
+        await settings_command_helper(query, chat_id)
+
+@callback_router.route("save_settings", permission='admin')
+async def save_settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    settings_sessions.save(query.message.chat_id)
+    await query.edit_message_text("✅ Settings saved successfully!")
+
+@callback_router.route("cancel_settings", permission='admin')
+async def cancel_settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    settings_sessions.cancel(query.message.chat_id)
+    await query.edit_message_text("❌ Settings update cancelled.")
+
+@callback_router.route("gban_page_", permission='sudo')
+async def gban_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, page: str):
+    await gbanlist_page_helper(update.callback_query, int(page))
+
+@callback_router.route("gban_stats", permission='sudo')
+async def gban_stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    result = await gban_system.gban_stats(update, context)
+    
+    if result['success']:
+        stats = result['stats']
+        response = (
+            f"📊 *Global Ban Statistics*\n\n"
+            f"*Total GBANNED users:* {stats.get('total_gbans', 0)}\n"
+            f"*GBANS today:* {stats.get('gbans_today', 0)}\n"
+            f"*GBANS this week:* {stats.get('gbans_week', 0)}\n"
+        )
         
-        f"*Bot Information:*\n"
-        f"• Uptime: {bot_info.get('start_time', 'N/A')}\n"
-        f"• Total Users: {bot_info.get('total_users', 0)}\n"
-        f"• Disk Free: {bot_info.get('disk_free', 'N/A')}\n"
-        f"• Temp Files: {bot_info.get('temp_files', 0)}\n"
-        f"• Backups: {bot_info.get('backup_files', 0)}\n\n"
+        keyboard = [[InlineKeyboardButton("🌍 GBAN List", callback_data="gban_page_1")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
         
-        f"*Settings:*\n"
-    )
+        await query.edit_message_text(
+            response,
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        )
+    else:
+        await query.edit_message_text(f"❌ Error: {result.get('error')}")
+
+@callback_router.route("sudo_stats", permission='sudo')
+async def sudo_stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    result = await sudo_system.sudo_stats(update, context)
     
-    # Add settings info
-    settings = db.get_chat_settings(chat_id)
-    for key, value in settings.items():
-        if key != 'chat_id':
-            key_name = key.replace('_', ' ').title()
-            stats_text += f"• {key_name}: `{value}`\n"
+    if result['success']:
+        stats = result['stats']
+        response = (
+            f"📊 *Sudo Statistics*\n\n"
+            f"*Total Sudo users:* {stats.get('total_sudo', 0)}\n"
+            f"*From config:* {stats.get('config_sudo', 0)}\n"
+            f"*From database:* {stats.get('db_sudo', 0)}\n"
+        )
+        
+        keyboard = [[InlineKeyboardButton("👑 Sudo List", callback_data="show_sudo_list")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await query.edit_message_text(
+            response,
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        )
+    else:
+        await query.edit_message_text(f"❌ Error: {result.get('error')}")
+
+@callback_router.route("show_sudo_list", permission='sudo')
+async def sudo_list_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    result = await sudo_system.sudo_list(update, context)
+    
+    if result['success']:
+        response = f"👑 *Sudo Users List*\n\n"
+        response += f"*Total Sudo users:* {result['total_sudo']}\n\n"
+        
+        for i, sudo_user in enumerate(result['sudo_users'][:10], 1):
+            response += (
+                f"{i}. *User:* {sudo_user.get('username', f'ID: {sudo_user['user_id']}')}\n"
+                f"   *ID:* `{sudo_user['user_id']}`\n"
+                f"   *Source:* {'Config' if sudo_user['source'] == 'config' else 'Database'}\n\n"
+            )
+        
+        await query.edit_message_text(
+            response,
+            parse_mode='Markdown',
+            disable_web_page_preview=True
+        )
+    else:
+        await query.edit_message_text(f"❌ Error: {result.get('error')}")
+
+@callback_router.route("suggest_gban_", permission='sudo', denied="👑 Sudo only - Use /gban command")
+async def suggest_gban_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, token: str):
+    query = update.callback_query
+    payload = callback_store.get(token, query.message.chat_id)
+    if payload is None:
+        await query.edit_message_text(BUTTON_EXPIRED)
+        return
+    
+    user_id_to_gban = payload['user_id']
+    reason = payload['reason']
     
-    # Add keyboard for actions
     keyboard = [
         [
-            InlineKeyboardButton("🔄 Refresh", callback_data="refresh_stats"),
-            InlineKeyboardButton("⚙️ Settings", callback_data="open_settings")
-        ],
-        [
-            InlineKeyboardButton("🌍 GBAN Stats", callback_data="gban_stats"),
-            InlineKeyboardButton("👑 Sudo Stats", callback_data="sudo_stats")
-        ],
-        [
-            InlineKeyboardButton("🗑️ Cleanup", callback_data="cleanup_files"),
-            InlineKeyboardButton("💾 Backup", callback_data="backup_now")
+            InlineKeyboardButton("✅ Yes, GBAN", callback_data=f"confirm_gban_{token}"),
+            InlineKeyboardButton("❌ Cancel", callback_data="cancel_action")
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(
-        stats_text,
+    await query.edit_message_text(
+        f"🌍 *Global Ban Suggestion*\n\n"
+        f"User ID: `{user_id_to_gban}`\n"
+        f"Reason: {reason}\n\n"
+        f"Do you want to GBAN this user instead?\n"
+        f"(This will ban them from ALL protected chats)",
         parse_mode='Markdown',
         reply_markup=reply_markup
     )
 
-# ===== UPDATED BUTTON CALLBACK HANDLER =====
-
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle button callbacks"""
+@callback_router.route("confirm_gban_", permission='sudo')
+async def confirm_gban_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, token: str):
     query = update.callback_query
-    await query.answer()
+    payload = callback_store.pop(token, query.message.chat_id)
+    if payload is None:
+        await query.edit_message_text(BUTTON_EXPIRED)
+        return
+    
+    user_id_to_gban = payload['user_id']
+    reason = payload['reason']
+    
+    result = await gban_system.gban_user(update, context, user_id_to_gban, reason)
     
-    data = query.data
+    if result['success']:
+        await query.edit_message_text(
+            f"✅ *User Globally Banned*\n\n"
+            f"User ID: `{user_id_to_gban}`\n"
+            f"Reason: {html.escape(reason)}\n"
+            f"Banned by: {query.from_user.mention_html()}",
+            parse_mode='HTML'
+        )
+    else:
+        await query.edit_message_text(f"❌ GBAN Failed: {result.get('error')}")
+
+@callback_router.route("cancel_action")
+async def cancel_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    await update.callback_query.edit_message_text("❌ Action cancelled.")
+
+@callback_router.route("refresh_stats", "view_stats")
+async def refresh_stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    await stats_command_helper(query, query.message.chat_id)
+
+@callback_router.route("open_settings", permission='admin')
+async def open_settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    await settings_command_helper(query, query.message.chat_id)
+
+@callback_router.route("cleanup_files", permission='admin')
+async def cleanup_files_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    from utils import clean_temp_files
+    clean_temp_files()
+    await update.callback_query.edit_message_text("✅ Temporary files cleaned successfully!")
+
+@callback_router.route("backup_now", "backup_db", permission='admin')
+async def backup_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    backup_path = backup_database()
+    if backup_path:
+        await query.edit_message_text(f"✅ Database backed up successfully!\n\nPath: `{backup_path}`", 
+                                   parse_mode='Markdown')
+    else:
+        await query.edit_message_text("❌ Failed to backup database")
+
+@callback_router.route("confirm_ban_", permission='admin')
+async def confirm_ban_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, token: str):
+    query = update.callback_query
     chat_id = query.message.chat_id
-    user_id = query.from_user.id
+    payload = callback_store.pop(token, chat_id)
+    if payload is None:
+        await query.edit_message_text(BUTTON_EXPIRED)
+        return
     
-    # Check permissions
-    is_user_admin = await is_admin(update, context)
-    is_user_sudo = await is_sudo(update, context)
+    user_id_to_ban = payload['user_id']
+    reason = payload['reason']
     
-    try:
-        if data.startswith("toggle_"):
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            
-            setting = data.replace("toggle_", "")
-            current = db.get_chat_settings(chat_id)
-            
-            if setting in current:
-                new_value = not current[setting]
-                db.update_chat_settings(chat_id, **{setting: new_value})
-                
-                # Update message
-                await settings_command_helper(query, chat_id)
-        
-        elif data == "save_settings":
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            
-            await query.edit_message_text("✅ Settings saved successfully!")
-        
-        elif data == "cancel_settings":
-            await query.edit_message_text("❌ Settings update cancelled.")
-        
-        elif data.startswith("gban_page_"):
-            if not is_user_sudo:
-                await query.edit_message_text("👑 Sudo only action")
-                return
-            
-            page = int(data.split("_")[2])
-            await gbanlist_page_helper(query, page)
-        
-        elif data == "gban_stats":
-            if not is_user_sudo:
-                await query.edit_message_text("👑 Sudo only action")
-                return
-            
-            result = await gban_system.gban_stats(update, context)
-            
-            if result['success']:
-                stats = result['stats']
-                response = (
-                    f"📊 *Global Ban Statistics*\n\n"
-                    f"*Total GBANNED users:* {stats.get('total_gbans', 0)}\n"
-                    f"*GBANS today:* {stats.get('gbans_today', 0)}\n"
-                    f"*GBANS this week:* {stats.get('gbans_week', 0)}\n"
-                )
-                
-                keyboard = [[InlineKeyboardButton("🌍 GBAN List", callback_data="gban_page_1")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await query.edit_message_text(
-                    response,
-                    parse_mode='Markdown',
-                    reply_markup=reply_markup
-                )
-            else:
-                await query.edit_message_text(f"❌ Error: {result.get('error')}")
-        
-        elif data == "sudo_stats":
-            if not is_user_sudo:
-                await query.edit_message_text("👑 Sudo only action")
-                return
-            
-            result = await sudo_system.sudo_stats(update, context)
-            
-            if result['success']:
-                stats = result['stats']
-                response = (
-                    f"📊 *Sudo Statistics*\n\n"
-                    f"*Total Sudo users:* {stats.get('total_sudo', 0)}\n"
-                    f"*From config:* {stats.get('config_sudo', 0)}\n"
-                    f"*From database:* {stats.get('db_sudo', 0)}\n"
-                )
-                
-                keyboard = [[InlineKeyboardButton("👑 Sudo List", callback_data="show_sudo_list")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await query.edit_message_text(
-                    response,
-                    parse_mode='Markdown',
-                    reply_markup=reply_markup
-                )
-            else:
-                await query.edit_message_text(f"❌ Error: {result.get('error')}")
-        
-        elif data == "show_sudo_list":
-            if not is_user_sudo:
-                await query.edit_message_text("👑 Sudo only action")
-                return
-            
-            result = await sudo_system.sudo_list(update, context)
-            
-            if result['success']:
-                response = f"👑 *Sudo Users List*\n\n"
-                response += f"*Total Sudo users:* {result['total_sudo']}\n\n"
-                
-                for i, sudo_user in enumerate(result['sudo_users'][:10], 1):
-                    response += (
-                        f"{i}. *User:* {sudo_user.get('username', f'ID: {sudo_user['user_id']}')}\n"
-                        f"   *ID:* `{sudo_user['user_id']}`\n"
-                        f"   *Source:* {'Config' if sudo_user['source'] == 'config' else 'Database'}\n\n"
-                    )
-                
-                await query.edit_message_text(
-                    response,
-                    parse_mode='Markdown',
-                    disable_web_page_preview=True
-                )
-            else:
-                await query.edit_message_text(f"❌ Error: {result.get('error')}")
-        
-        elif data.startswith("suggest_gban_"):
-            if not is_user_sudo:
-                await query.edit_message_text("👑 Sudo only - Use /gban command")
-                return
-            
-            # Extract user_id and reason
-            parts = data.split("_")
-            if len(parts) >= 4:
-                user_id_to_gban = int(parts[2])
-                reason = "_".join(parts[3:])
-                
-                keyboard = [
-                    [
-                        InlineKeyboardButton("✅ Yes, GBAN", callback_data=f"confirm_gban_{user_id_to_gban}_{reason}"),
-                        InlineKeyboardButton("❌ Cancel", callback_data="cancel_action")
-                    ]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await query.edit_message_text(
-                    f"🌍 *Global Ban Suggestion*\n\n"
-                    f"User ID: `{user_id_to_gban}`\n"
-                    f"Reason: {reason}\n\n"
-                    f"Do you want to GBAN this user instead?\n"
-                    f"(This will ban them from ALL protected chats)",
-                    parse_mode='Markdown',
-                    reply_markup=reply_markup
-                )
-        
-        elif data.startswith("confirm_gban_"):
-            if not is_user_sudo:
-                await query.edit_message_text("👑 Sudo only action")
-                return
-            
-            parts = data.split("_")
-            if len(parts) >= 4:
-                user_id_to_gban = int(parts[2])
-                reason = "_".join(parts[3:])
-                
-                result = await gban_system.gban_user(update, context, user_id_to_gban, reason)
-                
-                if result['success']:
-                    await query.edit_message_text(
-                        f"✅ *User Globally Banned*\n\n"
-                        f"User ID: `{user_id_to_gban}`\n"
-                        f"Reason: {reason}\n"
-                        f"Banned by: {query.from_user.mention_html()}",
-                        parse_mode='HTML'
-                    )
-                else:
-                    await query.edit_message_text(f"❌ GBAN Failed: {result.get('error')}")
-        
-        elif data == "cancel_action":
-            await query.edit_message_text("❌ Action cancelled.")
-        
-        # Existing handlers
-        elif data == "refresh_stats":
-            await stats_command_helper(query, chat_id)
-        
-        elif data == "open_settings":
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            await settings_command_helper(query, chat_id)
-        
-        elif data == "cleanup_files":
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            
-            from utils import clean_temp_files
-            clean_temp_files()
-            await query.edit_message_text("✅ Temporary files cleaned successfully!")
-        
-        elif data == "backup_now" or data == "backup_db":
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            
-            backup_path = backup_database()
-            if backup_path:
-                await query.edit_message_text(f"✅ Database backed up successfully!\n\nPath: `{backup_path}`", 
-                                           parse_mode='Markdown')
-            else:
-                await query.edit_message_text("❌ Failed to backup database")
-        
-        elif data.startswith("confirm_ban_"):
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            
-            parts = data.split("_")
-            if len(parts) >= 4:
-                user_id_to_ban = int(parts[2])
-                reason = "_".join(parts[3:])
-                
-                success = await ActionManager.ban_user(
-                    chat_id=chat_id,
-                    user_id=user_id_to_ban,
-                    reason=reason,
-                    context=context
-                )
-                
-                if success:
-                    await query.edit_message_text(f"✅ User {user_id_to_ban} has been banned.")
-                else:
-                    await query.edit_message_text(f"❌ Failed to ban user {user_id_to_ban}.")
-        
-        elif data == "cancel_ban":
-            await query.edit_message_text("❌ Ban cancelled.")
-        
-        elif data.startswith("warn_"):
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            
-            parts = data.split("_")
-            if len(parts) >= 3:
-                user_id_to_warn = int(parts[1])
-                reason = "_".join(parts[2:])
-                
-                result = await ActionManager.warn_user(
-                    update=update,
-                    context=context,
-                    user_id=user_id_to_warn,
-                    reason=reason,
-                    warning_type="manual"
-                )
-                
-                if result['success']:
-                    await query.edit_message_text(f"✅ User {user_id_to_warn} warned successfully.")
-                else:
-                    await query.edit_message_text(f"❌ Failed to warn user {user_id_to_warn}.")
-        
-        elif data.startswith("delete_"):
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            
-            message_id = int(data.split("_")[1])
-            success = await ActionManager.delete_message(chat_id, message_id, context)
-            
-            if success:
-                await query.edit_message_text("✅ Message deleted successfully.")
-            else:
-                await query.edit_message_text("❌ Failed to delete message.")
+    success = await ban_member(context, chat_id, user_id_to_ban, reason)
+    
+    if success:
+        await query.edit_message_text(f"✅ User {user_id_to_ban} has been banned.")
+    else:
+        await query.edit_message_text(f"❌ Failed to ban user {user_id_to_ban}.")
+
+@callback_router.route("cancel_ban")
+async def cancel_ban_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    await update.callback_query.edit_message_text("❌ Ban cancelled.")
+
+@callback_router.route("warn_", permission='admin')
+async def warn_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str):
+    query = update.callback_query
+    parts = argument.split("_", 1)
+    if len(parts) == 2:
+        user_id_to_warn = int(parts[0])
+        reason = parts[1]
         
-        elif data == "change_max_warnings":
-            if not is_user_admin:
-                await query.edit_message_text("⛔ Admin only action")
-                return
-            
-            await query.edit_message_text(
-                "Please send the new maximum warnings value (1-10):\n\n"
-                "Example: `3`",
-                parse_mode='Markdown'
-            )
-            # Store state for next message
-            context.user_data['awaiting_max_warnings'] = True
-            context.user_data['original_message_id'] = query.message.message_id
+        result = await warn_member(
+            context, query.message.chat_id, user_id_to_warn, reason, "manual", update.effective_user.id
+        )
         
-        elif data == "view_stats":
-            await stats_command_helper(query, chat_id)
-            
-    except Exception as e:
-        logger.error(f"Error in button callback: {e}")
-        await query.edit_message_text(f"❌ Error: {str(e)}")
+        if result['success'] and result['action'] == 'banned':
+            await query.edit_message_text(f"✅ User {user_id_to_warn} warned and banned for exceeding warnings.")
+        elif result['success']:
+            await query.edit_message_text(f"✅ User {user_id_to_warn} warned successfully.")
+        else:
+            await query.edit_message_text(f"❌ Failed to warn user {user_id_to_warn}.")
+
+@callback_router.route("delete_", permission='admin')
+async def delete_message_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, message_id: str):
+    query = update.callback_query
+    success = await ActionManager.delete_message(query.message.chat_id, int(message_id), context)
+    
+    if success:
+        await query.edit_message_text("✅ Message deleted successfully.")
+    else:
+        await query.edit_message_text("❌ Failed to delete message.")
+
+@callback_router.route("change_max_warnings", permission='admin')
+async def change_max_warnings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, _: str):
+    query = update.callback_query
+    await query.edit_message_text(
+        "Please send the new maximum warnings value (1-10):\n\n"
+        "Example: `3`",
+        parse_mode='Markdown'
+    )
+    # Store state for next message
+    context.user_data['awaiting_max_warnings'] = True
+    context.user_data['original_message_id'] = query.message.message_id
 
 # ===== HELPER FUNCTIONS =====
 
+def format_pipeline_timings() -> str:
+    """Format moderation pipeline stage timings for stats views"""
+    timings = pipeline_cache.get_timings()
+    if not timings:
+        return ""
+    
+    text = "*Pipeline Stages:*\n"
+    for stage_name, timing in timings.items():
+        text += (
+            f"• {stage_name}: {timing['calls']} runs, {timing['decisions']} decided, "
+            f"avg {timing['avg_ms']:.2f}ms, max {timing['max_ms']:.2f}ms\n"
+        )
+    return text + "\n"
+
+def format_update_queue() -> str:
+    """Format concurrent update processing metrics for stats views"""
+    stats = update_processor.get_stats()
+    return (
+        f"*Update Processing:*\n"
+        f"• Running: {stats['running']}/{stats['max_concurrent']}\n"
+        f"• Queued: {stats['queue_depth']} (peak {stats['max_queue_depth']})\n"
+        f"• Active Chats: {stats['active_chats']}\n"
+        f"• Avg Wait: {stats['avg_wait_ms']:.2f}ms, max {stats['max_wait_ms']:.2f}ms\n\n"
+    )
+
 async def gbanlist_page_helper(query, page: int):
     """Helper for GBAN list pagination"""
     result = await gban_system.gban_list(query._bot.application, page)
@@ -1257,82 +1539,8 @@ async def gbanlist_page_helper(query, page: int):
         disable_web_page_preview=True
     )
 
-async def settings_command_helper(query, chat_id):
-    """Helper function to update settings message"""
-    current_settings = db.get_chat_settings(chat_id)
-    
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                f"NSFW Filter: {'✅' if current_settings['enable_nsfw_filter'] else '❌'}",
-                callback_data="toggle_nsfw"
-            ),
-            InlineKeyboardButton(
-                f"Violence Filter: {'✅' if current_settings['enable_violence_filter'] else '❌'}",
-                callback_data="toggle_violence"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                f"Spam Filter: {'✅' if current_settings['enable_spam_filter'] else '❌'}",
-                callback_data="toggle_spam"
-            ),
-            InlineKeyboardButton(
-                f"GBAN Sync: {'✅' if current_settings['enable_gban_sync'] else '❌'}",
-                callback_data="toggle_gban_sync"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                f"Auto Delete: {'✅' if current_settings['auto_delete_messages'] else '❌'}",
-                callback_data="toggle_auto_delete"
-            ),
-            InlineKeyboardButton(
-                f"Warn Before Ban: {'✅' if current_settings['warn_before_ban'] else '❌'}",
-                callback_data="toggle_warn_before_ban"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                f"Max Warnings: {current_settings['max_warnings']}",
-                callback_data="change_max_warnings"
-            ),
-            InlineKeyboardButton("📊 View Stats", callback_data="view_stats")
-        ],
-        [
-            InlineKeyboardButton("💾 Backup", callback_data="backup_db"),
-            InlineKeyboardButton("🗑️ Cleanup", callback_data="cleanup_files")
-        ],
-        [
-            InlineKeyboardButton("✅ Save", callback_data="save_settings"),
-            InlineKeyboardButton("❌ Cancel", callback_data="cancel_settings")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    settings_text = (
-        f"⚙️ *Bot Settings - Chat ID: `{chat_id}`*\n\n"
-        f"Configure moderation settings for this group:\n\n"
-        f"• *NSFW Filter:* {'Enabled' if current_settings['enable_nsfw_filter'] else 'Disabled'}\n"
-        f"• *Violence Filter:* {'Enabled' if current_settings['enable_violence_filter'] else 'Disabled'}\n"
-        f"• *Spam Filter:* {'Enabled' if current_settings['enable_spam_filter'] else 'Disabled'}\n"
-        f"• *GBAN Sync:* {'Enabled' if current_settings['enable_gban_sync'] else 'Disabled'}\n"
-        f"• *Auto Delete Messages:* {'Enabled' if current_settings['auto_delete_messages'] else 'Disabled'}\n"
-        f"• *Warn Before Ban:* {'Enabled' if current_settings['warn_before_ban'] else 'Disabled'}\n"
-        f"• *Max Warnings:* {current_settings['max_warnings']}\n"
-        f"• *Language:* {current_settings['language']}\n\n"
-        f"Click buttons below to toggle settings."
-    )
-    
-    await query.edit_message_text(
-        settings_text,
-        parse_mode='Markdown',
-        reply_markup=reply_markup
-    )
-
-async def stats_command_helper(query, chat_id):
-    """Helper function to update stats message"""
+def stats_view(chat_id: int) -> View:
+    """Render the stats message for a chat"""
     stats = db.get_stats(chat_id)
     bot_info = get_bot_info()
     
@@ -1359,32 +1567,239 @@ async def stats_command_helper(query, chat_id):
         f"• Backups: {bot_info.get('backup_files', 0)}\n\n"
     )
     
-    keyboard = [
-        [
-            InlineKeyboardButton("🔄 Refresh", callback_data="refresh_stats"),
-            InlineKeyboardButton("⚙️ Settings", callback_data="open_settings")
-        ],
-        [
-            InlineKeyboardButton("🌍 GBAN Stats", callback_data="gban_stats"),
-            InlineKeyboardButton("👑 Sudo Stats", callback_data="sudo_stats")
-        ],
-        [
-            InlineKeyboardButton("🗑️ Cleanup", callback_data="cleanup_files"),
-            InlineKeyboardButton("💾 Backup", callback_data="backup_now")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Add pipeline stage timings
+    stats_text += format_pipeline_timings()
+    stats_text += format_update_queue()
     
-    await query.edit_message_text(
-        stats_text,
-        parse_mode='Markdown',
-        reply_markup=reply_markup
-    )
+    return view_cache.stats_view(chat_id, stats_text)
+
+async def settings_command_helper(query, chat_id):
+    """Helper function to update settings message"""
+    await view_cache.edit_if_changed(query, view_cache.settings_view(chat_id, settings_sessions.pending(chat_id)))
+
+async def stats_command_helper(query, chat_id):
+    """Helper function to update stats message"""
+    await view_cache.edit_if_changed(query, stats_view(chat_id))
+
+class ProgressMessage:
+    """Status message for long sudo commands, edited at most once per interval"""
+    
+    def __init__(self, message, interval: float = 2.0):
+        self.message = message
+        self.interval = interval
+        self._last_edit = 0.0
+    
+    async def __call__(self, text: str):
+        await self.update(text)
+    
+    async def update(self, text: str, final: bool = False):
+        now = time.monotonic()
+        if not final and now - self._last_edit < self.interval:
+            return
+        self._last_edit = now
+        try:
+            await self.message.edit_text(text, parse_mode='HTML')
+        except Exception as e:
+            # Progress is best effort; only the final summary must arrive
+            if final:
+                raise
+            logger.debug(f"Could not update progress message: {e}")
+
+def split_gban_args(args: List[str], from_file: bool = False) -> Tuple[List[str], List[str]]:
+    """/gban arguments as (ID arguments, reason arguments)
+    
+    Everything before '--' is IDs. Without it only the first argument is,
+    or none when replying to a file unless it looks like an ID.
+    """
+    if REASON_SEPARATOR in args:
+        index = args.index(REASON_SEPARATOR)
+        return args[:index], args[index + 1:]
+    if args and (not from_file or parse_id_args(args[:1])[0]):
+        return args[:1], args[1:]
+    return [], args
+
+def parse_id_args(args: List[str]) -> Tuple[List[int], List[str]]:
+    """User IDs typed as arguments (space or comma separated) and the tokens that are not IDs"""
+    user_ids: List[int] = []
+    invalid: List[str] = []
+    for arg in args:
+        for token in arg.split(','):
+            if not token:
+                continue
+            user_id = parse_user_id(token)
+            if user_id is None:
+                invalid.append(token)
+            else:
+                user_ids.append(user_id)
+    return user_ids, invalid
+
+def parse_user_id(token: str) -> Optional[int]:
+    """A user ID is a positive integer; chat IDs and anything else are None"""
+    token = token.strip()
+    if not token.isdigit() or int(token) == 0:
+        return None
+    return int(token)
+
+def get_id_list_document(update: Update):
+    """The .txt or .csv document the command replies to, if any"""
+    reply = update.message.reply_to_message
+    if reply is None or reply.document is None:
+        return None
+    if (reply.document.file_name or "").lower().endswith(('.txt', '.csv')):
+        return reply.document
+    return None
+
+def parse_user_ids(text: str, first_column: bool = False) -> Tuple[List[int], List[int]]:
+    """User IDs from an uploaded list: one per line, or the first column of a CSV
+    
+    Returns (user_ids, bad_lines) with the 1-based numbers of lines that
+    are not a single user ID. Blank lines and a CSV header are allowed.
+    """
+    user_ids: List[int] = []
+    bad_lines: List[int] = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        cell = next(csv.reader([line]))[0] if first_column else line
+        user_id = parse_user_id(cell)
+        if user_id is not None:
+            user_ids.append(user_id)
+        elif not (first_column and number == 1):
+            bad_lines.append(number)
+    return user_ids, bad_lines
+
+async def read_user_id_file(document, context: ContextTypes.DEFAULT_TYPE,
+                            progress: ProgressMessage) -> Optional[List[int]]:
+    """Download and parse an ID list; reports errors through the progress message"""
+    if document.file_size and document.file_size > GBAN_BULK_FILE_LIMIT:
+        await progress.update(f"❌ File too large (max {format_bytes(GBAN_BULK_FILE_LIMIT)})", final=True)
+        return None
+    
+    file = await context.bot.get_file(document.file_id)
+    content = bytes(await file.download_as_bytearray()).decode('utf-8', errors='replace')
+    is_csv = (document.file_name or "").lower().endswith('.csv')
+    user_ids, bad_lines = parse_user_ids(content, first_column=is_csv)
+    
+    # A list with anything but user IDs is rejected whole rather than half applied
+    if bad_lines:
+        shown = ", ".join(str(number) for number in bad_lines[:10])
+        more = f" …and {len(bad_lines) - 10} more" if len(bad_lines) > 10 else ""
+        expected = "a user ID in the first column" if is_csv else "one user ID per line"
+        await progress.update(
+            f"❌ Expected {expected}; invalid lines: {shown}{more}\n\nNothing was changed.", final=True)
+        return None
+    if not user_ids:
+        await progress.update("❌ No user IDs found in the file", final=True)
+        return None
+    if len(user_ids) > config.GBAN_BULK_MAX:
+        await progress.update(TOO_MANY_IDS.format(count=len(user_ids), limit=config.GBAN_BULK_MAX), final=True)
+        return None
+    
+    await progress.update(f"📥 Read {len(user_ids)} IDs from {html.escape(document.file_name or 'file')}")
+    return user_ids
+
+def format_id_sample(user_ids: List[int], limit: int = 20) -> str:
+    """Up to limit IDs for a bulk command summary"""
+    if not user_ids:
+        return ""
+    sample = ", ".join(f"<code>{user_id}</code>" for user_id in user_ids[:limit])
+    more = f" …and {len(user_ids) - limit} more" if len(user_ids) > limit else ""
+    return f"\n\n{sample}{more}"
+
+async def warn_member(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, reason: str,
+                      warning_type: str, moderator_id: int) -> Dict:
+    """Record a warning and ban the user once it reaches the chat's max_warnings
+    
+    Returns {'success', 'warnings', 'action'} with action 'warned' or
+    'banned', or {'success': False, 'reason'} when nothing was recorded.
+    """
+    warnings, threshold_reached = db.record_warning(user_id, chat_id, warning_type, reason, moderator_id)
+    if warnings == 999:
+        return {'success': False, 'reason': 'User is globally banned'}
+    if warnings == 0:
+        return {'success': False, 'reason': 'Could not record the warning'}
+    
+    if threshold_reached and await ban_member(context, chat_id, user_id, f"{warnings} warnings: {reason}"):
+        return {'success': True, 'warnings': warnings, 'action': 'banned'}
+    return {'success': True, 'warnings': warnings, 'action': 'warned'}
+
+async def ban_member(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, reason: str) -> bool:
+    """Ban a user from a chat and clear their warnings there"""
+    banned = await ActionManager.ban_user(chat_id=chat_id, user_id=user_id, reason=reason, context=context)
+    if banned:
+        db.reset_warnings(user_id, chat_id)
+    return banned
 
 # ===== MESSAGE HANDLERS (UPDATED FOR GBAN) =====
 
 async def handle_new_chat_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle new chat members for GBAN checking"""
-    await gban_system.check_gban_on_join(update, context)
+    """Handle new chat members for raid detection and GBAN checking"""
+    if config.RAID_DETECTION:
+        await raid_detector.on_join(update, context)
+    if config.ENABLE_GBAN:
+        await gban_system.check_gban_on_join(update, context)
+
+async def handle_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Screen chat join requests against the GBAN list"""
+    await join_request_screener.on_join_request(update, context)
+
+async def track_profiles(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Remember the names of users seen in any update"""
+    await profile_store.observe(update, context)
+
+async def moderate_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Run the chat's moderation pipeline on a group message and apply its verdict"""
+    message = update.effective_message
+    chat = update.effective_chat
+    user = update.effective_user
+    if message is None or user is None or chat.type == 'private':
+        return
+    
+    pipeline = pipeline_cache.get(chat.id)
+    verdict = await pipeline.run(update, context)
+    action = verdict['action']
+    if action == 'allow':
+        return
+    
+    logger.info(
+        f"🛡️ {verdict['stage']}: {action} user {user.id} in chat {chat.id} ({verdict.get('reason')})"
+    )
+    
+    if action in ('gban', 'ban'):
+        reason = f"GBAN: {verdict['reason']}" if action == 'gban' else verdict['reason']
+        await ban_member(context, chat.id, user.id, reason)
+        await ActionManager.delete_message(chat.id, message.message_id, context)
+        return
+    
+    if action == 'delete' and pipeline.settings.get('auto_delete_messages', True):
+        await ActionManager.delete_message(chat.id, message.message_id, context)
+    
+    if verdict.get('warning_type'):
+        result = await warn_member(
+            context, chat.id, user.id, verdict['reason'], verdict['warning_type'], context.bot.id
+        )
+        if not result['success']:
+            return
+        
+        if result['action'] == 'banned':
+            notice = f"🚫 {user.mention_html()} was banned after {result['warnings']} warnings."
+        else:
+            notice = (
+                f"⚠️ {user.mention_html()} warned ({result['warnings']}/{pipeline.settings['max_warnings']}): "
+                f"{html.escape(verdict['reason'])}"
+            )
+        await context.bot.send_message(chat.id, notice, parse_mode='HTML')
+
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Moderate text messages"""
+    await moderate_message(update, context)
+
+async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Moderate photos"""
+    await moderate_message(update, context)
+
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Moderate image documents"""
+    await moderate_message(update, context)
 
 # Existing message handlers remain the same...
@@ -0,0 +1,168 @@
+"""
+Join Request Screening
+Buffers chat_join_request updates per chat, screens each batch against the
+GBAN list in one query and approves or declines with bounded concurrency
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from telegram import ChatJoinRequest, Update
+from telegram.error import Conflict, TelegramError
+from telegram.ext import ContextTypes
+
+from config import config
+from database import db
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+join_requests = registry.counter(
+    "bot_join_requests_total", "Chat join requests screened", ("result",))
+
+class JoinRequestScreener:
+    """Batches join requests per chat so a burst costs one GBAN lookup"""
+    
+    def __init__(self, batch_delay: float = 0.5, batch_size: int = 200, concurrency: int = 10,
+                 approve: bool = False):
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        self.approve = approve
+        self.pending: Dict[int, List[ChatJoinRequest]] = {}
+        self.counts = {'approved': 0, 'declined': 0, 'left_pending': 0, 'failed': 0}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self._backlog_task: Optional[asyncio.Task] = None
+        self._slots = asyncio.Semaphore(concurrency)
+    
+    async def on_join_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Queue a join request; the batch is screened after a short delay or when full"""
+        request = update.chat_join_request
+        if request is None:
+            return
+        
+        chat_id = request.chat.id
+        batch = self.pending.setdefault(chat_id, [])
+        batch.append(request)
+        
+        if len(batch) >= self.batch_size:
+            timer = self._timers.pop(chat_id, None)
+            if timer is not None:
+                timer.cancel()
+            context.application.create_task(self.screen(context.bot, chat_id, self.pending.pop(chat_id)))
+        elif chat_id not in self._timers:
+            self._timers[chat_id] = context.application.create_task(self._flush_later(context.bot, chat_id))
+    
+    async def _flush_later(self, bot, chat_id: int):
+        await asyncio.sleep(self.batch_delay)
+        self._timers.pop(chat_id, None)
+        batch = self.pending.pop(chat_id, None)
+        if batch:
+            await self.screen(bot, chat_id, batch)
+    
+    async def screen(self, bot, chat_id: int, batch: List[ChatJoinRequest]) -> Dict[str, int]:
+        """Decline GBANNED requesters and optionally approve everyone else"""
+        results = {'approved': 0, 'declined': 0, 'left_pending': 0, 'failed': 0}
+        
+        settings = db.get_chat_settings(chat_id)
+        if not settings.get('enable_gban_sync', True):
+            results['left_pending'] = len(batch)
+            return self._count(results)
+        
+        gbanned = db.get_gbanned_among([request.from_user.id for request in batch])
+        
+        async def decide(request: ChatJoinRequest) -> Optional[str]:
+            user_id = request.from_user.id
+            if user_id in gbanned:
+                async with self._slots:
+                    await bot.decline_chat_join_request(chat_id=chat_id, user_id=user_id)
+                return 'declined'
+            if self.approve:
+                async with self._slots:
+                    await bot.approve_chat_join_request(chat_id=chat_id, user_id=user_id)
+                return 'approved'
+            return 'left_pending'
+        
+        outcomes = await asyncio.gather(*(decide(request) for request in batch), return_exceptions=True)
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        for outcome in outcomes:
+            results['failed' if isinstance(outcome, Exception) else outcome] += 1
+        
+        if errors:
+            logger.error(f"{len(errors)} join request decisions failed in chat {chat_id}: {errors[0]}")
+        if results['declined']:
+            logger.info(f"🚫 Declined {results['declined']} GBANNED join requests in chat {chat_id}")
+        logger.debug(f"Screened {len(batch)} join requests in chat {chat_id}: {results}")
+        return self._count(results)
+    
+    def _count(self, results: Dict[str, int]) -> Dict[str, int]:
+        for result, count in results.items():
+            if count:
+                self.counts[result] += count
+                join_requests.labels(result).inc(count)
+        return results
+    
+    async def drain_backlog(self, bot) -> int:
+        """Fetch join requests left in the pending update queue before it is dropped
+        
+        The Bot API can't list pending join requests, so requests sent while
+        the bot was down only exist as pending updates. Call this before
+        polling starts with drop_pending_updates; other updates are skipped.
+        """
+        backlog: Dict[int, List[ChatJoinRequest]] = {}
+        offset = None
+        try:
+            while True:
+                updates = await bot.get_updates(offset=offset, limit=100, timeout=0)
+                if not updates:
+                    break
+                for update in updates:
+                    if update.chat_join_request is not None:
+                        backlog.setdefault(update.chat_join_request.chat.id, []).append(update.chat_join_request)
+                offset = updates[-1].update_id + 1
+        except Conflict:
+            # A webhook is set; pending updates can't be fetched with getUpdates
+            return 0
+        
+        total = sum(len(requests) for requests in backlog.values())
+        if total:
+            logger.info(f"📥 Screening {total} backlogged join requests in {len(backlog)} chats")
+            self._backlog_task = asyncio.create_task(self._screen_backlog(bot, backlog))
+        return total
+    
+    async def drain_before_polling(self, bot) -> int:
+        """drain_backlog when polling is about to drop pending updates
+        
+        Call it once per bot, from the process that polls and before polling
+        starts: every getUpdates call confirms (and so discards) the updates
+        before its offset, and a second poller gets 409 Conflict.
+        """
+        if not (config.ENABLE_GBAN and config.DROP_PENDING_UPDATES and config.BOT_MODE == "polling"):
+            return 0
+        try:
+            return await self.drain_backlog(bot)
+        except TelegramError as e:
+            logger.error(f"❌ Could not screen backlogged join requests: {e}")
+            return 0
+    
+    async def _screen_backlog(self, bot, backlog: Dict[int, List[ChatJoinRequest]]):
+        for chat_id, requests in backlog.items():
+            for start in range(0, len(requests), self.batch_size):
+                try:
+                    await self.screen(bot, chat_id, requests[start:start + self.batch_size])
+                except Exception as e:
+                    logger.error(f"Failed to screen backlogged join requests in chat {chat_id}: {e}")
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.counts,
+            'queued': sum(len(batch) for batch in self.pending.values())
+        }
+
+# Global join request screener
+join_request_screener = JoinRequestScreener(
+    batch_delay=config.JOIN_REQUEST_BATCH_MS / 1000,
+    batch_size=config.JOIN_REQUEST_BATCH_SIZE,
+    concurrency=config.JOIN_REQUEST_CONCURRENCY,
+    approve=config.JOIN_REQUEST_APPROVE
+)
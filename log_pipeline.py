@@ -0,0 +1,117 @@
+"""
+Logging Pipeline
+Non-blocking log handling: records are queued in memory and written by a
+background listener thread with size- and time-based rotation
+"""
+
+import json
+import logging
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler over a bounded queue that never blocks the caller
+    
+    When the queue is full, records below WARNING are dropped. Warnings and
+    errors evict the oldest queued record instead. The number of dropped
+    records is reported once the queue has room again.
+    """
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported = 0
+    
+    def enqueue(self, record: logging.LogRecord):
+        if self._unreported and not self.queue.full():
+            notice = logging.LogRecord(
+                'log_pipeline', logging.WARNING, __file__, 0,
+                f"Log queue full, dropped {self._unreported} records", None, None
+            )
+            try:
+                self.queue.put_nowait(notice)
+                self._unreported = 0
+            except queue.Full:
+                pass
+        
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        
+        if record.levelno >= logging.WARNING:
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+        self._unreported += 1
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Rotates when the file exceeds max_bytes or the interval has elapsed"""
+    
+    def __init__(self, filename, max_bytes: int, backup_count: int,
+                 interval_hours: float, encoding: Optional[str] = 'utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.interval = interval_hours * 3600
+        self.rollover_at = time.time() + self.interval
+    
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval > 0 and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+    
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for log shippers"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.processName,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class _DrainingQueueListener(QueueListener):
+    """Waits for room for the stop sentinel instead of failing on a full queue"""
+    
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class LogPipeline:
+    """Root logger -> bounded queue -> listener thread -> file and stdout"""
+    
+    def __init__(self, queue_size: int = 10000):
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.listener: Optional[QueueListener] = None
+    
+    def start(self, *handlers: logging.Handler):
+        self.listener = _DrainingQueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+    
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+    
+    def get_stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'dropped': self.handler.dropped
+        }
@@ -0,0 +1,129 @@
+"""
+Event Loop Watchdog
+Measures event loop lag continuously and captures the stack of code that
+blocks the loop for longer than a threshold
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from config import config
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+loop_lag = registry.histogram(
+    "bot_event_loop_lag_seconds", "Delay between a scheduled loop wake-up and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+loop_stalls = registry.counter(
+    "bot_event_loop_stalls_total", "Times the event loop was blocked longer than the threshold")
+
+class LoopWatchdog:
+    """A loop task heartbeats; a thread notices when the heartbeat stops and grabs the loop's stack"""
+    
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, max_stalls: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: Deque[Dict] = deque(maxlen=max_stalls)
+        self.recent_lag: Deque[float] = deque(maxlen=1000)
+        self.max_lag = 0.0
+        self.stall_count = 0
+        
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._current_stall: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_beat = now
+            
+            loop_lag.observe(lag)
+            self.recent_lag.append(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            
+            stall = self._current_stall
+            if stall is not None:
+                # The thread saw this stall start; record how long it lasted
+                self._current_stall = None
+                stall['duration_ms'] = lag * 1000
+                logger.warning(f"⏱️ Event loop was blocked for {lag * 1000:.0f}ms in {stall['location']}")
+    
+    def _capture(self, blocked_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        
+        stack = traceback.format_stack(frame, limit=30)
+        summary = traceback.extract_stack(frame, limit=1)
+        location = f"{summary[-1].name} ({summary[-1].filename.rsplit('/', 1)[-1]}:{summary[-1].lineno})" if summary else "unknown"
+        
+        stall = {
+            'time': datetime.now(),
+            'location': location,
+            'duration_ms': blocked_for * 1000,
+            'stack': "".join(stack)
+        }
+        self._current_stall = stall
+        self.stalls.append(stall)
+        self.stall_count += 1
+        loop_stalls.inc()
+        logger.warning(f"⚠️ Event loop blocked for over {blocked_for * 1000:.0f}ms, stack:\n{stall['stack']}")
+    
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            # Capture each stall once, while it is still happening
+            if blocked_for > self.threshold and self._current_stall is None:
+                self._capture(blocked_for)
+    
+    def start(self):
+        """Start both halves; must be called from the event loop"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    def lag_percentiles(self) -> Dict[str, float]:
+        values = sorted(self.recent_lag)
+        if not values:
+            return {'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': self.max_lag * 1000}
+        return {
+            'p50_ms': values[len(values) // 2] * 1000,
+            'p99_ms': values[min(len(values) - 1, int(len(values) * 0.99))] * 1000,
+            'max_ms': self.max_lag * 1000
+        }
+    
+    def get_stalls(self, limit: int = 3) -> List[Dict]:
+        """Most recent stalls, newest first"""
+        return list(self.stalls)[-limit:][::-1]
+
+# Global loop watchdog
+watchdog = LoopWatchdog(
+    interval=config.WATCHDOG_INTERVAL_MS / 1000,
+    threshold=config.WATCHDOG_BLOCK_THRESHOLD_MS / 1000
+)
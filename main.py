@@ -3,35 +3,41 @@
 Main entry point for Telegram Moderation Bot
 """
 
+import atexit
 import logging
+import multiprocessing
 import sys
 import os
 import signal
-from datetime import datetime
 
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ChatJoinRequestHandler, TypeHandler
 from telegram.error import TelegramError
 
 # Import modules
 from config import config
+from database import db
+from log_pipeline import DroppingQueueHandler, JsonFormatter, LogPipeline, SizeAndTimeRotatingFileHandler
 from handlers import (
     # Basic commands
     start_command, help_command, report_command, appeal_command,
     
     # Admin commands
-    warn_command, ban_command, mute_command, kick_command,
-    whitelist_command, unwhitelist_command, settings_command, stats_command,
+    warn_command, unwarn_command, ban_command, mute_command, kick_command,
+    whitelist_command, unwhitelist_command, unlock_command, settings_command, stats_command,
     
     # Sudo commands
     gban_command, ungban_command, gbanlist_command, gbanstats_command,
     addsudo_command, delsudo_command, sudolist_command, sudostats_command,
     shell_command, eval_command, broadcast_command, restart_command, update_command,
+    errors_command, trace_command, profile_command, lag_command,
     
     # Message handlers
-    handle_photo, handle_document, handle_text, handle_new_chat_members,
+    handle_photo, handle_document, handle_text, handle_new_chat_members, handle_join_request,
+    track_profiles,
     
     # Callback handlers
     button_callback,
@@ -40,29 +46,58 @@ from handlers import (
     handle_message
 )
 from utils import schedule_cleanup
+from error_digest import error_aggregator
+from metrics import instrument_application, metrics_server
+from loop_watchdog import watchdog
+from join_requests import join_request_screener
+from raid import raid_detector
+from profiles import profile_store
+from ratelimiter import outbound_limiter
+from update_processor import update_processor
 from moderator import moderator
 import asyncio
 
 # Configure logging
 def setup_logging():
-    """Configure logging system"""
+    """Configure logging system
+    
+    Handlers only enqueue records; a listener thread does the disk and
+    console writes so slow I/O never blocks the event loop.
+    """
+    root = logging.getLogger()
+    if any(isinstance(h, DroppingQueueHandler) for h in root.handlers):
+        # Worker processes import this module more than once
+        return logging.getLogger(__name__)
+    
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    if config.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(log_format)
     
     # Create logs directory if not exists
     config.LOGS_DIR.mkdir(exist_ok=True)
     
-    # Generate log filename with date
-    log_file = config.LOGS_DIR / f"bot_{datetime.now().strftime('%Y%m%d')}.log"
+    # Each process writes its own file so rotation never races
+    process_name = multiprocessing.current_process().name
+    log_name = "bot.log" if process_name == "MainProcess" else f"{process_name}.log"
     
-    # Configure root logger
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
+    file_handler = SizeAndTimeRotatingFileHandler(
+        config.LOGS_DIR / log_name,
+        max_bytes=config.LOG_MAX_BYTES,
+        backup_count=config.LOG_BACKUP_COUNT,
+        interval_hours=config.LOG_ROTATE_HOURS
     )
+    console_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+    
+    log_pipeline.start(file_handler, console_handler)
+    atexit.register(log_pipeline.stop)
+    
+    # Configure root logger
+    root.setLevel(getattr(logging, config.LOG_LEVEL, logging.INFO))
+    root.addHandler(log_pipeline.handler)
     
     # Set specific log levels
     logging.getLogger('httpx').setLevel(logging.WARNING)
@@ -71,6 +106,7 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 # Get logger
+log_pipeline = LogPipeline(queue_size=config.LOG_QUEUE_SIZE)
 logger = setup_logging()
 
 # Global variables for cleanup
@@ -81,22 +117,8 @@ async def error_handler(update: object, context):
     """Handle errors in telegram bot"""
     logger.error(f"Update {update} caused error: {context.error}", exc_info=context.error)
     
-    # Try to notify admin
-    try:
-        if config.ADMIN_IDS:
-            error_msg = f"⚠️ *Bot Error*\n\n`{str(context.error)[:200]}`"
-            
-            for admin_id in config.ADMIN_IDS:
-                try:
-                    await context.bot.send_message(
-                        chat_id=admin_id,
-                        text=error_msg,
-                        parse_mode='Markdown'
-                    )
-                except:
-                    continue
-    except Exception as e:
-        logger.error(f"Failed to notify admin about error: {e}")
+    # Admins get a grouped digest per window instead of one message per error
+    error_aggregator.record(context.error, update)
 
 async def post_init(application: Application):
     """Post initialization tasks"""
@@ -107,6 +129,35 @@ async def post_init(application: Application):
     logger.info(f"✅ GBAN Enabled: {config.ENABLE_GBAN}")
     logger.info(f"✅ Database initialized")
     
+    # Warm in-memory indexes
+    db.load_whitelist()
+    
+    # In multi-process mode workers also run post_init; the receiver and each
+    # worker do their share of this instead (see supervisor)
+    if config.WORKER_PROCESSES == 1:
+        # Lockdowns outlive restarts
+        await raid_detector.restore(application.bot)
+        
+        # Join requests sent while the bot was down would be dropped with the other pending updates
+        await join_request_screener.drain_before_polling(application.bot)
+    
+    # Start periodic admin error digests
+    error_aggregator.start(application.bot)
+    
+    # Save user names seen in updates in batches
+    profile_store.start()
+    atexit.register(profile_store.flush)
+    
+    # Watch for event loop stalls
+    watchdog.start()
+    
+    # Serve metrics for scraping
+    if metrics_server.port:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logger.error(f"❌ Could not start metrics endpoint: {e}")
+    
     # Print welcome message
     print("\n" + "="*50)
     print("🤖 TELEGRAM MODERATION BOT")
@@ -132,6 +183,11 @@ async def post_init(application: Application):
     print("  /appeal - Appeal a warning")
     print("="*50 + "\n")
 
+async def post_stop(application: Application):
+    """Shutdown tasks that still need the Bot API"""
+    # No chat should stay locked while the bot is down
+    await raid_detector.shutdown(application.bot)
+
 def signal_handler(signum, frame):
     """Handle shutdown signals"""
     logger.info(f"Received signal {signum}, shutting down...")
@@ -139,6 +195,129 @@ def signal_handler(signum, frame):
         application.stop()
     sys.exit(0)
 
+# Update types the bot subscribes to
+ALLOWED_UPDATES = [
+    "message",
+    "callback_query",
+    "chat_member",
+    "my_chat_member",
+    "chat_join_request"
+]
+
+def build_application(builder=None) -> Application:
+    """Create the application and register all handlers"""
+    if builder is None:
+        builder = (
+            Application.builder()
+            .token(config.TOKEN)
+            .rate_limiter(outbound_limiter)
+            .concurrent_updates(update_processor)
+        )
+    app = builder.build()
+    
+    # Remember user names from every update, before any other handler runs
+    app.add_handler(TypeHandler(Update, track_profiles), group=-1)
+    
+    # Add command handlers
+    logger.info("📝 Setting up command handlers...")
+    
+    # Basic commands
+    app.add_handler(CommandHandler("start", start_command))
+    app.add_handler(CommandHandler("help", help_command))
+    app.add_handler(CommandHandler("report", report_command))
+    app.add_handler(CommandHandler("appeal", appeal_command))
+    
+    # Admin commands
+    app.add_handler(CommandHandler("warn", warn_command))
+    app.add_handler(CommandHandler("unwarn", unwarn_command))
+    app.add_handler(CommandHandler("ban", ban_command))
+    app.add_handler(CommandHandler("mute", mute_command))
+    app.add_handler(CommandHandler("kick", kick_command))
+    app.add_handler(CommandHandler("whitelist", whitelist_command))
+    app.add_handler(CommandHandler("unwhitelist", unwhitelist_command))
+    app.add_handler(CommandHandler("unlock", unlock_command))
+    app.add_handler(CommandHandler("settings", settings_command))
+    app.add_handler(CommandHandler("stats", stats_command))
+    
+    # Sudo commands
+    app.add_handler(CommandHandler("gban", gban_command))
+    app.add_handler(CommandHandler("ungban", ungban_command))
+    app.add_handler(CommandHandler("gbanlist", gbanlist_command))
+    app.add_handler(CommandHandler("gbanstats", gbanstats_command))
+    app.add_handler(CommandHandler("addsudo", addsudo_command))
+    app.add_handler(CommandHandler("delsudo", delsudo_command))
+    app.add_handler(CommandHandler("sudolist", sudolist_command))
+    app.add_handler(CommandHandler("sudostats", sudostats_command))
+    app.add_handler(CommandHandler("errors", errors_command))
+    app.add_handler(CommandHandler("trace", trace_command))
+    app.add_handler(CommandHandler("profile", profile_command))
+    app.add_handler(CommandHandler("lag", lag_command))
+    
+    if config.ALLOW_SUDO_COMMANDS:
+        app.add_handler(CommandHandler("shell", shell_command))
+        app.add_handler(CommandHandler("eval", eval_command))
+        app.add_handler(CommandHandler("broadcast", broadcast_command))
+        app.add_handler(CommandHandler("restart", restart_command))
+        app.add_handler(CommandHandler("update", update_command))
+    
+    # Message handlers
+    app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    app.add_handler(MessageHandler(filters.Document.IMAGE, handle_document))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    
+    # Raid detection and GBAN handler for new chat members
+    if config.ENABLE_GBAN or config.RAID_DETECTION:
+        app.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_chat_members))
+    
+    # GBAN screening for chats that require join approval
+    if config.ENABLE_GBAN:
+        app.add_handler(ChatJoinRequestHandler(handle_join_request))
+    
+    # Callback query handler
+    app.add_handler(CallbackQueryHandler(button_callback))
+    
+    # Handle regular messages for settings
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    
+    # Per-handler call, error and latency metrics
+    instrument_application(app)
+    
+    # Add error handler
+    app.add_error_handler(error_handler)
+    
+    # Add post initialization and shutdown
+    app.post_init = post_init
+    app.post_stop = post_stop
+    
+    return app
+
+def run_bot(app: Application):
+    """Serve updates using the configured mode (polling or webhook)"""
+    if config.BOT_MODE == "webhook":
+        webhook_url = f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}"
+        logger.info(f"🌐 Serving webhook on {config.WEBHOOK_LISTEN}:{config.WEBHOOK_PORT}/{config.WEBHOOK_PATH}")
+        
+        app.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.WEBHOOK_PATH,
+            webhook_url=webhook_url,
+            secret_token=config.WEBHOOK_SECRET_TOKEN,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            cert=config.WEBHOOK_CERT or None,
+            key=config.WEBHOOK_KEY or None,
+            drop_pending_updates=config.DROP_PENDING_UPDATES,
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        # Polling also removes any previously registered webhook
+        logger.info("🔁 Serving updates with long polling")
+        
+        app.run_polling(
+            drop_pending_updates=config.DROP_PENDING_UPDATES,
+            allowed_updates=ALLOWED_UPDATES
+        )
+
 def main():
     """Main function to start the bot"""
     global cleanup_task, application
@@ -154,65 +333,14 @@ def main():
         signal.signal(signal.SIGTERM, signal_handler)
         
         # Create application
-        logger.info("🚀 Creating bot application...")
-        application = Application.builder().token(config.TOKEN).build()
-        
-        # Add command handlers
-        logger.info("📝 Setting up command handlers...")
-        
-        # Basic commands
-        application.add_handler(CommandHandler("start", start_command))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("report", report_command))
-        application.add_handler(CommandHandler("appeal", appeal_command))
-        
-        # Admin commands
-        application.add_handler(CommandHandler("warn", warn_command))
-        application.add_handler(CommandHandler("ban", ban_command))
-        application.add_handler(CommandHandler("mute", mute_command))
-        application.add_handler(CommandHandler("kick", kick_command))
-        application.add_handler(CommandHandler("whitelist", whitelist_command))
-        application.add_handler(CommandHandler("unwhitelist", unwhitelist_command))
-        application.add_handler(CommandHandler("settings", settings_command))
-        application.add_handler(CommandHandler("stats", stats_command))
-        
-        # Sudo commands
-        application.add_handler(CommandHandler("gban", gban_command))
-        application.add_handler(CommandHandler("ungban", ungban_command))
-        application.add_handler(CommandHandler("gbanlist", gbanlist_command))
-        application.add_handler(CommandHandler("gbanstats", gbanstats_command))
-        application.add_handler(CommandHandler("addsudo", addsudo_command))
-        application.add_handler(CommandHandler("delsudo", delsudo_command))
-        application.add_handler(CommandHandler("sudolist", sudolist_command))
-        application.add_handler(CommandHandler("sudostats", sudostats_command))
-        
-        if config.ALLOW_SUDO_COMMANDS:
-            application.add_handler(CommandHandler("shell", shell_command))
-            application.add_handler(CommandHandler("eval", eval_command))
-            application.add_handler(CommandHandler("broadcast", broadcast_command))
-            application.add_handler(CommandHandler("restart", restart_command))
-            application.add_handler(CommandHandler("update", update_command))
-        
-        # Message handlers
-        application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
-        application.add_handler(MessageHandler(filters.Document.IMAGE, handle_document))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-        
-        # GBAN handler for new chat members
-        if config.ENABLE_GBAN:
-            application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_chat_members))
-        
-        # Callback query handler
-        application.add_handler(CallbackQueryHandler(button_callback))
-        
-        # Handle regular messages for settings
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-        
-        # Add error handler
-        application.add_error_handler(error_handler)
-        
-        # Add post initialization
-        application.post_init = post_init
+        if config.WORKER_PROCESSES > 1:
+            # Receiver only routes updates; handlers run in the worker processes
+            from supervisor import Supervisor
+            logger.info(f"🚀 Creating receiver for {config.WORKER_PROCESSES} worker processes...")
+            application = Supervisor(config.WORKER_PROCESSES).build_receiver()
+        else:
+            logger.info("🚀 Creating bot application...")
+            application = build_application()
         
         # Start bot
         logger.info("🤖 Starting bot...")
@@ -224,16 +352,7 @@ def main():
         cleanup_task = loop.create_task(schedule_cleanup())
         
         # Run the bot
-        application.run_polling(
-            drop_pending_updates=config.DROP_PENDING_UPDATES,
-            allowed_updates=[
-                "message",
-                "callback_query",
-                "chat_member",
-                "my_chat_member",
-                "chat_join_request"
-            ]
-        )
+        run_bot(application)
         
     except ValueError as e:
         logger.error(f"❌ Configuration error: {e}")
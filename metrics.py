@@ -0,0 +1,368 @@
+"""
+Metrics
+In-process counters, gauges and latency histograms served in the
+Prometheus text exposition format
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import config
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from 100µs to 10s
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _CounterChild:
+    __slots__ = ('value',)
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class _GaugeChild:
+    __slots__ = ('value',)
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def set(self, value: float):
+        self.value = value
+    
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+    
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        # One bisect and three increments keep an observation well under 1µs
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metric:
+    """A named metric family with optional labels"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def labels(self, *values) -> object:
+        """Child for a label combination; resolve once and keep it on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+    
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+    
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+    
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"
+            for values, child in self._children.items()
+        ]
+
+class Gauge(Metric):
+    kind = "gauge"
+    
+    def _new_child(self):
+        return _GaugeChild()
+    
+    def set(self, value: float):
+        self._children[()].set(value)
+    
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+    
+    def dec(self, amount: float = 1.0):
+        self._children[()].dec(amount)
+    
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"
+            for values, child in self._children.items()
+        ]
+
+class CallbackGauge(Metric):
+    """Gauge whose values are read from a function at scrape time"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, callback: Callable[[], object],
+                 labelnames: Iterable[str] = ()):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+        self._children.clear()
+    
+    def _new_child(self):
+        # Values come from the callback, there are no children to update
+        return None
+    
+    def _samples(self):
+        try:
+            result = self.callback()
+        except Exception as e:
+            logger.debug(f"Metric callback {self.name} failed: {e}")
+            return []
+        
+        if isinstance(result, dict):
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key if isinstance(key, tuple) else (key,))} {value}"
+                for key, value in result.items()
+            ]
+        return [f"{self.name} {result}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float):
+        self._children[()].observe(value)
+    
+    def _samples(self):
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {child.count}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {child.sum}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+class MetricsRegistry:
+    """Holds metric families and renders the exposition text"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+    
+    def _register(self, metric: Metric) -> Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+    
+    def callback_gauge(self, name: str, documentation: str, callback: Callable[[], object],
+                       labelnames: Iterable[str] = ()) -> CallbackGauge:
+        return self._register(CallbackGauge(name, documentation, callback, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def expose(self) -> str:
+        return "\n".join(metric.expose() for metric in self._metrics.values()) + "\n"
+
+# Global registry
+registry = MetricsRegistry()
+
+# Core metric families
+handler_requests = registry.counter(
+    "bot_handler_requests_total", "Handler invocations", ("handler",))
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Handler invocations that raised", ("handler",))
+handler_latency = registry.histogram(
+    "bot_handler_latency_seconds", "Handler latency", ("handler",))
+
+db_calls = registry.counter(
+    "bot_db_calls_total", "Database method calls", ("method",))
+db_errors = registry.counter(
+    "bot_db_errors_total", "Database method calls that raised", ("method",))
+db_latency = registry.histogram(
+    "bot_db_latency_seconds", "Database method latency", ("method",))
+
+api_requests = registry.counter(
+    "bot_api_requests_total", "Bot API requests", ("endpoint",))
+api_errors = registry.counter(
+    "bot_api_errors_total", "Bot API requests that failed", ("endpoint", "error"))
+api_latency = registry.histogram(
+    "bot_api_latency_seconds", "Bot API request latency including rate limiting", ("endpoint",))
+
+cache_requests = registry.counter(
+    "bot_cache_requests_total", "Cache lookups", ("cache", "result"))
+
+def instrument_handler(callback: Callable, name: Optional[str] = None) -> Callable:
+    """Wrap a handler coroutine with call, error and latency metrics"""
+    name = name or getattr(callback, '__name__', 'handler')
+    calls = handler_requests.labels(name)
+    errors = handler_errors.labels(name)
+    latency = handler_latency.labels(name)
+    
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        calls.inc()
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            latency.observe(elapsed)
+            tracer.record('handler', name, started, elapsed)
+    
+    return wrapper
+
+def instrument_application(application) -> int:
+    """Wrap the callback of every registered handler; returns the number wrapped"""
+    wrapped = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not getattr(handler.callback, '__wrapped__', None):
+                handler.callback = instrument_handler(handler.callback)
+                wrapped += 1
+    return wrapped
+
+def instrument_methods(obj, prefix: str = "") -> int:
+    """Wrap the public synchronous methods of an instance with call, error and latency metrics"""
+    wrapped = 0
+    for name, method in inspect.getmembers(type(obj), inspect.isfunction):
+        if name.startswith('_'):
+            continue
+        
+        label = f"{prefix}{name}"
+        bound = getattr(obj, name)
+        calls = db_calls.labels(label)
+        errors = db_errors.labels(label)
+        latency = db_latency.labels(label)
+        
+        def make_wrapper(bound=bound, label=label, calls=calls, errors=errors, latency=latency):
+            @functools.wraps(bound)
+            def wrapper(*args, **kwargs):
+                calls.inc()
+                started = time.perf_counter()
+                try:
+                    return bound(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - started
+                    latency.observe(elapsed)
+                    tracer.record('db', label, started, elapsed)
+            return wrapper
+        
+        setattr(obj, name, make_wrapper())
+        wrapped += 1
+    return wrapped
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics"""
+    
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.base_events.Server] = None
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+            
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = b'200 OK', registry.expose().encode()
+            else:
+                status, body = b'404 Not Found', b'not found\n'
+            
+            writer.write(
+                b'HTTP/1.1 ' + status + b'\r\n'
+                b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                b'Connection: close\r\n\r\n' + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"📈 Metrics available at http://{self.host}:{self.port}/metrics")
+    
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+# Global metrics server (started from post_init when METRICS_PORT is set)
+metrics_server = MetricsServer(config.METRICS_HOST, config.METRICS_PORT)
@@ -0,0 +1,188 @@
+"""
+Moderation Pipeline
+Per-chat chain of moderation stages compiled from chat settings
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import config
+from database import db
+from metrics import cache_requests
+
+logger = logging.getLogger(__name__)
+
+_pipeline_hit = cache_requests.labels('pipeline', 'hit')
+_pipeline_miss = cache_requests.labels('pipeline', 'miss')
+
+# Per (chat_id, user_id) message timestamps for the rate limit stage
+message_timestamps: Dict[Tuple[int, int], Deque[float]] = {}
+
+class Stage:
+    """Base moderation stage"""
+    
+    name = "stage"
+    
+    def __init__(self, settings: Dict):
+        self.settings = settings
+    
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Dict]:
+        """Return a verdict dict to stop the pipeline, or None to continue"""
+        return None
+
+class WhitelistStage(Stage):
+    """Whitelisted users skip all further moderation"""
+    
+    name = "whitelist"
+    
+    async def check(self, update, context):
+        if db.is_user_whitelisted(update.effective_user.id, update.effective_chat.id):
+            return {'action': 'allow', 'reason': 'User is whitelisted'}
+        return None
+
+class GbanStage(Stage):
+    """Globally banned users are removed before any content checks"""
+    
+    name = "gban"
+    
+    async def check(self, update, context):
+        is_gbanned, reason = db.is_user_gbanned(update.effective_user.id)
+        if is_gbanned:
+            return {'action': 'gban', 'reason': reason}
+        return None
+
+class RateLimitStage(Stage):
+    """Flag users sending more than SPAM_THRESHOLD messages within the window"""
+    
+    name = "rate_limit"
+    window_seconds = 10
+    
+    async def check(self, update, context):
+        key = (update.effective_chat.id, update.effective_user.id)
+        now = time.monotonic()
+        
+        timestamps = message_timestamps.get(key)
+        if timestamps is None:
+            timestamps = message_timestamps[key] = deque()
+        
+        timestamps.append(now)
+        while timestamps and now - timestamps[0] > self.window_seconds:
+            timestamps.popleft()
+        
+        if len(timestamps) > config.SPAM_THRESHOLD:
+            return {'action': 'delete', 'reason': 'Flooding', 'warning_type': 'spam'}
+        return None
+
+class ModerationPipeline:
+    """Ordered, cheap-first list of stages for a single chat"""
+    
+    def __init__(self, chat_id: int, version: int, settings: Dict, stages: List[Stage], timings: Dict[str, Dict]):
+        self.chat_id = chat_id
+        self.version = version
+        self.settings = settings
+        self.stages = stages
+        self._timings = timings
+    
+    async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Dict:
+        """Run stages in order, stopping at the first one that decides"""
+        for stage in self.stages:
+            started = time.perf_counter()
+            try:
+                verdict = await stage.check(update, context)
+            except Exception as e:
+                logger.error(f"Error in pipeline stage {stage.name} for chat {self.chat_id}: {e}")
+                verdict = None
+            self._record(stage.name, time.perf_counter() - started, verdict is not None)
+            
+            if verdict is not None:
+                verdict['stage'] = stage.name
+                return verdict
+        
+        return {'action': 'allow', 'stage': None, 'reason': None}
+    
+    def _record(self, stage_name: str, elapsed: float, decided: bool):
+        """Accumulate timing for a stage"""
+        timing = self._timings.get(stage_name)
+        if timing is None:
+            timing = self._timings[stage_name] = {'calls': 0, 'decisions': 0, 'total_time': 0.0, 'max_time': 0.0}
+        timing['calls'] += 1
+        timing['total_time'] += elapsed
+        if elapsed > timing['max_time']:
+            timing['max_time'] = elapsed
+        if decided:
+            timing['decisions'] += 1
+
+class PipelineCache:
+    """Compiled pipelines per chat, rebuilt only when the chat settings version changes"""
+    
+    def __init__(self):
+        self._pipelines: Dict[int, ModerationPipeline] = {}
+        self._timings: Dict[str, Dict] = {}
+        self.builds = 0
+    
+    def get(self, chat_id: int) -> ModerationPipeline:
+        """Get the compiled pipeline for a chat"""
+        version = db.get_settings_version(chat_id)
+        pipeline = self._pipelines.get(chat_id)
+        
+        if pipeline is None or pipeline.version != version:
+            _pipeline_miss.inc()
+            pipeline = self._build(chat_id, version)
+            self._pipelines[chat_id] = pipeline
+        else:
+            _pipeline_hit.inc()
+        
+        return pipeline
+    
+    async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Dict:
+        """Run the pipeline for the update's chat"""
+        return await self.get(update.effective_chat.id).run(update, context)
+    
+    def _build(self, chat_id: int, version: int) -> ModerationPipeline:
+        """Compile the stage list from chat settings"""
+        settings = db.get_chat_settings(chat_id)
+        stages: List[Stage] = [WhitelistStage(settings)]
+        
+        if config.ENABLE_GBAN and settings.get('enable_gban_sync', True):
+            stages.append(GbanStage(settings))
+        
+        if config.ENABLE_SPAM_DETECTION and settings.get('enable_spam_filter', True):
+            stages.append(RateLimitStage(settings))
+        
+        self.builds += 1
+        logger.debug(f"Pipeline for chat {chat_id} compiled (v{version}): {[s.name for s in stages]}")
+        return ModerationPipeline(chat_id, version, settings, stages, self._timings)
+    
+    def invalidate(self, chat_id: Optional[int] = None):
+        """Drop compiled pipelines for one chat or all chats"""
+        if chat_id is None:
+            self._pipelines.clear()
+        else:
+            self._pipelines.pop(chat_id, None)
+    
+    def get_timings(self) -> Dict[str, Dict]:
+        """Get per-stage timing statistics"""
+        timings = {}
+        for stage_name, timing in self._timings.items():
+            calls = timing['calls']
+            timings[stage_name] = {
+                'calls': calls,
+                'decisions': timing['decisions'],
+                'avg_ms': (timing['total_time'] / calls * 1000) if calls else 0.0,
+                'max_ms': timing['max_time'] * 1000,
+            }
+        return timings
+
+def prune_rate_limit_history(max_age_seconds: int = 3600):
+    """Drop idle rate limit histories"""
+    now = time.monotonic()
+    for key in [k for k, v in message_timestamps.items() if not v or now - v[-1] > max_age_seconds]:
+        del message_timestamps[key]
+
+# Global pipeline cache
+pipeline_cache = PipelineCache()
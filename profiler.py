@@ -0,0 +1,155 @@
+"""
+Sampling Profiler
+Low-overhead wall-clock sampling of the event loop thread's stack from a
+background thread, rendered as collapsed stacks for flamegraph tools
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames of a thread waiting for work rather than running it
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+}
+
+def _is_idle(code) -> bool:
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """Samples sys._current_frames() at a fixed interval while running
+    
+    Samples whose innermost frame is an idle wait (the loop's select, a
+    Condition or queue wait) are only counted, so the stacks show work.
+    """
+    
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self.duration = 0.0
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        thread_names = {}
+        started = time.perf_counter()
+        
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self._target is not None and thread_id != self._target):
+                    continue
+                
+                if _is_idle(frame.f_code):
+                    self.idle += 1
+                    continue
+                
+                if thread_id not in thread_names:
+                    thread_names = {t.ident: t.name for t in threading.enumerate()}
+                
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                stack.reverse()
+                
+                self.stacks[tuple(stack)] += 1
+            self.samples += 1
+        
+        self.duration = time.perf_counter() - started
+    
+    def start(self, thread_id: Optional[int] = None):
+        """Start sampling one thread, or every thread when thread_id is None"""
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self.stacks.clear()
+        self.samples = 0
+        self.idle = 0
+        self.duration = 0.0
+        self._target = thread_id
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    async def profile(self, seconds: float):
+        """Sample the event loop thread for a number of seconds without blocking it"""
+        self.start(threading.get_ident())
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.stop()
+    
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed stack format: frame;frame;frame count"""
+        return "\n".join(
+            f"{';'.join(stack)} {count}"
+            for stack, count in sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)
+        ) + "\n"
+    
+    def top_functions(self, limit: int = 15) -> List[Dict]:
+        """Functions by self samples, with inclusive samples for context"""
+        self_samples: Counter = Counter()
+        total_samples: Counter = Counter()
+        
+        for stack, count in self.stacks.items():
+            # The first element is the thread name, the last the running frame
+            frames = stack[1:]
+            if not frames:
+                continue
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                total_samples[frame] += count
+        
+        sampled = sum(self.stacks.values()) or 1
+        return [
+            {
+                'function': function,
+                'self': count,
+                'self_pct': count / sampled * 100,
+                'total_pct': total_samples[function] / sampled * 100
+            }
+            for function, count in self_samples.most_common(limit)
+        ]
+    
+    def idle_pct(self) -> float:
+        """Share of samples spent waiting for work"""
+        sampled = sum(self.stacks.values()) + self.idle
+        return self.idle / sampled * 100 if sampled else 0.0
+    
+    def thread_breakdown(self) -> List[Tuple[str, int]]:
+        threads: Counter = Counter()
+        for stack, count in self.stacks.items():
+            threads[stack[0]] += count
+        return threads.most_common()
+
+# Global profiler (only one profile can run at a time)
+profiler = SamplingProfiler(interval=config.PROFILER_INTERVAL_MS / 1000)
@@ -0,0 +1,236 @@
+"""
+User Profile Store
+Keeps user names seen in incoming updates so commands can show who a user
+is without a get_chat call; writes are batched and stale names are
+refreshed in the background
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from telegram import Update, User
+
+from config import config
+from database import db
+from metrics import cache_requests
+
+logger = logging.getLogger(__name__)
+
+_profile_hit = cache_requests.labels('profile', 'hit')
+_profile_miss = cache_requests.labels('profile', 'miss')
+
+class Profile:
+    __slots__ = ('user_id', 'username', 'first_name', 'last_name', 'updated_at')
+    
+    def __init__(self, user_id: int, username: str, first_name: str, last_name: str, updated_at: float):
+        self.user_id = user_id
+        self.username = username or ""
+        self.first_name = first_name or ""
+        self.last_name = last_name or ""
+        self.updated_at = updated_at
+    
+    @property
+    def display_name(self) -> str:
+        name = self.first_name or f"User {self.user_id}"
+        return f"{name} (@{self.username})" if self.username else name
+
+class ProfileStore:
+    """user_id -> Profile, least recently seen evicted first"""
+    
+    # A user seen again with unchanged names is only re-saved this often
+    TOUCH_INTERVAL = 3600
+    
+    def __init__(self, max_entries: int = 100000, flush_interval: float = 10.0,
+                 stale_after: float = 7 * 86400, refresh_concurrency: int = 5):
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self.counts = {'observed': 0, 'saved': 0, 'refreshed': 0, 'refresh_failed': 0}
+        self._profiles: "OrderedDict[int, Profile]" = OrderedDict()
+        self._dirty: Dict[int, Profile] = {}
+        self._refreshing: Set[int] = set()
+        self._refresh_failed: Dict[int, float] = {}
+        self._refresh_slots = asyncio.Semaphore(refresh_concurrency)
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+    
+    async def observe(self, update: Update, context=None):
+        """Record every user an update carries (sender, replied-to user, new members)"""
+        users: List[User] = []
+        if update.effective_user is not None:
+            users.append(update.effective_user)
+        
+        message = update.effective_message
+        if message is not None:
+            if message.reply_to_message is not None and message.reply_to_message.from_user is not None:
+                users.append(message.reply_to_message.from_user)
+            users.extend(message.new_chat_members or ())
+        
+        for user in users:
+            self.remember(user.id, user.username, user.first_name, user.last_name)
+    
+    def remember(self, user_id: int, username: Optional[str], first_name: Optional[str],
+                 last_name: Optional[str], updated_at: Optional[float] = None, dirty: bool = True):
+        """Store a user's names; changed or long-unsaved profiles are queued for the next flush"""
+        now = time.time() if updated_at is None else updated_at
+        profile = self._profiles.get(user_id)
+        self.counts['observed'] += 1
+        
+        if profile is not None:
+            self._profiles.move_to_end(user_id)
+            unchanged = (profile.username, profile.first_name, profile.last_name) == \
+                        (username or "", first_name or "", last_name or "")
+            if unchanged and now - profile.updated_at < self.TOUCH_INTERVAL:
+                return
+        
+        profile = self._profiles[user_id] = Profile(user_id, username, first_name, last_name, now)
+        if dirty:
+            # Held here until flushed, even if evicted from the cache meanwhile
+            self._dirty[user_id] = profile
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+    
+    def lookup(self, user_ids: Iterable[int], bot=None) -> Dict[int, Profile]:
+        """Known profiles for a batch of users from memory, then one database query
+        
+        With a bot, missing and stale users are refreshed in the background
+        so the next lookup has their current names.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        found: Dict[int, Profile] = {}
+        missing = []
+        for user_id in user_ids:
+            profile = self._profiles.get(user_id) or self._dirty.get(user_id)
+            if profile is not None:
+                found[user_id] = profile
+            else:
+                missing.append(user_id)
+        
+        if missing:
+            for user_id, row in db.get_profiles(missing).items():
+                updated_at = _timestamp(row['last_seen'])
+                self.remember(user_id, row['username'], row['first_name'], row['last_name'],
+                              updated_at=updated_at, dirty=False)
+                found[user_id] = self._profiles[user_id]
+        
+        _profile_hit.inc(len(found))
+        _profile_miss.inc(len(user_ids) - len(found))
+        
+        if bot is not None:
+            now = time.time()
+            stale = [user_id for user_id in user_ids
+                     if user_id not in found or now - found[user_id].updated_at > self.stale_after]
+            if stale:
+                self.refresh(bot, stale)
+        return found
+    
+    def display_names(self, user_ids: Iterable[int], bot=None) -> Dict[int, str]:
+        """'First (@username)' for each user, 'User <id>' when unknown"""
+        user_ids = list(user_ids)
+        profiles = self.lookup(user_ids, bot)
+        return {
+            user_id: profiles[user_id].display_name if user_id in profiles else f"User {user_id}"
+            for user_id in user_ids
+        }
+    
+    def display_name(self, user_id: int, bot=None) -> str:
+        return self.display_names([user_id], bot)[user_id]
+    
+    def refresh(self, bot, user_ids: Iterable[int]):
+        """Fetch current names with get_chat in the background, bounded concurrency"""
+        # Users who never talked to the bot can't be fetched; retry them rarely
+        now = time.time()
+        user_ids = [
+            user_id for user_id in user_ids
+            if user_id not in self._refreshing and now - self._refresh_failed.get(user_id, 0) > self.TOUCH_INTERVAL
+        ]
+        if not user_ids:
+            return
+        self._refreshing.update(user_ids)
+        task = asyncio.create_task(self._refresh(bot, user_ids))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+    
+    async def _refresh(self, bot, user_ids: List[int]):
+        async def fetch(user_id: int):
+            async with self._refresh_slots:
+                chat = await bot.get_chat(user_id)
+            self.remember(user_id, chat.username, chat.first_name, chat.last_name)
+        
+        try:
+            outcomes = await asyncio.gather(*(fetch(user_id) for user_id in user_ids), return_exceptions=True)
+        finally:
+            self._refreshing.difference_update(user_ids)
+        
+        if len(self._refresh_failed) > self.max_entries:
+            self._refresh_failed.clear()
+        now = time.time()
+        failed = 0
+        for user_id, outcome in zip(user_ids, outcomes):
+            if isinstance(outcome, Exception):
+                self._refresh_failed[user_id] = now
+                failed += 1
+            else:
+                self._refresh_failed.pop(user_id, None)
+        
+        self.counts['refreshed'] += len(user_ids) - failed
+        self.counts['refresh_failed'] += failed
+        if failed:
+            logger.debug(f"Could not refresh {failed}/{len(user_ids)} user profiles")
+    
+    def flush(self) -> int:
+        """Write queued profiles to the database in one transaction"""
+        if not self._dirty:
+            return 0
+        
+        dirty, self._dirty = self._dirty, {}
+        rows = [
+            (profile.user_id, profile.username, profile.first_name, profile.last_name,
+             datetime.fromtimestamp(profile.updated_at))
+            for profile in dirty.values()
+        ]
+        db.save_profiles(rows)
+        self.counts['saved'] += len(rows)
+        return len(rows)
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error saving user profiles: {e}")
+    
+    def start(self):
+        """Start the periodic flush task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.counts,
+            'cached': len(self._profiles),
+            'unsaved': len(self._dirty),
+            'refreshing': len(self._refreshing)
+        }
+
+def _timestamp(value) -> float:
+    """users.last_seen as a unix timestamp (0 if unknown, i.e. stale)"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+# Global profile store
+profile_store = ProfileStore(
+    max_entries=config.PROFILE_CACHE_SIZE,
+    flush_interval=config.PROFILE_FLUSH_SECONDS,
+    stale_after=config.PROFILE_STALE_HOURS * 3600,
+    refresh_concurrency=config.PROFILE_REFRESH_CONCURRENCY
+)
@@ -0,0 +1,332 @@
+"""
+Join Raid Detection
+Per-chat sliding-window join rates against an adaptive baseline; a burst
+locks the chat, bans or mutes the joining cohort and unlocks after a cooldown.
+Locked chats are stored so their permissions survive a restart
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from telegram import ChatPermissions, Update
+from telegram.ext import ContextTypes
+
+from config import config
+from database import db
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+raid_lockdowns = registry.counter(
+    "bot_raid_lockdowns_total", "Chats locked down after a join burst")
+raid_actions = registry.counter(
+    "bot_raid_actions_total", "Raid accounts acted on", ("action", "result"))
+
+class JoinRateTracker:
+    """Joins per second in a ring of one-second buckets, plus an EWMA baseline rate"""
+    
+    __slots__ = ('window', 'buckets', 'second', 'total', 'baseline', 'alpha', 'recent',
+                 'locked_until', 'saved_permissions', 'cohort_size')
+    
+    def __init__(self, window: int, alpha: float, cohort_limit: int):
+        self.window = window
+        self.buckets = [0] * window
+        self.second = int(time.monotonic())
+        self.total = 0
+        self.baseline = 0.0
+        self.alpha = alpha
+        self.recent: Deque[Tuple[float, int]] = deque(maxlen=cohort_limit)
+        self.locked_until = 0.0
+        self.saved_permissions: Optional[ChatPermissions] = None
+        self.cohort_size = 0
+    
+    def _advance(self, second: int, learn: bool, cap: float):
+        elapsed = second - self.second
+        if elapsed <= 0:
+            return
+        
+        # Fold the finished second into the baseline, then the empty seconds since;
+        # spiky seconds are capped so a building burst can't raise its own threshold
+        if learn:
+            closed = min(self.buckets[self.second % self.window], cap)
+            self.baseline += self.alpha * (closed - self.baseline)
+            self.baseline *= (1 - self.alpha) ** (elapsed - 1)
+        
+        # Expire buckets that left the window (at most one full lap)
+        for offset in range(1, min(elapsed, self.window) + 1):
+            index = (self.second + offset) % self.window
+            self.total -= self.buckets[index]
+            self.buckets[index] = 0
+        self.second = second
+    
+    def add(self, now: float, count: int, learn: bool, cap: float) -> int:
+        """Record joins and return the number of joins in the window"""
+        self._advance(int(now), learn, cap)
+        self.buckets[self.second % self.window] += count
+        self.total += count
+        return self.total
+    
+    def threshold(self, min_joins: int, spike_factor: float) -> float:
+        return max(min_joins, spike_factor * self.baseline * self.window)
+    
+    def cohort(self, since: float) -> List[int]:
+        return [user_id for joined, user_id in self.recent if joined >= since]
+
+class RaidDetector:
+    """Watches join rates per chat and runs lockdowns"""
+    
+    # Wait before retrying a failed permission restore
+    UNLOCK_RETRY_SECONDS = 60
+    
+    def __init__(self, window: int = 10, min_joins: int = 15, spike_factor: float = 5.0,
+                 lockdown_seconds: int = 600, action: str = 'mute', concurrency: int = 10,
+                 baseline_alpha: float = 0.01, cohort_limit: int = 1000):
+        self.window = max(window, 1)
+        self.min_joins = min_joins
+        self.spike_factor = spike_factor
+        self.lockdown_seconds = lockdown_seconds
+        self.action = action
+        self.baseline_alpha = baseline_alpha
+        self.cohort_limit = cohort_limit
+        self.trackers: Dict[int, JoinRateTracker] = {}
+        self.raids_detected = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        # Not Application.create_task: Application.stop() would wait out every lockdown
+        self._unlock_tasks: Dict[int, asyncio.Task] = {}
+        
+        registry.callback_gauge(
+            "bot_raid_locked_chats", "Chats currently locked down", lambda: len(self.locked_chats()))
+    
+    def _tracker(self, chat_id: int) -> JoinRateTracker:
+        tracker = self.trackers.get(chat_id)
+        if tracker is None:
+            tracker = self.trackers[chat_id] = JoinRateTracker(self.window, self.baseline_alpha, self.cohort_limit)
+        return tracker
+    
+    def locked_chats(self) -> List[int]:
+        now = time.monotonic()
+        return [chat_id for chat_id, tracker in self.trackers.items() if tracker.locked_until > now]
+    
+    def is_locked(self, chat_id: int) -> bool:
+        """In a lockdown, or still waiting for its permissions to be restored"""
+        tracker = self.trackers.get(chat_id)
+        return tracker is not None and (tracker.locked_until > time.monotonic() or tracker.saved_permissions is not None)
+    
+    async def on_join(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Count a join message; O(1) per member outside of a lockdown's actions"""
+        message = update.message
+        if not message or not message.new_chat_members:
+            return
+        
+        members = [member.id for member in message.new_chat_members if not member.is_bot]
+        if not members:
+            return
+        
+        chat_id = update.effective_chat.id
+        tracker = self._tracker(chat_id)
+        
+        now = time.monotonic()
+        locked = tracker.locked_until > now
+        # A raid must not teach the baseline that raids are normal
+        threshold = tracker.threshold(self.min_joins, self.spike_factor)
+        joins = tracker.add(now, len(members), not locked, threshold / self.window)
+        
+        if locked:
+            tracker.cohort_size += len(members)
+            context.application.create_task(self._act(context.bot, chat_id, members))
+            return
+        
+        for user_id in members:
+            tracker.recent.append((now, user_id))
+        
+        if joins >= threshold:
+            tracker.locked_until = now + self.lockdown_seconds
+            cohort = tracker.cohort(now - self.window)
+            tracker.cohort_size = len(cohort)
+            tracker.recent.clear()
+            self.raids_detected += 1
+            raid_lockdowns.inc()
+            logger.warning(
+                f"🚨 Join raid in chat {chat_id}: {joins} joins in {self.window}s "
+                f"(baseline {tracker.baseline * self.window:.1f}), locking for {self.lockdown_seconds}s"
+            )
+            context.application.create_task(self._lockdown(context.bot, chat_id, tracker, cohort, joins))
+    
+    async def _act(self, bot, chat_id: int, user_ids: List[int]) -> int:
+        """Ban or mute raid accounts concurrently; returns how many succeeded"""
+        async def act(user_id: int):
+            async with self._slots:
+                if self.action == 'ban':
+                    await bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
+                else:
+                    await bot.restrict_chat_member(
+                        chat_id=chat_id, user_id=user_id, permissions=ChatPermissions.no_permissions())
+        
+        results = await asyncio.gather(*(act(user_id) for user_id in user_ids), return_exceptions=True)
+        failed = [result for result in results if isinstance(result, Exception)]
+        
+        raid_actions.labels(self.action, 'ok').inc(len(results) - len(failed))
+        if failed:
+            raid_actions.labels(self.action, 'failed').inc(len(failed))
+            logger.error(f"Raid {self.action} failed for {len(failed)} users in chat {chat_id}: {failed[0]}")
+        return len(results) - len(failed)
+    
+    async def _lockdown(self, bot, chat_id: int, tracker: JoinRateTracker, cohort: List[int], joins: int):
+        # Only lock when the current permissions can be restored afterwards
+        try:
+            chat = await bot.get_chat(chat_id)
+            tracker.saved_permissions = chat.permissions
+            if tracker.saved_permissions is not None:
+                # Stored first, so a crash right after locking can't leave the chat locked for good
+                db.save_raid_lockdown(
+                    chat_id, tracker.saved_permissions.to_dict(),
+                    time.time() + self.lockdown_seconds, tracker.cohort_size
+                )
+                await bot.set_chat_permissions(chat_id=chat_id, permissions=ChatPermissions.no_permissions())
+        except Exception as e:
+            tracker.saved_permissions = None
+            db.remove_raid_lockdown(chat_id)
+            logger.error(f"Could not lock chat {chat_id} during raid: {e}")
+        
+        self._schedule_unlock(bot, chat_id, tracker, max(tracker.locked_until - time.monotonic(), 0))
+        
+        acted = await self._act(bot, chat_id, cohort)
+        verb = "banned" if self.action == 'ban' else "muted"
+        
+        try:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=(
+                    f"🚨 <b>Join raid detected</b>\n\n"
+                    f"{joins} joins in {self.window}s. "
+                    f"{acted} new accounts {verb}.\n"
+                    f"{'The chat is locked' if tracker.saved_permissions else 'New joiners will be ' + verb} "
+                    f"for {self.lockdown_seconds // 60} minutes. Admins can lift it with /unlock."
+                ),
+                parse_mode='HTML'
+            )
+        except Exception as e:
+            logger.error(f"Could not announce raid lockdown in chat {chat_id}: {e}")
+    
+    def _schedule_unlock(self, bot, chat_id: int, tracker: JoinRateTracker, delay: float):
+        previous = self._unlock_tasks.pop(chat_id, None)
+        if previous is not None:
+            previous.cancel()
+        
+        self._unlock_tasks[chat_id] = asyncio.create_task(self._unlock_later(bot, chat_id, tracker, delay))
+    
+    async def _unlock_later(self, bot, chat_id: int, tracker: JoinRateTracker, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            while not await self._unlock(bot, chat_id, tracker):
+                await asyncio.sleep(self.UNLOCK_RETRY_SECONDS)
+        finally:
+            if self._unlock_tasks.get(chat_id) is asyncio.current_task():
+                del self._unlock_tasks[chat_id]
+    
+    async def _unlock(self, bot, chat_id: int, tracker: JoinRateTracker) -> bool:
+        """Restore the saved permissions; False leaves the lockdown stored for a retry"""
+        tracker.locked_until = 0.0
+        permissions = tracker.saved_permissions
+        
+        if permissions is not None:
+            try:
+                await bot.set_chat_permissions(chat_id=chat_id, permissions=permissions)
+            except Exception as e:
+                logger.error(f"Could not restore permissions in chat {chat_id} after raid: {e}")
+                return False
+            tracker.saved_permissions = None
+            db.remove_raid_lockdown(chat_id)
+        
+        try:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=(
+                    f"🔓 <b>Raid lockdown lifted</b>\n\n"
+                    f"{tracker.cohort_size} raid accounts were handled. "
+                    f"Admins can review them in the member list."
+                ),
+                parse_mode='HTML'
+            )
+        except Exception as e:
+            logger.error(f"Could not announce end of raid lockdown in chat {chat_id}: {e}")
+        
+        logger.info(f"🔓 Raid lockdown lifted in chat {chat_id} ({tracker.cohort_size} accounts)")
+        return True
+    
+    async def unlock(self, bot, chat_id: int) -> bool:
+        """Lift a chat's lockdown now; False if the chat is not locked or the restore failed"""
+        if not self.is_locked(chat_id):
+            return False
+        tracker = self.trackers[chat_id]
+        
+        task = self._unlock_tasks.pop(chat_id, None)
+        if task is not None:
+            task.cancel()
+        
+        if await self._unlock(bot, chat_id, tracker):
+            return True
+        self._schedule_unlock(bot, chat_id, tracker, self.UNLOCK_RETRY_SECONDS)
+        return False
+    
+    async def restore(self, bot, owns: Optional[Callable[[int], bool]] = None) -> int:
+        """Resume stored lockdowns after a restart; expired ones are lifted right away
+        
+        ``owns`` limits this to the chats this process serves.
+        """
+        restored = 0
+        for lockdown in db.get_raid_lockdowns():
+            chat_id = lockdown['chat_id']
+            if owns is not None and not owns(chat_id):
+                continue
+            
+            remaining = max(lockdown['locked_until'] - time.time(), 0)
+            tracker = self._tracker(chat_id)
+            tracker.saved_permissions = ChatPermissions.de_json(lockdown['permissions'], bot)
+            tracker.cohort_size = lockdown['cohort_size']
+            tracker.locked_until = time.monotonic() + remaining
+            self._schedule_unlock(bot, chat_id, tracker, remaining)
+            restored += 1
+        
+        if restored:
+            logger.info(f"🔒 Resumed {restored} raid lockdowns")
+        return restored
+    
+    async def shutdown(self, bot):
+        """Lift every lockdown so no chat stays locked while the bot is down
+        
+        Lockdowns that can't be lifted stay stored and are resumed by restore().
+        """
+        for task in self._unlock_tasks.values():
+            task.cancel()
+        self._unlock_tasks.clear()
+        
+        locked = [
+            (chat_id, tracker) for chat_id, tracker in self.trackers.items()
+            if tracker.saved_permissions is not None
+        ]
+        if locked:
+            await asyncio.gather(
+                *(self._unlock(bot, chat_id, tracker) for chat_id, tracker in locked),
+                return_exceptions=True
+            )
+    
+    def get_stats(self) -> Dict:
+        return {
+            'tracked_chats': len(self.trackers),
+            'locked_chats': len(self.locked_chats()),
+            'raids_detected': self.raids_detected
+        }
+
+# Global raid detector
+raid_detector = RaidDetector(
+    window=config.RAID_WINDOW_SECONDS,
+    min_joins=config.RAID_MIN_JOINS,
+    spike_factor=config.RAID_SPIKE_FACTOR,
+    lockdown_seconds=config.RAID_LOCKDOWN_SECONDS,
+    action=config.RAID_ACTION,
+    concurrency=config.RAID_ACTION_CONCURRENCY
+)
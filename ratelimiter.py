@@ -0,0 +1,284 @@
+"""
+Outbound Rate Limiter
+Token-bucket scheduling for all Bot API requests
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import config
+from metrics import api_errors, api_latency, api_requests, registry
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Priority classes
+PRIORITY_MODERATION = 0
+PRIORITY_DEFAULT = 1
+
+# Moderation actions jump ahead of informational replies
+MODERATION_ENDPOINTS = {
+    'deleteMessage', 'deleteMessages', 'banChatMember', 'unbanChatMember',
+    'restrictChatMember', 'setChatPermissions', 'approveChatJoinRequest',
+    'declineChatJoinRequest', 'banChatSenderChat'
+}
+
+# Endpoints that post into a chat and count against the per-chat limits
+MESSAGE_ENDPOINT_PREFIXES = ('send', 'edit', 'copyMessage', 'forwardMessage')
+
+# Endpoints that are never throttled
+EXEMPT_ENDPOINTS = {'getUpdates', 'answerCallbackQuery', 'setWebhook', 'deleteWebhook', 'logOut', 'close'}
+
+class TokenBucket:
+    """Classic token bucket refilled continuously"""
+    
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self):
+        self.tokens -= 1
+    
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    """Global and per-chat token buckets with moderation priority and RetryAfter handling
+    
+    ``rate_limit_args`` may be passed to any bot method to force a priority class
+    (0 moderation, 1 default).
+    """
+    
+    def __init__(self, global_rate: float = 30, group_rate_per_minute: float = 20,
+                 private_rate: float = 1, max_retries: int = 3):
+        if min(global_rate, group_rate_per_minute, private_rate) <= 0:
+            raise ValueError("Outbound rates must be positive")
+        
+        # A bucket holds at least one whole token, or rates below 1/s would never release one
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self.group_rate = group_rate_per_minute / 60
+        self.group_capacity = max(1.0, group_rate_per_minute / 6)
+        self.private_rate = private_rate
+        self.private_capacity = max(1.0, private_rate)
+        self.max_retries = max_retries
+        
+        self._chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        self._waiting = {PRIORITY_MODERATION: 0, PRIORITY_DEFAULT: 0}
+        # Moderation waiters per bucket they are blocked on; default traffic yields only on those buckets
+        self._blocked: Dict[TokenBucket, int] = {}
+        self._paused_until = 0.0
+        
+        # Metrics
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.max_queue_depth = 0
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        pass
+    
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._prune_buckets()
+            # Negative IDs and @usernames are groups/channels, positive IDs are private chats
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, self.group_capacity)
+            else:
+                bucket = TokenBucket(self.private_rate, self.private_capacity)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+    
+    def _prune_buckets(self):
+        """Drop idle per-chat buckets"""
+        now = time.monotonic()
+        for chat_id in [c for c, b in self._chat_buckets.items() if b.is_full(now)]:
+            del self._chat_buckets[chat_id]
+    
+    async def _acquire(self, priority: int, chat_bucket: Optional[TokenBucket]):
+        """Wait until both buckets have a token, yielding to moderation waiters on the same bucket"""
+        started = time.monotonic()
+        self._waiting[priority] += 1
+        depth = sum(self._waiting.values())
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        
+        blocked_on: Optional[TokenBucket] = None
+        try:
+            while True:
+                now = time.monotonic()
+                
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                
+                if priority > PRIORITY_MODERATION:
+                    contended = self._contended(chat_bucket)
+                    if contended is not None:
+                        # Wake when the moderation waiter gets its token
+                        await asyncio.sleep(contended.delay(now))
+                        continue
+                
+                global_delay = self.global_bucket.delay(now)
+                chat_delay = chat_bucket.delay(now) if chat_bucket is not None else 0.0
+                
+                if global_delay <= 0 and chat_delay <= 0:
+                    self.global_bucket.consume()
+                    if chat_bucket is not None:
+                        chat_bucket.consume()
+                    break
+                
+                if priority == PRIORITY_MODERATION:
+                    bottleneck = chat_bucket if chat_delay > global_delay else self.global_bucket
+                    blocked_on = self._set_blocked(blocked_on, bottleneck)
+                
+                await asyncio.sleep(max(global_delay, chat_delay))
+        finally:
+            self._waiting[priority] -= 1
+            self._set_blocked(blocked_on, None)
+        
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.throttled += 1
+            self.total_wait += waited
+            if waited > self.max_wait:
+                self.max_wait = waited
+    
+    def _contended(self, chat_bucket: Optional[TokenBucket]) -> Optional[TokenBucket]:
+        """A bucket this request needs that a moderation request is waiting on"""
+        if self._blocked.get(self.global_bucket):
+            return self.global_bucket
+        if chat_bucket is not None and self._blocked.get(chat_bucket):
+            return chat_bucket
+        return None
+    
+    def _set_blocked(self, previous: Optional[TokenBucket], bucket: Optional[TokenBucket]) -> Optional[TokenBucket]:
+        """Move a moderation waiter's claim from one bucket to another"""
+        if previous is bucket:
+            return bucket
+        if previous is not None:
+            self._blocked[previous] -= 1
+            if not self._blocked[previous]:
+                del self._blocked[previous]
+        if bucket is not None:
+            self._blocked[bucket] = self._blocked.get(bucket, 0) + 1
+        return bucket
+    
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], list]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], list]:
+        """Schedule a single Bot API request"""
+        started = time.perf_counter()
+        api_requests.labels(endpoint).inc()
+        try:
+            return await self._schedule(callback, args, kwargs, endpoint, data, rate_limit_args)
+        except Exception as e:
+            api_errors.labels(endpoint, type(e).__name__).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            api_latency.labels(endpoint).observe(elapsed)
+            tracer.record('api', endpoint, started, elapsed)
+    
+    async def _schedule(self, callback, args, kwargs, endpoint: str, data: Dict[str, Any],
+                        rate_limit_args: Optional[int]):
+        if endpoint in EXEMPT_ENDPOINTS or endpoint.startswith('get'):
+            return await callback(*args, **kwargs)
+        
+        self.requests += 1
+        
+        if rate_limit_args is not None:
+            # Unknown classes are clamped to the nearest one
+            priority = min(max(int(rate_limit_args), PRIORITY_MODERATION), PRIORITY_DEFAULT)
+        elif endpoint in MODERATION_ENDPOINTS:
+            priority = PRIORITY_MODERATION
+        else:
+            priority = PRIORITY_DEFAULT
+        
+        chat_bucket = None
+        chat_id = data.get('chat_id')
+        if chat_id is not None and endpoint.startswith(MESSAGE_ENDPOINT_PREFIXES):
+            chat_bucket = self._chat_bucket(chat_id)
+        
+        attempt = 0
+        while True:
+            await self._acquire(priority, chat_bucket)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                
+                retry_after = e.retry_after
+                if hasattr(retry_after, 'total_seconds'):
+                    retry_after = retry_after.total_seconds()
+                
+                # Flood control applies to the whole bot, so pause every request
+                self.flood_waits += 1
+                self.retries += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                logger.warning(f"Flood limit hit on {endpoint}, retrying in {retry_after}s (attempt {attempt})")
+    
+    def get_stats(self) -> Dict:
+        """Get queue and throttling metrics"""
+        return {
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'retries': self.retries,
+            'flood_waits': self.flood_waits,
+            'queue_depth': sum(self._waiting.values()),
+            'queue_moderation': self._waiting[PRIORITY_MODERATION],
+            'queue_default': self._waiting[PRIORITY_DEFAULT],
+            'max_queue_depth': self.max_queue_depth,
+            'avg_wait_ms': (self.total_wait / self.throttled * 1000) if self.throttled else 0.0,
+            'max_wait_ms': self.max_wait * 1000,
+            'chat_buckets': len(self._chat_buckets)
+        }
+
+# Global outbound rate limiter
+outbound_limiter = OutboundRateLimiter(
+    global_rate=config.OUTBOUND_GLOBAL_RATE,
+    group_rate_per_minute=config.OUTBOUND_GROUP_RATE_PER_MINUTE,
+    private_rate=config.OUTBOUND_PRIVATE_RATE,
+    max_retries=config.OUTBOUND_MAX_RETRIES
+)
+
+registry.callback_gauge(
+    "bot_api_queue_depth", "Bot API requests waiting for a rate limit token",
+    lambda: outbound_limiter.get_stats()['queue_depth'])
@@ -0,0 +1,144 @@
+"""
+Settings Sessions
+Applies settings toggles in memory per chat and persists them in one
+write after a quiet period or when Save is pressed; Cancel reverts
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from telegram.ext import ContextTypes
+
+from config import config
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# toggle_<name> callback suffix -> settings column
+TOGGLE_KEYS = {
+    'nsfw': 'enable_nsfw_filter',
+    'violence': 'enable_violence_filter',
+    'spam': 'enable_spam_filter',
+    'gban_sync': 'enable_gban_sync',
+    'auto_delete': 'auto_delete_messages',
+    'warn_before_ban': 'warn_before_ban'
+}
+
+class SettingsSession:
+    __slots__ = ('original', 'pending', 'timer', 'touched')
+    
+    def __init__(self, original: Dict):
+        self.original = original
+        self.pending: Dict = {}
+        self.timer: Optional[asyncio.Task] = None
+        self.touched = time.monotonic()
+
+class SettingsSessions:
+    """One open settings session per chat, from the first toggle until Save or Cancel"""
+    
+    def __init__(self, save_delay: float = 3.0, idle_timeout: float = 3600):
+        self.save_delay = save_delay
+        self.idle_timeout = idle_timeout
+        self.sessions: Dict[int, SettingsSession] = {}
+        self.counts = {'toggles': 0, 'writes': 0, 'saved': 0, 'cancelled': 0}
+    
+    def pending(self, chat_id: int) -> Dict:
+        """Toggled values not yet written to the database"""
+        session = self.sessions.get(chat_id)
+        return session.pending if session is not None else {}
+    
+    def toggle(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, name: str) -> bool:
+        """Flip a setting in memory and (re)start the quiet period; False for unknown toggles"""
+        key = TOGGLE_KEYS.get(name)
+        if key is None:
+            return False
+        
+        session = self._open(chat_id)
+        persisted = db.get_chat_settings(chat_id)[key]
+        value = not session.pending.get(key, persisted)
+        
+        # Toggling back to the stored value needs no write
+        if bool(value) == bool(persisted):
+            session.pending.pop(key, None)
+        else:
+            session.pending[key] = value
+        session.touched = time.monotonic()
+        self.counts['toggles'] += 1
+        
+        if session.timer is not None:
+            session.timer.cancel()
+        session.timer = context.application.create_task(self._save_later(chat_id, session))
+        return True
+    
+    def _open(self, chat_id: int) -> SettingsSession:
+        now = time.monotonic()
+        for stale_chat_id in [cid for cid, s in self.sessions.items()
+                              if not s.pending and now - s.touched > self.idle_timeout]:
+            del self.sessions[stale_chat_id]
+        
+        session = self.sessions.get(chat_id)
+        if session is None:
+            session = self.sessions[chat_id] = SettingsSession(dict(db.get_chat_settings(chat_id)))
+        return session
+    
+    async def _save_later(self, chat_id: int, session: SettingsSession):
+        await asyncio.sleep(self.save_delay)
+        session.timer = None
+        self.flush(chat_id)
+    
+    def flush(self, chat_id: int) -> int:
+        """Write pending toggles in one update; returns how many settings changed"""
+        session = self.sessions.get(chat_id)
+        if session is None or not session.pending:
+            return 0
+        
+        changes, session.pending = session.pending, {}
+        db.update_chat_settings(chat_id, **changes)
+        self.counts['writes'] += 1
+        logger.debug(f"Saved {len(changes)} settings for chat {chat_id}")
+        return len(changes)
+    
+    def save(self, chat_id: int) -> int:
+        """Persist pending toggles now and close the session"""
+        session = self.sessions.get(chat_id)
+        if session is None:
+            return 0
+        
+        if session.timer is not None:
+            session.timer.cancel()
+        changed = self.flush(chat_id)
+        del self.sessions[chat_id]
+        self.counts['saved'] += 1
+        return changed
+    
+    def cancel(self, chat_id: int) -> int:
+        """Discard pending toggles, revert any already saved this session and close it"""
+        session = self.sessions.pop(chat_id, None)
+        if session is None:
+            return 0
+        
+        if session.timer is not None:
+            session.timer.cancel()
+        
+        current = db.get_chat_settings(chat_id)
+        reverts = {
+            key: session.original[key] for key in TOGGLE_KEYS.values()
+            if bool(current[key]) != bool(session.original[key])
+        }
+        if reverts:
+            db.update_chat_settings(chat_id, **reverts)
+            self.counts['writes'] += 1
+        self.counts['cancelled'] += 1
+        return len(reverts)
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.counts,
+            'open': len(self.sessions),
+            'unsaved': sum(len(session.pending) for session in self.sessions.values())
+        }
+
+# Global settings sessions
+settings_sessions = SettingsSessions(save_delay=config.SETTINGS_SAVE_DELAY_MS / 1000)
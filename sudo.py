@@ -11,6 +11,7 @@ from telegram.ext import ContextTypes
 
 from config import config
 from database import db
+from profiles import profile_store
 from utils import is_admin
 
 logger = logging.getLogger(__name__)
@@ -43,25 +44,18 @@ class SudoSystem:
                 return {'success': False, 'error': 'User is already sudo'}
             
             # Get user info
-            user_info = ""
-            try:
-                user = await context.bot.get_chat(user_id)
-                user_info = f"{user.first_name} (@{user.username})" if user.username else user.first_name
-                
-                # Add to database
-                success = db.add_sudo_user(
-                    user_id=user_id,
-                    username=user.username or "",
-                    added_by=caller_id
-                )
-                
-                if not success:
-                    return {'success': False, 'error': 'Failed to add to sudo database'}
-                
-            except Exception as e:
-                logger.error(f"Error getting user info for sudo: {e}")
-                # Still try to add with limited info
-                db.add_sudo_user(user_id=user_id, added_by=caller_id)
+            profile = profile_store.lookup([user_id], context.bot).get(user_id)
+            user_info = profile.display_name if profile else f"User {user_id}"
+            
+            # Add to database
+            success = db.add_sudo_user(
+                user_id=user_id,
+                username=profile.username if profile else "",
+                added_by=caller_id
+            )
+            
+            if not success:
+                return {'success': False, 'error': 'Failed to add to sudo database'}
             
             result = {
                 'success': True,
@@ -103,12 +97,7 @@ class SudoSystem:
                 return {'success': False, 'error': 'Failed to remove from sudo database'}
             
             # Get user info
-            user_info = ""
-            try:
-                user = await context.bot.get_chat(user_id)
-                user_info = f"{user.first_name} (@{user.username})" if user.username else user.first_name
-            except:
-                user_info = f"User {user_id}"
+            user_info = profile_store.display_name(user_id, context.bot)
             
             result = {
                 'success': True,
@@ -135,18 +124,12 @@ class SudoSystem:
             # Combine with config sudo users
             all_sudo_users = []
             
-            # Add config sudo users
+            # Add config sudo users (names from the profile store, one lookup for all)
+            config_names = profile_store.display_names(config.SUDO_IDS, context.bot)
             for sudo_id in config.SUDO_IDS:
-                user_info = ""
-                try:
-                    user = await context.bot.get_chat(sudo_id)
-                    user_info = f"{user.first_name} (@{user.username})" if user.username else user.first_name
-                except:
-                    user_info = f"User {sudo_id}"
-                
                 all_sudo_users.append({
                     'user_id': sudo_id,
-                    'username': user_info,
+                    'username': config_names[sudo_id],
                     'source': 'config',
                     'added_by': 'system'
                 })
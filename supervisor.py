@@ -0,0 +1,232 @@
+"""
+Supervisor
+Multi-process deployment: one receiver process fetches updates and routes
+them by chat_id to worker processes that run the full handler stack
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+import sys
+import zlib
+from typing import Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from config import config
+from join_requests import join_request_screener
+
+logger = logging.getLogger(__name__)
+
+# Spawned workers import a fresh interpreter instead of inheriting the
+# receiver's event loop and threads
+_mp = multiprocessing.get_context("spawn")
+
+# Workers wait on their queue in short timed reads so the executor thread is
+# always free again soon, which lets a crashed worker's interpreter exit
+WORKER_POLL_SECONDS = 1.0
+
+def shard_for(update: Update, shards: int) -> int:
+    """Worker index for an update
+    
+    Every update from one chat goes to the same worker, so per-chat ordering
+    and the in-memory per-chat caches (settings, whitelist, pipelines,
+    cooldowns) stay coherent without cross-process invalidation.
+    """
+    if update.effective_chat:
+        key = update.effective_chat.id
+    elif update.effective_user:
+        key = update.effective_user.id
+    else:
+        key = update.update_id
+    return shard_of(key, shards)
+
+def shard_of(key: int, shards: int) -> int:
+    """Worker index for a chat, user or update ID"""
+    # Stable across processes, unlike hash()
+    return zlib.crc32(str(key).encode()) % shards
+
+def worker_main(index: int, workers: int, updates: multiprocessing.Queue):
+    """Entry point of a worker process"""
+    # The supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(_run_worker(index, workers, updates))
+    except Exception as e:
+        logger.critical(f"💥 Worker {index} crashed: {e}", exc_info=True)
+        sys.exit(1)
+
+async def _run_worker(index: int, workers: int, updates: multiprocessing.Queue):
+    from main import build_application, post_init, post_stop
+    from metrics import metrics_server
+    from raid import raid_detector
+    from ratelimiter import OutboundRateLimiter
+    from update_processor import update_processor
+    from utils import schedule_cleanup
+    
+    # Workers share the bot's global Bot API budget
+    limiter = OutboundRateLimiter(
+        global_rate=config.OUTBOUND_GLOBAL_RATE / workers,
+        group_rate_per_minute=config.OUTBOUND_GROUP_RATE_PER_MINUTE,
+        private_rate=config.OUTBOUND_PRIVATE_RATE,
+        max_retries=config.OUTBOUND_MAX_RETRIES
+    )
+    builder = (
+        Application.builder()
+        .token(config.TOKEN)
+        .rate_limiter(limiter)
+        .concurrent_updates(update_processor)
+        .updater(None)
+    )
+    app = build_application(builder)
+    loop = asyncio.get_running_loop()
+    
+    # Each worker serves its own metrics on a consecutive port
+    if metrics_server.port:
+        metrics_server.port = config.METRICS_PORT + index
+    
+    async with app:
+        # post_init only runs automatically from run_polling/run_webhook
+        await post_init(app)
+        await raid_detector.restore(app.bot, lambda chat_id: shard_of(chat_id, workers) == index)
+        await app.start()
+        cleanup_task = asyncio.create_task(schedule_cleanup(include_disk=False))
+        logger.info(f"👷 Worker {index} ready")
+        
+        while True:
+            try:
+                data = await loop.run_in_executor(None, updates.get, True, WORKER_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if data is None:
+                break
+            await app.update_queue.put(Update.de_json(data, app.bot))
+        
+        cleanup_task.cancel()
+        await app.stop()
+        await post_stop(app)
+    
+    logger.info(f"👷 Worker {index} stopped")
+
+class Supervisor:
+    """Starts, routes updates to and restarts worker processes"""
+    
+    def __init__(self, workers: int, health_interval: float = 5.0):
+        self.workers = workers
+        self.health_interval = health_interval
+        self.queues: List[multiprocessing.Queue] = [_mp.Queue() for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.routed: Dict[int, int] = {i: 0 for i in range(workers)}
+        self.restarts = 0
+        self._health_task: Optional[asyncio.Task] = None
+    
+    def _start_worker(self, index: int):
+        process = _mp.Process(
+            target=worker_main,
+            args=(index, self.workers, self.queues[index]),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"🚀 Started worker {index} (pid {process.pid})")
+    
+    async def route(self, update: Update, context):
+        """Forward an update to the worker that owns its chat"""
+        index = shard_for(update, self.workers)
+        self.queues[index].put(update.to_dict())
+        self.routed[index] += 1
+    
+    def _replace_queue(self, index: int) -> int:
+        """Give a dead worker's replacement a fresh queue, carrying over what can be read
+        
+        A worker killed inside get() still holds the queue's read lock, so the
+        old queue can't be reused. Non-blocking reads fail fast in that case
+        and the updates left in it are dropped.
+        """
+        old = self.queues[index]
+        fresh = self.queues[index] = _mp.Queue()
+        moved = 0
+        try:
+            while True:
+                fresh.put(old.get_nowait())
+                moved += 1
+        except queue.Empty:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Could not recover pending updates of worker {index}: {e}")
+        
+        # Nobody reads the old pipe any more; don't wait on it at exit
+        old.close()
+        old.cancel_join_thread()
+        return moved
+    
+    async def _health_loop(self):
+        """Restart workers that died, each with a fresh queue"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logger.error(f"💀 Worker {index} exited with code {process.exitcode}, restarting")
+                    self.restarts += 1
+                    moved = self._replace_queue(index)
+                    if moved:
+                        logger.info(f"📦 Carried {moved} pending updates over to worker {index}")
+                    self._start_worker(index)
+    
+    async def start(self, application: Application):
+        # Only the receiver polls, so only it may fetch the pending updates
+        await join_request_screener.drain_before_polling(application.bot)
+        
+        for index in range(self.workers):
+            self._start_worker(index)
+        self._health_task = asyncio.create_task(self._health_loop())
+    
+    async def stop(self, application: Application):
+        if self._health_task:
+            self._health_task.cancel()
+        
+        for updates in self.queues:
+            updates.put(None)
+        
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(timeout=10)
+            if process.is_alive():
+                logger.warning(f"⚠️ Worker {index} did not stop in time, terminating")
+                process.terminate()
+                process.join(timeout=5)
+    
+    def build_receiver(self) -> Application:
+        """Application that only fetches updates and routes them to workers"""
+        app = (
+            Application.builder()
+            .token(config.TOKEN)
+            .post_init(self.start)
+            .post_shutdown(self.stop)
+            .build()
+        )
+        app.add_handler(TypeHandler(Update, self.route))
+        return app
+    
+    def get_stats(self) -> Dict:
+        """Get routing and worker health metrics"""
+        pending = []
+        for updates in self.queues:
+            try:
+                pending.append(updates.qsize())
+            except NotImplementedError:
+                # qsize() is unavailable on macOS
+                pending.append(-1)
+        
+        return {
+            'workers': self.workers,
+            'alive': sum(1 for p in self.processes if p is not None and p.is_alive()),
+            'restarts': self.restarts,
+            'routed': dict(self.routed),
+            'pending': pending
+        }
@@ -0,0 +1,13 @@
+"""
+Test setup: import the bot modules from the repository root and keep
+bot.db and the other runtime files in a scratch directory
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import prepare_environment
+
+prepare_environment(token="123456:TEST")
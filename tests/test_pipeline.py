@@ -0,0 +1,27 @@
+"""
+Tests for the per-chat moderation pipeline cache
+"""
+
+from database import db
+from pipeline import PipelineCache
+
+def stage_names(pipeline):
+    return [stage.name for stage in pipeline.stages]
+
+def test_pipeline_compiles_enabled_stages_cheap_first():
+    cache = PipelineCache()
+    db.update_chat_settings(-1001, enable_gban_sync=True, enable_spam_filter=True)
+    
+    assert stage_names(cache.get(-1001)) == ['whitelist', 'gban', 'rate_limit']
+
+def test_pipeline_is_rebuilt_when_settings_change():
+    cache = PipelineCache()
+    db.update_chat_settings(-1002, enable_gban_sync=True, enable_spam_filter=True)
+    pipeline = cache.get(-1002)
+    assert cache.get(-1002) is pipeline
+    
+    db.update_chat_settings(-1002, enable_spam_filter=False)
+    rebuilt = cache.get(-1002)
+    assert rebuilt is not pipeline
+    assert stage_names(rebuilt) == ['whitelist', 'gban']
+    assert cache.builds == 2
@@ -0,0 +1,37 @@
+"""
+Tests for the outbound Bot API rate limiter
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from ratelimiter import OutboundRateLimiter
+
+async def send(limiter, chat_id):
+    async def callback():
+        return True
+    return await limiter.process_request(callback, (), {}, 'sendMessage', {'chat_id': chat_id}, None)
+
+def test_fractional_rates_still_release_tokens():
+    async def scenario():
+        # e.g. 30 req/s shared by 32 workers, and a slow private chat limit
+        limiter = OutboundRateLimiter(global_rate=30 / 32, private_rate=0.5)
+        assert await asyncio.wait_for(send(limiter, 42), timeout=1)
+        
+        # The next token is one refill period away, not never
+        now = time.monotonic()
+        assert 0 < limiter.global_bucket.delay(now) <= 32 / 30
+        assert 0 < limiter._chat_bucket(42).delay(now) <= 2
+    
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize('rates', [
+    {'global_rate': 0},
+    {'group_rate_per_minute': -1},
+    {'private_rate': 0},
+])
+def test_non_positive_rates_are_rejected(rates):
+    with pytest.raises(ValueError):
+        OutboundRateLimiter(**rates)
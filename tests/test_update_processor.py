@@ -0,0 +1,68 @@
+"""
+Tests for the chat-ordered update processor
+"""
+
+import asyncio
+
+from update_processor import ChatOrderedUpdateProcessor
+
+class _Processor(ChatOrderedUpdateProcessor):
+    """Orders plain (chat_id, n) tuples instead of telegram Updates"""
+    
+    @staticmethod
+    def _ordering_key(update):
+        return update[0]
+
+def test_flooded_chat_does_not_block_other_chats():
+    async def scenario():
+        limit = 4
+        processor = _Processor(max_concurrent_updates=limit)
+        release = asyncio.Event()
+        order = []
+        
+        async def handle(update, blocking):
+            order.append(update)
+            if blocking:
+                await release.wait()
+        
+        flood = [
+            asyncio.create_task(processor.process_update(('a', n), handle(('a', n), True)))
+            for n in range(limit * 3)
+        ]
+        await asyncio.sleep(0)
+        
+        # Chat A holds one slot; its queued updates must not take the rest
+        await asyncio.wait_for(processor.process_update(('b', 0), handle(('b', 0), False)), timeout=1)
+        assert order == [('a', 0), ('b', 0)]
+        assert processor.get_stats()['queue_depth'] == limit * 3 - 1
+        
+        release.set()
+        await asyncio.gather(*flood)
+        assert [update for update in order if update[0] == 'a'] == [('a', n) for n in range(limit * 3)]
+    
+    asyncio.run(scenario())
+
+def test_slots_bound_concurrency_across_chats():
+    async def scenario():
+        processor = _Processor(max_concurrent_updates=2)
+        release = asyncio.Event()
+        peak = 0
+        
+        async def handle():
+            nonlocal peak
+            peak = max(peak, processor.running)
+            await release.wait()
+        
+        tasks = [
+            asyncio.create_task(processor.process_update((chat_id, 0), handle()))
+            for chat_id in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        assert processor.running == 2
+        
+        release.set()
+        await asyncio.gather(*tasks)
+        assert peak == 2
+        assert processor.get_stats()['processed'] == 5
+    
+    asyncio.run(scenario())
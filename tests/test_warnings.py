@@ -0,0 +1,24 @@
+"""
+Tests for the per-chat warning counters
+"""
+
+from database import db
+
+def test_threshold_is_reported_at_max_warnings():
+    db.update_chat_settings(-2001, max_warnings=2)
+    
+    assert db.record_warning(11, -2001, 'spam', 'first', 0) == (1, False)
+    assert db.record_warning(11, -2001, 'spam', 'second', 0) == (2, True)
+    assert db.get_warning_count(11, -2001) == 2
+    # Other chats keep their own count
+    assert db.get_warning_count(11, -2002) == 0
+
+def test_reset_clears_the_count():
+    db.update_chat_settings(-2003, max_warnings=2)
+    db.record_warning(12, -2003, 'spam', 'first', 0)
+    db.record_warning(12, -2003, 'spam', 'second', 0)
+    
+    assert db.reset_warnings(12, -2003)
+    assert db.get_warning_count(12, -2003) == 0
+    assert db.record_warning(12, -2003, 'spam', 'again', 0) == (1, False)
+    assert not db.reset_warnings(13, -2003)
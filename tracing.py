@@ -0,0 +1,129 @@
+"""
+Tracing
+Per-update traces with child spans for handlers, database calls and Bot
+API calls; slow traces are kept for inspection with /trace
+"""
+
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class Trace:
+    """Root span for one update plus its finished child spans"""
+    
+    __slots__ = ('id', 'name', 'chat_id', 'started', 'wall_time', 'duration', 'spans', 'dropped')
+    
+    def __init__(self, trace_id: int, name: str, chat_id: Optional[int]):
+        self.id = trace_id
+        self.name = name
+        self.chat_id = chat_id
+        self.started = time.perf_counter()
+        self.wall_time = datetime.now()
+        self.duration = 0.0
+        self.spans: List[tuple] = []
+        self.dropped = 0
+    
+    def top_spans(self, limit: int = 5) -> List[Dict]:
+        """Child spans grouped by kind and name, slowest total first"""
+        grouped: Dict[tuple, Dict] = {}
+        for kind, name, _, elapsed in self.spans:
+            entry = grouped.get((kind, name))
+            if entry is None:
+                entry = grouped[(kind, name)] = {'kind': kind, 'name': name, 'count': 0, 'total_ms': 0.0}
+            entry['count'] += 1
+            entry['total_ms'] += elapsed * 1000
+        return sorted(grouped.values(), key=lambda e: e['total_ms'], reverse=True)[:limit]
+
+# Trace of the update being handled by the current task
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('current_trace', default=None)
+
+def describe_update(update: object) -> tuple:
+    """Short name and chat ID for an update"""
+    chat = getattr(update, 'effective_chat', None)
+    chat_id = chat.id if chat else None
+    
+    message = getattr(update, 'effective_message', None)
+    if getattr(update, 'callback_query', None):
+        name = f"callback {(update.callback_query.data or '')[:30]}"
+    elif message is not None and message.text and message.text.startswith('/'):
+        name = message.text.split()[0][:32]
+    elif message is not None:
+        name = "photo" if message.photo else "document" if message.document else "message"
+    else:
+        name = type(update).__name__
+    return name, chat_id
+
+class Tracer:
+    """Creates root traces and keeps the slow ones in a ring buffer"""
+    
+    def __init__(self, slow_threshold_ms: float = 500, buffer_size: int = 100, max_spans: int = 200):
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.max_spans = max_spans
+        self.slow: Deque[Trace] = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self.traced = 0
+    
+    @contextmanager
+    def trace(self, update: object):
+        """Root span around all handlers for one update"""
+        name, chat_id = describe_update(update)
+        current = Trace(next(self._ids), name, chat_id)
+        token = _current_trace.set(current)
+        try:
+            yield current
+        finally:
+            _current_trace.reset(token)
+            current.duration = time.perf_counter() - current.started
+            self.traced += 1
+            if current.duration >= self.slow_threshold:
+                self._keep(current)
+    
+    def _keep(self, current: Trace):
+        self.slow.append(current)
+        top = ", ".join(f"{s['kind']}.{s['name']} {s['total_ms']:.0f}ms" for s in current.top_spans(3))
+        logger.warning(
+            f"🐢 Slow update #{current.id} {current.name} in chat {current.chat_id}: "
+            f"{current.duration * 1000:.0f}ms ({top or 'no spans'})"
+        )
+    
+    def record(self, kind: str, name: str, started: float, elapsed: float):
+        """Attach a finished child span to the current trace, if any"""
+        current = _current_trace.get()
+        if current is None:
+            return
+        if len(current.spans) >= self.max_spans:
+            current.dropped += 1
+            return
+        current.spans.append((kind, name, started - current.started, elapsed))
+    
+    def get_slowest(self, limit: int = 10) -> List[Trace]:
+        return sorted(self.slow, key=lambda t: t.duration, reverse=True)[:limit]
+    
+    def get(self, trace_id: int) -> Optional[Trace]:
+        for current in self.slow:
+            if current.id == trace_id:
+                return current
+        return None
+    
+    def get_stats(self) -> Dict:
+        return {
+            'traced': self.traced,
+            'slow_kept': len(self.slow),
+            'threshold_ms': self.slow_threshold * 1000
+        }
+
+# Global tracer
+tracer = Tracer(
+    slow_threshold_ms=config.TRACE_SLOW_MS,
+    buffer_size=config.TRACE_BUFFER_SIZE,
+    max_spans=config.TRACE_MAX_SPANS
+)
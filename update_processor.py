@@ -0,0 +1,153 @@
+"""
+Update Processor
+Concurrent update handling that keeps updates from the same chat in order
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import config
+from metrics import registry
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Bound handed to the base class; the real limit is applied after the chat lock
+_UNBOUNDED = sys.maxsize
+
+class _ChatSlot:
+    """FIFO lock for one chat plus the number of updates holding or waiting on it"""
+    
+    __slots__ = ('lock', 'users')
+    
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Runs different chats in parallel while serialising updates within a chat
+    
+    Application starts one task per update in arrival order. Each task first
+    takes its chat's lock (asyncio.Lock wakes waiters FIFO), then one of
+    max_concurrent_updates slots. Updates queued behind a busy chat hold no
+    slot, so a flooded chat can't starve the others.
+    """
+    
+    def __init__(self, max_concurrent_updates: int = 256):
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates must be at least 1")
+        super().__init__(_UNBOUNDED)
+        self.limit = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._chats: Dict[Hashable, _ChatSlot] = {}
+        
+        # Metrics
+        self.processed = 0
+        self.failed = 0
+        self.running = 0
+        self.waiting_chat = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    @staticmethod
+    def _ordering_key(update: object) -> Optional[Hashable]:
+        """Chat the update belongs to, falling back to the user for chatless updates"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return ('user', update.effective_user.id)
+        return None
+    
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Wait for the chat's turn and a free slot, then run the handlers"""
+        started = time.monotonic()
+        key = self._ordering_key(update)
+        slot = None
+        
+        if key is not None:
+            slot = self._chats.get(key)
+            if slot is None:
+                slot = self._chats[key] = _ChatSlot()
+            slot.users += 1
+        
+        try:
+            if slot is not None:
+                self.waiting_chat += 1
+                if self.waiting_chat > self.max_queue_depth:
+                    self.max_queue_depth = self.waiting_chat
+                try:
+                    await slot.lock.acquire()
+                finally:
+                    self.waiting_chat -= 1
+            
+            try:
+                async with self._slots:
+                    waited = time.monotonic() - started
+                    self.total_wait += waited
+                    if waited > self.max_wait:
+                        self.max_wait = waited
+                    
+                    self.running += 1
+                    try:
+                        await self._run(update, coroutine)
+                    finally:
+                        self.running -= 1
+            finally:
+                if slot is not None:
+                    slot.lock.release()
+        finally:
+            if slot is not None:
+                slot.users -= 1
+                # Drop idle chats so the table only holds chats with queued work
+                if slot.users == 0 and self._chats.get(key) is slot:
+                    del self._chats[key]
+    
+    async def _run(self, update: object, coroutine: Awaitable[Any]) -> None:
+        try:
+            with tracer.trace(update):
+                await coroutine
+            self.processed += 1
+        except Exception:
+            # Application's wrapper already routes handler errors to error handlers
+            self.failed += 1
+            raise
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        pass
+    
+    def get_stats(self) -> Dict:
+        """Get concurrency and queue depth metrics"""
+        completed = self.processed + self.failed
+        return {
+            'max_concurrent': self.limit,
+            'running': self.running,
+            'queue_depth': self.waiting_chat,
+            'max_queue_depth': self.max_queue_depth,
+            'active_chats': len(self._chats),
+            'processed': self.processed,
+            'failed': self.failed,
+            'avg_wait_ms': (self.total_wait / completed * 1000) if completed else 0.0,
+            'max_wait_ms': self.max_wait * 1000
+        }
+
+# Global update processor
+update_processor = ChatOrderedUpdateProcessor(max_concurrent_updates=config.MAX_CONCURRENT_UPDATES)
+
+registry.callback_gauge(
+    "bot_update_queue_depth", "Updates waiting for earlier updates from their chat",
+    lambda: update_processor.get_stats()['queue_depth'])
+registry.callback_gauge(
+    "bot_updates_running", "Updates currently being handled",
+    lambda: update_processor.running)
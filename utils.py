@@ -7,6 +7,7 @@ from typing import Optional, Dict, Any
 from pathlib import Path
 from datetime import datetime, timedelta
 import shutil
+import sqlite3
 import subprocess
 
 from telegram import Update
@@ -14,13 +15,10 @@ from telegram.ext import ContextTypes
 
 from config import config
 from sudo import SudoSystem
+from cooldown import cooldowns
 
 logger = logging.getLogger(__name__)
 
-# Global cache for rate limiting
-user_cooldown: Dict[int, float] = {}
-group_cooldown: Dict[int, float] = {}
-
 async def download_file(file_id: str, bot, filename: Optional[str] = None) -> Optional[str]:
     """Download file from Telegram to temporary location"""
     try:
@@ -110,27 +108,11 @@ def format_time(seconds: int) -> str:
 
 def check_cooldown(user_id: int, cooldown_seconds: int = 30) -> bool:
     """Check if user is in cooldown period"""
-    current_time = time.time()
-    
-    if user_id in user_cooldown:
-        last_action = user_cooldown[user_id]
-        if current_time - last_action < cooldown_seconds:
-            return False
-    
-    user_cooldown[user_id] = current_time
-    return True
+    return cooldowns.check("user", user_id, cooldown_seconds)
 
 def check_group_cooldown(chat_id: int, cooldown_seconds: int = 10) -> bool:
     """Check if group is in cooldown period"""
-    current_time = time.time()
-    
-    if chat_id in group_cooldown:
-        last_action = group_cooldown[chat_id]
-        if current_time - last_action < cooldown_seconds:
-            return False
-    
-    group_cooldown[chat_id] = current_time
-    return True
+    return cooldowns.check("group", chat_id, cooldown_seconds)
 
 def clean_temp_files(max_age_hours: int = 1):
     """Clean old temporary files"""
@@ -163,7 +145,14 @@ def backup_database():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_file = config.BACKUP_DIR / f"bot_backup_{timestamp}.db"
         
-        shutil.copy2("bot.db", backup_file)
+        # The backup API includes pages still in the WAL file
+        source = sqlite3.connect("bot.db")
+        target = sqlite3.connect(backup_file)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
         
         # Keep only last 7 backups
         backups = sorted(config.BACKUP_DIR.glob("bot_backup_*.db"))
@@ -178,26 +167,29 @@ def backup_database():
         logger.error(f"❌ Failed to backup database: {e}")
         return None
 
-async def schedule_cleanup():
-    """Schedule periodic cleanup tasks"""
+async def schedule_cleanup(include_disk: bool = True):
+    """Schedule periodic cleanup tasks
+    
+    Worker processes pass include_disk=False so temp files and backups are
+    only handled once while each process still prunes its own memory.
+    """
     while True:
         try:
-            # Clean temp files every hour
-            clean_temp_files()
-            
-            # Backup database every 6 hours
-            current_hour = datetime.now().hour
-            if current_hour % 6 == 0:
-                backup_database()
+            if include_disk:
+                # Clean temp files every hour
+                clean_temp_files()
+                
+                # Backup database every 6 hours
+                current_hour = datetime.now().hour
+                if current_hour % 6 == 0:
+                    backup_database()
             
-            # Clear old cooldown entries
-            current_time = time.time()
-            global user_cooldown, group_cooldown
+            # Drop idle cooldown classes (entries expire continuously on access)
+            cooldowns.sweep()
             
-            user_cooldown = {k: v for k, v in user_cooldown.items() 
-                           if current_time - v < 3600}
-            group_cooldown = {k: v for k, v in group_cooldown.items() 
-                            if current_time - v < 3600}
+            # Clear idle rate limit histories
+            from pipeline import prune_rate_limit_history
+            prune_rate_limit_history()
             
             await asyncio.sleep(3600)  # Run every hour
             
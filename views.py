@@ -0,0 +1,198 @@
+"""
+Admin Views
+Renders the settings and stats messages with their keyboards, caches
+rendered settings per settings version and skips edits that would not
+change the message
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Message
+from telegram.error import BadRequest
+
+from database import db
+from metrics import cache_requests, registry
+
+logger = logging.getLogger(__name__)
+
+view_edits = registry.counter(
+    "bot_view_edits_total", "Settings and stats message edits, sent or skipped as unchanged", ("view", "result"))
+
+_view_hit = cache_requests.labels('view', 'hit')
+_view_miss = cache_requests.labels('view', 'miss')
+
+STATS_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🔄 Refresh", callback_data="refresh_stats"),
+        InlineKeyboardButton("⚙️ Settings", callback_data="open_settings")
+    ],
+    [
+        InlineKeyboardButton("🌍 GBAN Stats", callback_data="gban_stats"),
+        InlineKeyboardButton("👑 Sudo Stats", callback_data="sudo_stats")
+    ],
+    [
+        InlineKeyboardButton("🗑️ Cleanup", callback_data="cleanup_files"),
+        InlineKeyboardButton("💾 Backup", callback_data="backup_now")
+    ]
+])
+
+class View:
+    __slots__ = ('name', 'text', 'reply_markup')
+    
+    def __init__(self, name: str, text: str, reply_markup: InlineKeyboardMarkup):
+        self.name = name
+        self.text = text
+        self.reply_markup = reply_markup
+
+def render_settings(chat_id: int, settings: Dict) -> View:
+    """Build the settings message and its toggle keyboard"""
+    def mark(key: str) -> str:
+        return '✅' if settings[key] else '❌'
+    
+    def state(key: str) -> str:
+        return 'Enabled' if settings[key] else 'Disabled'
+    
+    keyboard = [
+        [
+            InlineKeyboardButton(f"NSFW Filter: {mark('enable_nsfw_filter')}", callback_data="toggle_nsfw"),
+            InlineKeyboardButton(f"Violence Filter: {mark('enable_violence_filter')}", callback_data="toggle_violence")
+        ],
+        [
+            InlineKeyboardButton(f"Spam Filter: {mark('enable_spam_filter')}", callback_data="toggle_spam"),
+            InlineKeyboardButton(f"GBAN Sync: {mark('enable_gban_sync')}", callback_data="toggle_gban_sync")
+        ],
+        [
+            InlineKeyboardButton(f"Auto Delete: {mark('auto_delete_messages')}", callback_data="toggle_auto_delete"),
+            InlineKeyboardButton(f"Warn Before Ban: {mark('warn_before_ban')}", callback_data="toggle_warn_before_ban")
+        ],
+        [
+            InlineKeyboardButton(f"Max Warnings: {settings['max_warnings']}", callback_data="change_max_warnings"),
+            InlineKeyboardButton("📊 View Stats", callback_data="view_stats")
+        ],
+        [
+            InlineKeyboardButton("💾 Backup", callback_data="backup_db"),
+            InlineKeyboardButton("🗑️ Cleanup", callback_data="cleanup_files")
+        ],
+        [
+            InlineKeyboardButton("✅ Save", callback_data="save_settings"),
+            InlineKeyboardButton("❌ Cancel", callback_data="cancel_settings")
+        ]
+    ]
+    
+    text = (
+        f"⚙️ *Bot Settings - Chat ID: `{chat_id}`*\n\n"
+        f"Configure moderation settings for this group:\n\n"
+        f"• *NSFW Filter:* {state('enable_nsfw_filter')}\n"
+        f"• *Violence Filter:* {state('enable_violence_filter')}\n"
+        f"• *Spam Filter:* {state('enable_spam_filter')}\n"
+        f"• *GBAN Sync:* {state('enable_gban_sync')}\n"
+        f"• *Auto Delete Messages:* {state('auto_delete_messages')}\n"
+        f"• *Warn Before Ban:* {state('warn_before_ban')}\n"
+        f"• *Max Warnings:* {settings['max_warnings']}\n"
+        f"• *Language:* {settings['language']}\n\n"
+        f"Click buttons below to toggle settings."
+    )
+    
+    return View('settings', text, InlineKeyboardMarkup(keyboard))
+
+def render_settings_summary(settings: Dict) -> str:
+    """Settings block appended to the stats message"""
+    text = "*Settings:*\n"
+    for key, value in settings.items():
+        if key != 'chat_id':
+            key_name = key.replace('_', ' ').title()
+            text += f"• {key_name}: `{value}`\n"
+    return text
+
+class ViewCache:
+    """Rendered views keyed by (chat_id, settings version), plus a fingerprint
+    of what each admin message currently shows so identical edits are skipped"""
+    
+    def __init__(self, max_messages: int = 1000):
+        self.max_messages = max_messages
+        self.counts = {'edited': 0, 'skipped': 0}
+        self._settings: Dict[int, Tuple[Tuple, View]] = {}
+        self._summaries: Dict[int, Tuple[int, str]] = {}
+        self._shown: "OrderedDict[Tuple[int, int], Tuple[str, str]]" = OrderedDict()
+    
+    def settings_view(self, chat_id: int, pending: Optional[Dict] = None) -> View:
+        """Settings message for a chat with unsaved toggles applied, re-rendered only when either changes"""
+        key = (db.get_settings_version(chat_id), tuple(sorted((pending or {}).items())))
+        cached = self._settings.get(chat_id)
+        if cached is not None and cached[0] == key:
+            _view_hit.inc()
+            return cached[1]
+        
+        _view_miss.inc()
+        settings = {**db.get_chat_settings(chat_id), **(pending or {})}
+        view = render_settings(chat_id, settings)
+        self._settings[chat_id] = (key, view)
+        return view
+    
+    def stats_view(self, chat_id: int, body: str) -> View:
+        """Stats message: live counters in body followed by the cached settings block"""
+        version = db.get_settings_version(chat_id)
+        cached = self._summaries.get(chat_id)
+        if cached is not None and cached[0] == version:
+            _view_hit.inc()
+            summary = cached[1]
+        else:
+            _view_miss.inc()
+            summary = render_settings_summary(db.get_chat_settings(chat_id))
+            self._summaries[chat_id] = (version, summary)
+        return View('stats', body + summary, STATS_KEYBOARD)
+    
+    async def send(self, message: Message, view: View) -> Message:
+        """Reply with a view and remember what the new message shows"""
+        sent = await message.reply_text(view.text, parse_mode='Markdown', reply_markup=view.reply_markup)
+        self._remember(sent, view)
+        return sent
+    
+    async def edit_if_changed(self, query, view: View) -> bool:
+        """Edit the callback's message to a view unless it already shows it"""
+        message = query.message
+        key = (message.chat_id, message.message_id)
+        
+        # The keyboard check catches edits made outside this cache (confirmations, errors)
+        if self._shown.get(key) == self._fingerprint(view) and message.reply_markup == view.reply_markup:
+            return self._count(view, 'skipped')
+        
+        try:
+            await query.edit_message_text(view.text, parse_mode='Markdown', reply_markup=view.reply_markup)
+        except BadRequest as e:
+            if "message is not modified" not in str(e).lower():
+                raise
+            self._remember(message, view)
+            return self._count(view, 'skipped')
+        
+        self._remember(message, view)
+        return self._count(view, 'edited')
+    
+    def _fingerprint(self, view: View) -> Tuple[str, str]:
+        return view.name, view.text
+    
+    def _remember(self, message: Optional[Message], view: View):
+        if message is None:
+            return
+        key = (message.chat_id, message.message_id)
+        self._shown[key] = self._fingerprint(view)
+        self._shown.move_to_end(key)
+        while len(self._shown) > self.max_messages:
+            self._shown.popitem(last=False)
+    
+    def _count(self, view: View, result: str) -> bool:
+        self.counts[result] += 1
+        view_edits.labels(view.name, result).inc()
+        return result == 'edited'
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.counts,
+            'cached_chats': len(self._settings),
+            'tracked_messages': len(self._shown)
+        }
+
+# Global view cache
+view_cache = ViewCache()